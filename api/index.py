@@ -1,7 +1,5 @@
 import os
 import sys
-import json
-import time
 import logging
 
 # Configure logging to stdout (Vercel collects stdout as logs)
@@ -29,28 +27,7 @@ except Exception as e:
 logger.info("api/index.py: ASGI app 'app' exported for Vercel")
 
 # region agent log
-def _agent_log(hypothesis_id: str, location: str, message: str, data: dict | None = None) -> None:
-    """
-    Debug-mode NDJSON logger.
-    IMPORTANT: do not log secrets (tokens, keys, full env).
-    """
-    try:
-        payload = {
-            "sessionId": "debug-session",
-            "runId": os.getenv("AGENT_RUN_ID", "pre-fix"),
-            "hypothesisId": hypothesis_id,
-            "location": location,
-            "message": message,
-            "data": data or {},
-            "timestamp": int(time.time() * 1000),
-        }
-        log_path = os.path.join(ROOT, ".cursor", "debug.log")
-        with open(log_path, "a", encoding="utf-8") as f:
-            f.write(json.dumps(payload, ensure_ascii=False) + "\n")
-    except Exception:
-        # Never break app because of debug logging.
-        pass
-
+from apps.telegram_assistant.utils.diagnostics import agent_log as _agent_log  # noqa: E402
 
 _agent_log(
     "H_build_runtime",
@@ -0,0 +1,18 @@
+from typing import Any, Callable
+
+from aiogram import Bot
+
+
+class AssistantBot(Bot):
+    """Bot with an aiogram-2 style context: `bot["supabase"]`, `bot["bitrix"]`.
+
+    Values come from `resolve(key)` on every lookup, so a client is only
+    constructed once a handler actually asks for it.
+    """
+
+    def __init__(self, token: str, resolve: Callable[[str], Any], **kwargs: Any) -> None:
+        super().__init__(token, **kwargs)
+        self._resolve = resolve
+
+    def __getitem__(self, key: str) -> Any:
+        return self._resolve(key)
@@ -12,6 +12,44 @@ class Settings(BaseSettings):
     app_base_url: str | None = Field(None, alias="APP_BASE_URL")
     openrouter_api_key: str | None = Field(None, alias="OPENROUTER_API_KEY")
     openai_api_key: str | None = Field(None, alias="OPENAI_API_KEY")
+    bitrix_http2: bool = Field(False, alias="BITRIX_HTTP2")
+    bitrix_max_connections: int = Field(20, alias="BITRIX_MAX_CONNECTIONS")
+    bitrix_max_keepalive: int = Field(10, alias="BITRIX_MAX_KEEPALIVE")
+    bitrix_rate_limit: float = Field(2.0, alias="BITRIX_RATE_LIMIT")
+    bitrix_burst: int = Field(5, alias="BITRIX_BURST")
+    digest_chunk_size: int = Field(50, alias="DIGEST_CHUNK_SIZE")
+    digest_concurrency: int = Field(8, alias="DIGEST_CONCURRENCY")
+    digest_time_budget: float = Field(8.0, alias="DIGEST_TIME_BUDGET")
+    digest_page_size: int = Field(100, alias="DIGEST_PAGE_SIZE")
+    digest_max_lateness: int = Field(3600, alias="DIGEST_MAX_LATENESS")
+    digest_warmup_lead: int = Field(900, alias="DIGEST_WARMUP_LEAD")
+    today_max_staleness: int = Field(300, alias="TODAY_MAX_STALENESS")
+    # без OTP_SECRET ключ HMAC выводится из SUPABASE_SERVICE_ROLE_KEY
+    otp_secret: str | None = Field(None, alias="OTP_SECRET")
+    otp_ttl: int = Field(900, alias="OTP_TTL")
+    otp_max_attempts: int = Field(5, alias="OTP_MAX_ATTEMPTS")
+    otp_lockout: int = Field(3600, alias="OTP_LOCKOUT")
+    page_snapshot_ttl: int = Field(21_600, alias="PAGE_SNAPSHOT_TTL")
+    page_snapshot_size: int = Field(1000, alias="PAGE_SNAPSHOT_SIZE")
+    telegram_rate_limit: float = Field(30.0, alias="TELEGRAM_RATE_LIMIT")
+    telegram_chat_interval: float = Field(1.0, alias="TELEGRAM_CHAT_INTERVAL")
+    outbox_claim_ttl: int = Field(60, alias="OUTBOX_CLAIM_TTL")
+    # inline | background | durable
+    telegram_update_mode: str = Field("inline", alias="TELEGRAM_UPDATE_MODE")
+    update_concurrency: int = Field(8, alias="UPDATE_CONCURRENCY")
+    update_max_pending: int = Field(1000, alias="UPDATE_MAX_PENDING")
+    update_drain_budget: float = Field(8.0, alias="UPDATE_DRAIN_BUDGET")
+    update_dedupe_size: int = Field(10_000, alias="UPDATE_DEDUPE_SIZE")
+    update_dedupe_persist: bool = Field(False, alias="UPDATE_DEDUPE_PERSIST")
+    update_dedupe_window: int = Field(86_400, alias="UPDATE_DEDUPE_WINDOW")
+    # supabase | sqlite | memory
+    fsm_storage: str = Field("supabase", alias="FSM_STORAGE")
+    fsm_sqlite_path: str = Field("fsm_states.sqlite3", alias="FSM_SQLITE_PATH")
+    fsm_ttl: int = Field(86_400, alias="FSM_TTL")
+    fsm_cache_size: int = Field(10_000, alias="FSM_CACHE_SIZE")
+    fsm_cache_ttl: float = Field(10.0, alias="FSM_CACHE_TTL")
+    bitrix_app_token: str | None = Field(None, alias="BITRIX_APP_TOKEN")
+    bitrix_events_debounce: float = Field(2.0, alias="BITRIX_EVENTS_DEBOUNCE")
 
     model_config = {
         "env_file": ".env",
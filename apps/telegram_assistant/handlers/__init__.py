@@ -2,5 +2,6 @@ from .start import register_start
 from .help import register_help
 from .today import register_today
 from .code import register_code
+from .pages import register_pages
 
-__all__ = ["register_start", "register_help", "register_today", "register_code"]
+__all__ = ["register_start", "register_help", "register_today", "register_code", "register_pages"]
@@ -1,21 +1,25 @@
 import logging
-from datetime import datetime, timezone
+import time
 
 from aiogram import Router
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
 from aiogram.types import Message
 
-from apps.telegram_assistant.utils.otp import hash_code, verify_code
+from apps.telegram_assistant.handlers.start import LOCKED_REPLY
+from apps.telegram_assistant.utils.otp import AttemptLimiter, is_expired, verify_code
 
 logger = logging.getLogger(__name__)
 
+OTP_LOCKOUT = 3600
 
-def register_code(router: Router) -> None:
-    @router.message(commands={"code"})
-    async def cmd_code(message: Message) -> None:
+
+def register_code(router: Router, otp_secret: bytes, limiter: AttemptLimiter, lockout: int = OTP_LOCKOUT) -> None:
+    @router.message(Command("code"))
+    async def cmd_code(message: Message, state: FSMContext) -> None:
         try:
-            bot = message.bot
-            supabase = bot["supabase"]
-            bitrix = bot["bitrix"]
+            supabase = message.bot["supabase"]
+            telegram_id = message.from_user.id
 
             parts = message.text.split(maxsplit=1)
             if len(parts) < 2:
@@ -23,39 +27,43 @@ def register_code(router: Router) -> None:
                 return
             code = parts[1].strip()
 
-            record = supabase.get_auth_code(message.from_user.id, email=None)
-            if not record:
+            # вызов из /start и блокировка лежат в данных FSM: к Bitrix и auth_codes не ходим. Если /code пришёл
+            # позже FSM_CACHE_TTL, данные читаются одной строкой fsm_states — цена того, что вызов виден всем инстансам
+            data = await state.get_data()
+            if (data.get("otp_locked_until") or 0) > time.time():
+                await message.answer(LOCKED_REPLY)
+                return
+            challenge = data.get("otp")
+            if not challenge:
                 await message.answer("Не найдено ожидающих кодов. Выполните /start <email>.")
                 return
+            if is_expired(challenge):
+                await state.update_data(otp=None)
+                await message.answer("Код истёк. Выполните /start заново.")
+                return
 
-            email = record["email"]
-            expires_at_str = record.get("expires_at")
-            if expires_at_str:
-                try:
-                    expires_at = datetime.fromisoformat(expires_at_str.replace("Z", "+00:00"))
-                    if expires_at < datetime.now(timezone.utc):
-                        await message.answer("Код истёк. Выполните /start заново.")
-                        return
-                except Exception:
-                    pass
-
-            if not verify_code(code, record["code_hash"]):
-                await message.answer("Неверный код. Повторите /start для нового кода.")
+            if not limiter.hit(telegram_id):
+                # счётчик попыток живёт в памяти инстанса, а блокировка сохраняется — её видят все инстансы
+                limiter.reset(telegram_id)
+                await state.update_data(otp=None, otp_locked_until=int(time.time()) + lockout)
+                logger.warning("OTP attempts exceeded for %s, locked for %ss", telegram_id, lockout)
+                await message.answer(LOCKED_REPLY)
                 return
 
-            bitrix_user = await bitrix.find_user_by_email(email)
-            if not bitrix_user:
-                await message.answer("Пользователь в Bitrix24 не найден. Проверьте email и выполните /start заново.")
+            if not verify_code(otp_secret, challenge, telegram_id, code):
+                await message.answer("Неверный код. Попробуйте ещё раз или повторите /start для нового кода.")
                 return
 
-            supabase.upsert_user(
+            limiter.reset(telegram_id)
+            await supabase.upsert_user(
                 {
-                    "telegram_id": message.from_user.id,
+                    "telegram_id": telegram_id,
                     "telegram_chat_id": message.chat.id,
-                    "bitrix_user_id": int(bitrix_user["ID"]),
-                    "email": email,
+                    "bitrix_user_id": int(challenge["bitrix_user_id"]),
+                    "email": challenge["email"],
                 }
             )
+            await state.update_data(otp=None)
             await message.answer("Привязка завершена. Используйте /today для дайджеста.")
         except Exception as e:
             logger.error("Error in cmd_code: %s", e, exc_info=True)
@@ -1,9 +1,10 @@
 from aiogram import Router
+from aiogram.filters import Command
 from aiogram.types import Message
 
 
 def register_help(router: Router) -> None:
-    @router.message(commands={"help"})
+    @router.message(Command("help"))
     async def cmd_help(message: Message) -> None:
         await message.answer(
             "Доступные команды:\n"
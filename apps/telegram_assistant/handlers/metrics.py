@@ -0,0 +1,31 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from packages.metrics import REGISTRY
+
+HANDLER_SECONDS = REGISTRY.histogram("telegram_handler_seconds", "aiogram handler latency", ["handler"])
+HANDLER_ERRORS = REGISTRY.counter("telegram_handler_errors_total", "aiogram handlers that raised", ["handler"])
+
+
+class HandlerMetrics(BaseMiddleware):
+    """Inner middleware: latency and errors of every handler, labelled by its function name."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = handler_object.callback.__name__ if handler_object is not None else type(event).__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, name)
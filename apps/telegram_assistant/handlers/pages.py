@@ -0,0 +1,55 @@
+import logging
+from typing import Optional
+
+from aiogram import F, Router
+from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
+
+from apps.telegram_assistant.services.pages import PageSnapshot, PageSnapshots
+from apps.telegram_assistant.utils.render import paginate
+
+logger = logging.getLogger(__name__)
+
+PAGE_CALLBACK = "pg"
+STALE_REPLY = "Дайджест устарел, запросите /today заново."
+
+
+def page_keyboard(snapshot: Optional[PageSnapshot], page: int) -> Optional[InlineKeyboardMarkup]:
+    if snapshot is None or len(snapshot.pages) < 2:
+        return None
+    total = len(snapshot.pages)
+    row = []
+    if page > 0:
+        row.append(InlineKeyboardButton(text="« Назад", callback_data=f"{PAGE_CALLBACK}:{snapshot.token}:{page - 1}"))
+    row.append(InlineKeyboardButton(text=f"{page + 1}/{total}", callback_data=f"{PAGE_CALLBACK}:noop"))
+    if page < total - 1:
+        row.append(InlineKeyboardButton(text="Вперёд »", callback_data=f"{PAGE_CALLBACK}:{snapshot.token}:{page + 1}"))
+    return InlineKeyboardMarkup(inline_keyboard=[row])
+
+
+async def answer_pages(message: Message, snapshots: Optional[PageSnapshots], text: str) -> None:
+    """Send the first page with navigation; the rest stay in `snapshots` for the buttons."""
+    pages = paginate(text)
+    if snapshots is None:
+        for page in pages:
+            await message.answer(page)
+        return
+    snapshot = PageSnapshot.create(pages) if len(pages) > 1 else None
+    if snapshot is not None:
+        await snapshots.put(message.from_user.id, snapshot)
+    await message.answer(pages[0], reply_markup=page_keyboard(snapshot, 0))
+
+
+def register_pages(router: Router, snapshots: PageSnapshots) -> None:
+    @router.callback_query(F.data.startswith(f"{PAGE_CALLBACK}:"))
+    async def on_page(query: CallbackQuery) -> None:
+        _, token, *rest = query.data.split(":")
+        if token == "noop":
+            await query.answer()
+            return
+        snapshot = await snapshots.get(query.from_user.id, token)
+        page = int(rest[0]) if rest and rest[0].isdigit() else -1
+        if snapshot is None or not 0 <= page < len(snapshot.pages) or not isinstance(query.message, Message):
+            await query.answer(STALE_REPLY, show_alert=True)
+            return
+        await query.message.edit_text(snapshot.pages[page], reply_markup=page_keyboard(snapshot, page))
+        await query.answer()
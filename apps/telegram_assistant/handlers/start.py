@@ -1,16 +1,22 @@
 import logging
+import time
 
 from aiogram import Router
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
 from aiogram.types import Message
 
-from apps.telegram_assistant.utils.otp import expires_at, generate_code, hash_code
+from apps.telegram_assistant.utils.otp import OTP_TTL, issue_code
+from packages.bitrix_client.models import User
 
 logger = logging.getLogger(__name__)
 
+LOCKED_REPLY = "Слишком много неверных попыток ввода кода. Попробуйте позже."
 
-def register_start(router: Router) -> None:
-    @router.message(commands={"start"})
-    async def cmd_start(message: Message) -> None:
+
+def register_start(router: Router, otp_secret: bytes, otp_ttl: int = OTP_TTL) -> None:
+    @router.message(Command("start"))
+    async def cmd_start(message: Message, state: FSMContext) -> None:
         try:
             bot = message.bot
             supabase = bot["supabase"]
@@ -22,33 +28,34 @@ def register_start(router: Router) -> None:
                 return
             email = parts[1].strip()
 
-            user = supabase.get_user_by_telegram_id(message.from_user.id)
+            data = await state.get_data()
+            if (data.get("otp_locked_until") or 0) > time.time():
+                await message.answer(LOCKED_REPLY)
+                return
+
+            user = await supabase.get_user_by_telegram_id(message.from_user.id)
             if user:
                 await message.answer("Вы уже зарегистрированы. Используйте /today для дайджеста.")
                 return
 
-            bitrix_user = await bitrix.find_user_by_email(email)
-            if not bitrix_user:
+            found = await bitrix.find_user_by_email(email)
+            bitrix_user = User.from_bitrix(found) if found else None
+            # уволенный (деактивированный) сотрудник привязаться не может
+            if bitrix_user is None or not bitrix_user.active:
                 await message.answer("Не удалось найти пользователя в Bitrix24 по этому email.")
                 return
 
-            code = generate_code()
+            bitrix_user_id = bitrix_user.id
+            code, challenge = issue_code(otp_secret, message.from_user.id, email, bitrix_user_id, ttl=otp_ttl)
             try:
-                await bitrix.send_im_notify(int(bitrix_user["ID"]), f"Код подтверждения Telegram: {code}")
+                await bitrix.send_im_notify(bitrix_user_id, f"Код подтверждения Telegram: {code}")
             except Exception as e:
                 logger.error("Failed to send im.notify: %s", e)
                 await message.answer("Не удалось отправить код через Bitrix24. Проверьте права webhook (im.notify).")
                 return
 
-            supabase.insert_auth_code(
-                {
-                    "telegram_id": message.from_user.id,
-                    "email": email,
-                    "code_hash": hash_code(code),
-                    "expires_at": expires_at(),
-                    "attempts": 0,
-                }
-            )
+            # код нигде не хранится: в FSM лежит только подписанный HMAC вызов, /code сверяет его локально
+            await state.update_data(otp=challenge)
 
             await message.answer("Код отправлен в Bitrix24 (im.notify). Введите /code 123456 чтобы завершить привязку.")
         except Exception as e:
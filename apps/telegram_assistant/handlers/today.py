@@ -1,104 +1,150 @@
-from datetime import timedelta
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional
 
 from aiogram import Router
+from aiogram.filters import Command
 from aiogram.types import Message
-from dateutil import parser
 
-from apps.telegram_assistant.utils.dates import day_bounds, now_utc
+from apps.telegram_assistant.handlers.pages import answer_pages
+from apps.telegram_assistant.services.digest import plan_digest, render_target
+from apps.telegram_assistant.services.pages import PageSnapshots
+from apps.telegram_assistant.services.pipeline import Failure, Pipeline, Stage
+from apps.telegram_assistant.services.sync import (
+    ENTITY_EVENT,
+    ENTITY_TASK,
+    sync_events,
+    sync_tasks,
+)
+from apps.telegram_assistant.utils.dates import now_utc
+from packages.bitrix_client.models import parse_datetime
 
+logger = logging.getLogger(__name__)
 
-async def build_summary(supabase, bitrix, user, default_timezone: str) -> str:
-    tz = user.get("timezone") or default_timezone
-    now = now_utc()
-    start_day, end_day = day_bounds(now, tz)
 
-    tasks_today = await bitrix.list_tasks(
-        responsible_id=int(user["bitrix_user_id"]),
-        deadline_from=start_day,
-        deadline_to=end_day,
-    )
-    tasks_overdue = await bitrix.list_tasks(
-        responsible_id=int(user["bitrix_user_id"]),
-        deadline_to=start_day,
+# фоновые обновления кэша по bitrix_user_id: не больше одного на пользователя
+_background_refreshes: Dict[int, asyncio.Task] = {}
+
+
+async def refresh_user_cache(supabase, bitrix, bitrix_user_id: int, start_day, end_day, states) -> None:
+    # sync_state прочитан заранее одним запросом, поэтому оба вызова Bitrix уходят в одном тике — одним batch
+    await asyncio.gather(
+        sync_tasks(supabase, bitrix, bitrix_user_id, state=states.get((bitrix_user_id, ENTITY_TASK))),
+        # события на сегодня
+        sync_events(
+            supabase,
+            bitrix,
+            bitrix_user_id,
+            start_day,
+            end_day + timedelta(seconds=1),
+            state=states.get((bitrix_user_id, ENTITY_EVENT)),
+        ),
     )
 
-    # события на сегодня
-    events_today = await bitrix.list_events(
-        user_id=int(user["bitrix_user_id"]),
-        date_from=start_day,
-        date_to=end_day + timedelta(seconds=1),
+
+def _cache_age(states, bitrix_user_id: int, now: datetime, start_day: datetime) -> Optional[timedelta]:
+    """Age of the least recently refreshed entity; None when the cache cannot be served at all."""
+    refreshed = []
+    for entity_type in (ENTITY_TASK, ENTITY_EVENT):
+        refreshed_at = parse_datetime((states.get((bitrix_user_id, entity_type)) or {}).get("refreshed_at"))
+        if refreshed_at is None:
+            return None
+        refreshed.append(refreshed_at)
+    # окно событий привязано к дню: вчерашняя сверка не покрывает сегодняшние события
+    if refreshed[1] < start_day:
+        return None
+    return now - min(refreshed)
+
+
+def _refresh_in_background(supabase, bitrix, bitrix_user_id: int, start_day, end_day, states) -> None:
+    running = _background_refreshes.get(bitrix_user_id)
+    if running is not None and not running.done():
+        return
+
+    async def run() -> None:
+        try:
+            await refresh_user_cache(supabase, bitrix, bitrix_user_id, start_day, end_day, states)
+        except Exception as err:  # noqa: BLE001
+            logger.error("Background cache refresh failed for %s: %s", bitrix_user_id, err)
+        finally:
+            _background_refreshes.pop(bitrix_user_id, None)
+
+    _background_refreshes[bitrix_user_id] = asyncio.ensure_future(run())
+
+
+async def refresh_target(supabase, bitrix, target, max_staleness: Optional[timedelta]):
+    """Fetch stage of /today: bring the cache up to date only as far as `max_staleness` requires."""
+    now = now_utc()
+    bitrix_user_id = target.bitrix_user_id
+    states = await supabase.get_sync_states([bitrix_user_id])
+    age = _cache_age(states, bitrix_user_id, now, target.start_day) if max_staleness is not None else None
+    if age is None:
+        await refresh_user_cache(supabase, bitrix, bitrix_user_id, target.start_day, target.end_day, states)
+    elif age > max_staleness:
+        logger.info("Serving stale cache for %s (age %s), refreshing in background", bitrix_user_id, age)
+        _refresh_in_background(supabase, bitrix, bitrix_user_id, target.start_day, target.end_day, states)
+    return target
+
+
+async def load_cached(supabase, target):
+    """Normalize stage of /today: the summary is built from tasks_cache/events_cache rows."""
+    bitrix_user_id = target.bitrix_user_id
+    target.tasks_today, target.tasks_overdue, target.events_today = await asyncio.gather(
+        supabase.get_tasks_cache(bitrix_user_id, deadline_from=target.start_day, deadline_to=target.end_day),
+        supabase.get_tasks_cache(bitrix_user_id, deadline_to=target.start_day),
+        supabase.get_events_cache(bitrix_user_id, target.start_day, target.end_day + timedelta(seconds=1)),
     )
+    return target
 
-    cached_rows = []
-    for item in tasks_today + tasks_overdue:
-        deadline_str = item.get("DEADLINE")
-        deadline_dt = parser.isoparse(deadline_str) if deadline_str else None
-        updated_str = item.get("CHANGED_DATE") or item.get("CREATED_DATE")
-        updated_dt = parser.isoparse(updated_str) if updated_str else None
-        cached_rows.append(
-            {
-                "bitrix_task_id": int(item["ID"]),
-                "bitrix_user_id": int(user["bitrix_user_id"]),
-                "title": item["TITLE"],
-                "status": item["STATUS"],
-                "deadline": deadline_dt.isoformat() if deadline_dt else None,
-                "updated_at": updated_dt.isoformat() if updated_dt else None,
-                "raw_payload": item,
-            }
-        )
-    supabase.upsert_tasks_cache(cached_rows)
-
-    event_rows = []
-    for ev in events_today:
-        start = ev.get("DATE_FROM")
-        end = ev.get("DATE_TO")
-        start_dt = parser.isoparse(start) if start else None
-        end_dt = parser.isoparse(end) if end else None
-        event_rows.append(
-            {
-                "bitrix_event_id": int(ev["ID"]),
-                "bitrix_user_id": int(user["bitrix_user_id"]),
-                "title": ev.get("NAME") or ev.get("TITLE") or "Событие",
-                "start_at": start_dt.isoformat() if start_dt else None,
-                "end_at": end_dt.isoformat() if end_dt else None,
-                "updated_at": ev.get("DATE_CREATE"),
-                "raw_payload": ev,
-            }
-        )
-    supabase.upsert_events_cache(event_rows)
-
-    def fmt_tasks(items):
-        rows = []
-        for item in items:
-            deadline = item.get("DEADLINE")
-            rows.append(f"- {item.get('TITLE')} (до {deadline or '—'})")
-        return "\n".join(rows) if rows else "—"
-
-    def fmt_events(items):
-        rows = []
-        for ev in items:
-            rows.append(f"- {ev.get('NAME') or ev.get('TITLE') or 'Событие'} ({ev.get('DATE_FROM')} - {ev.get('DATE_TO')})")
-        return "\n".join(rows) if rows else "—"
-
-    text = (
-        f"Задачи на сегодня (tz {tz}):\n{fmt_tasks(tasks_today)}\n\n"
-        f"Просроченные:\n{fmt_tasks(tasks_overdue)}\n\n"
-        f"События сегодня:\n{fmt_events(events_today)}"
+
+def today_pipeline(supabase, bitrix, max_staleness: Optional[timedelta] = None) -> Pipeline:
+    return Pipeline(
+        [
+            Stage("fetch", lambda target: refresh_target(supabase, bitrix, target, max_staleness)),
+            Stage("load", lambda target: load_cached(supabase, target)),
+            Stage("render", render_target),
+        ]
     )
-    return text
 
 
-def register_today(router: Router, default_timezone: str) -> None:
-    @router.message(commands={"today"})
+async def build_summary(
+    supabase,
+    bitrix,
+    user,
+    default_timezone: str,
+    max_staleness: Optional[timedelta] = None,
+) -> str:
+    """Render the daily summary from tasks_cache/events_cache.
+
+    Without `max_staleness` the cache is always synced first. With it, a cache
+    refreshed within `max_staleness` is served as is, an older one is served
+    immediately while a background refresh runs (stale-while-revalidate), and
+    only a cold cache is synced inline.
+    """
+    (item,) = await today_pipeline(supabase, bitrix, max_staleness).run(plan_digest([user], default_timezone)[0])
+    if isinstance(item, Failure):
+        raise item.error
+    return item.text
+
+
+def register_today(
+    router: Router,
+    default_timezone: str,
+    max_staleness: Optional[timedelta] = None,
+    snapshots: Optional[PageSnapshots] = None,
+) -> None:
+    @router.message(Command("today"))
     async def cmd_today(message: Message) -> None:
         bot = message.bot
         supabase = bot["supabase"]
         bitrix = bot["bitrix"]
 
-        user = supabase.get_user_by_telegram_id(message.from_user.id)
+        user = await supabase.get_user_by_telegram_id(message.from_user.id)
         if not user:
             await message.answer("Сначала выполните /start <email> для привязки.")
             return
 
-        text = await build_summary(supabase, bitrix, user, default_timezone)
-        await message.answer(text)
+        text = await build_summary(supabase, bitrix, user, default_timezone, max_staleness=max_staleness)
+        # длинный дайджест уходит постранично, листание обслуживается из снимка без запросов к Bitrix
+        await answer_pages(message, snapshots, text)
@@ -1,58 +1,30 @@
+import asyncio
+import hmac
 import logging
-import json
-import os
 import time
-from typing import Dict, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
 
-from aiogram import Bot, Dispatcher
-from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.types import Update
-from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi import BackgroundTasks, FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+
+from apps.telegram_assistant.utils.diagnostics import agent_log as _agent_log, get_sink
+from packages.metrics import REGISTRY
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
 logger = logging.getLogger(__name__)
 
-# region agent log
-def _agent_log(hypothesis_id: str, location: str, message: str, data: dict | None = None) -> None:
-    # Debug-mode NDJSON logger (local runs only). Never log secrets.
-    try:
-        payload = {
-            "sessionId": "debug-session",
-            "runId": os.getenv("AGENT_RUN_ID", "pre-fix"),
-            "hypothesisId": hypothesis_id,
-            "location": location,
-            "message": message,
-            "data": data or {},
-            "timestamp": int(time.time() * 1000),
-        }
-        log_path = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")), ".cursor", "debug.log")
-        with open(log_path, "a", encoding="utf-8") as f:
-            f.write(json.dumps(payload, ensure_ascii=False) + "\n")
-    except Exception:
-        pass
-# endregion agent log
-
-# Try to import settings and initialize bot
-settings = None
-bot: Optional[Bot] = None
-dp: Optional[Dispatcher] = None
-bitrix_client = None
-supabase_client = None
-
-try:
-    from apps.telegram_assistant.config import settings as _settings
-    from apps.telegram_assistant.handlers import (
-        register_code,
-        register_help,
-        register_start,
-        register_today,
-    )
-    from apps.telegram_assistant.handlers.today import build_summary
-    from packages.bitrix_client import BitrixClient
-    from packages.supabase_db import SupabaseClient
-    
-    settings = _settings
+JOB_SECONDS = REGISTRY.histogram("digest_job_seconds", "Cron job duration", ["job"])
+JOB_ERRORS = REGISTRY.counter("digest_job_errors_total", "Cron jobs that raised", ["job"])
+JOB_NOTIFIED = REGISTRY.counter("digest_users_notified_total", "Digests delivered by cron jobs", ["job"])
+
+# Настройки читаем сразу (это дёшево), а aiogram и клиенты Bitrix/Supabase создаются при первом обращении:
+# холодный старт на Vercel не платит за то, что конкретному запросу не нужно
+from apps.telegram_assistant.runtime import Runtime, load_settings  # noqa: E402
+
+settings = load_settings()
+runtime = Runtime(settings)
+if settings is not None:
     _agent_log(
         "H_env_init",
         "apps/telegram_assistant/main.py:init",
@@ -65,44 +37,9 @@ try:
             "hasCronSecret": bool(getattr(settings, "cron_secret", None)),
         },
     )
-    
-    # Initialize bot and dependencies
-    bot = Bot(token=settings.telegram_bot_token, parse_mode=ParseMode.HTML)
-    dp = Dispatcher(storage=MemoryStorage())
-
-    bitrix_client = BitrixClient(settings.bitrix24_webhook)
-    supabase_client = SupabaseClient(settings.supabase_url, settings.supabase_service_role_key)
-
-    # Share dependencies via bot context
-    bot["bitrix"] = bitrix_client
-    bot["supabase"] = supabase_client
-
-    register_start(dp)
-    register_help(dp)
-    register_today(dp, settings.default_timezone)
-    register_code(dp)
-    
-    logger.info("Bot initialized successfully")
-    _agent_log("H_env_init", "apps/telegram_assistant/main.py:init", "bot initialized", {"ok": True})
-except Exception as e:
-    logger.error("Failed to initialize bot: %s", e, exc_info=True)
-    _agent_log("H_env_init", "apps/telegram_assistant/main.py:init", "bot init failed", {"errorType": type(e).__name__})
-    # Bot will be None, but app can still serve health endpoint
-
-
-# Global error handler for aiogram (only if dp is initialized)
-if dp is not None:
-    @dp.errors()
-    async def error_handler(update, exception):
-        logger.error("Unhandled error in dispatcher: %s", exception, exc_info=True)
-        try:
-            if update and update.message:
-                await update.message.answer(
-                    "Произошла ошибка при обработке команды. Попробуйте позже или используйте /help."
-                )
-        except Exception:
-            pass  # Ignore errors in error handling
-        return True
+else:
+    _agent_log("H_env_init", "apps/telegram_assistant/main.py:init", "settings init failed", {})
+    # Bot will be unavailable, but app can still serve health endpoint
 
 app = FastAPI(title="wookiee-ai-assistant")
 
@@ -112,18 +49,43 @@ async def on_startup() -> None:
     logger.info("Telegram assistant started")
 
 
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    await runtime.aclose()
+    logger.info("Telegram assistant stopped")
+
+
 @app.get("/health")
-async def health() -> Dict[str, str]:
+async def health() -> Dict:
     """Health check endpoint that works even if bot is not initialized"""
     logger.info("health endpoint: Request received")
     try:
         status = {
             "status": "ok",
-            "bot_initialized": bot is not None and dp is not None,
+            "bot_initialized": settings is not None,
         }
+        # только то, что уже создано: /health ничего не инициализирует
+        if runtime.built("bitrix"):
+            status["bitrix_limiter"] = runtime.bitrix.limiter.stats()
+            status["bitrix_cache"] = runtime.bitrix.stats()
+        if runtime.built("telegram_queue"):
+            status["telegram_queue"] = runtime.telegram_queue.stats()
+        if runtime.built("update_queue") and runtime.update_queue is not None:
+            # только счётчики процесса: очередь в БД отдаёт /jobs/drain_updates
+            status["update_queue"] = runtime.update_queue.stats()
+        if runtime.built("update_dedupe"):
+            status["update_dedupe"] = runtime.update_dedupe.stats()
+        if runtime.built("fsm_storage") and hasattr(runtime.fsm_storage, "stats"):
+            status["fsm_storage"] = runtime.fsm_storage.stats()
+        if runtime.built("otp_limiter"):
+            status["otp_limiter"] = runtime.otp_limiter.stats()
+        if runtime.built("page_snapshots"):
+            status["page_snapshots"] = runtime.page_snapshots.stats()
+        if get_sink() is not None:
+            status["diagnostics"] = get_sink().stats()
         _agent_log("H_runtime_requests", "apps/telegram_assistant/main.py:health", "health called", {"botInitialized": status["bot_initialized"]})
         logger.info(f"health endpoint: bot_initialized={status['bot_initialized']}")
-        if bot is None or dp is None:
+        if settings is None:
             status["error"] = "Bot not initialized. Check environment variables in Vercel."
             status["required_vars"] = [
                 "TELEGRAM_BOT_TOKEN",
@@ -139,9 +101,16 @@ async def health() -> Dict[str, str]:
         raise
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics(x_cron_secret: str | None = Header(default=None, alias="X-CRON-SECRET")) -> PlainTextResponse:
+    """Prometheus text exposition of this process's in-memory metrics (same CRON_SECRET check as the jobs)."""
+    verify_cron(x_cron_secret)
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/webhook/telegram")
-async def telegram_webhook(request: Request) -> Dict[str, str]:
-    if bot is None or dp is None:
+async def telegram_webhook(request: Request, background_tasks: BackgroundTasks) -> Dict[str, str]:
+    if settings is None:
         logger.error("Bot not initialized - check environment variables")
         _agent_log("H_runtime_requests", "apps/telegram_assistant/main.py:webhook", "webhook rejected (bot not initialized)", {})
         return {"status": "error", "detail": "Bot not initialized. Check environment variables in Vercel."}
@@ -151,66 +120,413 @@ async def telegram_webhook(request: Request) -> Dict[str, str]:
         body = await request.json()
         logger.info("Received webhook update: %s", body.get("update_id"))
         _agent_log("H_runtime_requests", "apps/telegram_assistant/main.py:webhook", "webhook received", {"hasUpdateId": "update_id" in body})
-        update = Update.model_validate(body)
-        await dp.feed_update(bot, update)
+        # повторная доставка того же апдейта (webhook ответил медленно или с ошибкой)
+        if await runtime.update_dedupe.seen(body.get("update_id")):
+            logger.info("Skipping duplicate update %s", body.get("update_id"))
+            return {"status": "duplicate"}
+        if runtime.update_queue is not None:
+            return await _enqueue_update(body, background_tasks)
+        await runtime.process_update(body)
         logger.info("Update processed successfully")
         _agent_log("H_runtime_requests", "apps/telegram_assistant/main.py:webhook", "webhook processed", {"ok": True})
         return {"status": "processed"}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("Error processing webhook: %s", e, exc_info=True)
         _agent_log("H_runtime_requests", "apps/telegram_assistant/main.py:webhook", "webhook error", {"errorType": type(e).__name__})
-        # Try to send error message to user if possible
-        try:
-            if body and "message" in body and bot:
-                chat_id = body["message"].get("chat", {}).get("id")
-                if chat_id:
-                    await bot.send_message(
-                        chat_id=chat_id,
-                        text="Произошла ошибка при обработке запроса. Попробуйте позже."
-                    )
-        except Exception:
-            pass  # Ignore errors in error handling
         return {"status": "error", "detail": str(e)}
 
 
+async def _enqueue_update(body: Dict, background_tasks: BackgroundTasks) -> Dict[str, str]:
+    from apps.telegram_assistant.services.update_queue import DUPLICATE, FULL
+
+    if "update_id" not in body:
+        raise HTTPException(status_code=400, detail="Not a Telegram update")
+    update_queue = runtime.update_queue
+    status = await update_queue.submit(body)
+    if status == FULL:
+        # Telegram повторит доставку позже
+        await runtime.update_dedupe.forget(body["update_id"])
+        raise HTTPException(status_code=503, detail="Update queue is full")
+    if status != DUPLICATE and settings.telegram_update_mode == "durable":
+        # выполняется после отправки ответа; если платформа заморозит функцию, добьёт /jobs/drain_updates
+        background_tasks.add_task(update_queue.drain, settings.update_drain_budget)
+    return {"status": status}
+
+
+@app.post("/webhook/bitrix")
+async def bitrix_webhook(request: Request) -> Dict[str, str]:
+    if settings is None:
+        return {"status": "error", "detail": "Bot not initialized. Check environment variables."}
+    from apps.telegram_assistant.services.bitrix_events import event_target, parse_event
+
+    payload = parse_event(await request.body())
+    token = payload.get("auth[application_token]", "")
+    if not settings.bitrix_app_token or not hmac.compare_digest(token, settings.bitrix_app_token):
+        raise HTTPException(status_code=401, detail="Invalid application token")
+    target = event_target(payload)
+    if target is None:
+        logger.info("Ignoring Bitrix event %s", payload.get("event"))
+        return {"status": "ignored"}
+    await runtime.bitrix_events.submit(*target)
+    return {"status": "accepted"}
+
+
 def verify_cron(secret_header: str | None) -> None:
     if settings is None:
         raise HTTPException(status_code=500, detail="Settings not initialized")
-    if settings.cron_secret and secret_header != settings.cron_secret:
+    if settings.cron_secret and not hmac.compare_digest(
+        (secret_header or "").encode(), settings.cron_secret.encode()
+    ):
         raise HTTPException(status_code=401, detail="Invalid CRON secret")
 
 
+async def _timed_job(job: str, run) -> Dict:
+    started = time.perf_counter()
+    try:
+        result = await run
+    except Exception:
+        JOB_ERRORS.inc(job)
+        raise
+    finally:
+        JOB_SECONDS.observe(time.perf_counter() - started, job)
+    JOB_NOTIFIED.inc(job, amount=result.get("users_notified", 0))
+    return result
+
+
+DIGEST_TITLES = {"morning": "Утренний дайджест", "evening": "Вечерний дайджест"}
+
+
+def _stream_digests(targets: List[Dict], contexts: Optional[List], deliver, deadline, moments: Optional[List] = None):
+    """Runs the digest pipeline (sync → load → render → deliver) for `targets`."""
+    from apps.telegram_assistant.services.digest import digest_pipeline, plan_digest
+
+    pipeline = digest_pipeline(
+        runtime.supabase,
+        runtime.bitrix,
+        deliver,
+        deadline=deadline,
+        deliver_concurrency=settings.digest_concurrency,
+    )
+    chunks = plan_digest(targets, settings.default_timezone, settings.digest_chunk_size, contexts=contexts, moments=moments)
+    return pipeline, pipeline.stream(chunks)
+
+
+async def _deliver_digest(target, kind: str, key: str) -> str | None:
+    from apps.telegram_assistant.handlers.pages import page_keyboard
+    from apps.telegram_assistant.services.pages import PageSnapshot
+    from apps.telegram_assistant.utils.render import paginate
+
+    # длиннее лимита Telegram — первая страница с кнопками, остальные листаются из снимка (память + page_snapshots)
+    pages = paginate(f"{DIGEST_TITLES[kind]}:\n\n{target.text}")
+    snapshot = PageSnapshot.create(pages) if len(pages) > 1 else None
+    status = await runtime.telegram_queue.deliver(
+        runtime.bot,
+        target.user["telegram_chat_id"],
+        pages[0],
+        key,
+        {"kind": kind, "pages": len(pages)},
+        reply_markup=page_keyboard(snapshot, 0),
+    )
+    if status is None and snapshot is not None:
+        await runtime.page_snapshots.put(target.telegram_id, snapshot)
+    return status
+
+
+async def _run_digest(kind: str, shard: int, shards: int) -> Dict:
+    from zoneinfo import ZoneInfo
+
+    from apps.telegram_assistant.services.digest import digest_outcome
+    from apps.telegram_assistant.services.executor import STATUS_DUPLICATE, STATUS_OK, Deadline
+    from apps.telegram_assistant.services.sharding import advance_cursor, count_failures, digest_dedupe_key, shard_users
+
+    if not 0 <= shard < shards:
+        raise HTTPException(status_code=400, detail="shard must be in [0, shards)")
+    deadline = Deadline(budget=settings.digest_time_budget)
+    digest_date = datetime.now(ZoneInfo(settings.default_timezone)).date()
+
+    cursor_row = await runtime.supabase.get_digest_cursor(digest_date, kind, shard, shards) or {}
+    if cursor_row.get("completed"):
+        return {"status": "ok", "completed": True, "users_notified": 0, "cursor": cursor_row.get("last_telegram_id")}
+    cursor = cursor_row.get("last_telegram_id")
+
+    users = shard_users(await runtime.supabase.get_all_users(), shard, shards)
+    pending = [user for user in users if cursor is None or int(user["telegram_id"]) > cursor]
+    keys = {int(user["telegram_id"]): digest_dedupe_key(digest_date, kind, user["telegram_id"]) for user in pending}
+    sent_keys = await runtime.supabase.get_outbox_keys(list(keys.values()))
+    already_sent = [telegram_id for telegram_id, key in keys.items() if key in sent_keys]
+    page = [user for user in pending if keys[int(user["telegram_id"])] not in sent_keys][: settings.digest_page_size]
+
+    async def deliver(target) -> str | None:
+        return await _deliver_digest(target, kind, keys[target.telegram_id])
+
+    pipeline, stream = _stream_digests(page, None, deliver, deadline)
+    outcomes = [digest_outcome(item, key=lambda target: target.telegram_id) async for item in stream]
+    for outcome in outcomes:
+        if outcome.status not in (STATUS_OK, STATUS_DUPLICATE):
+            logger.error("Failed to send %s digest for %s: %s", kind, outcome.key, outcome.error)
+
+    failures = count_failures(cursor_row.get("failures") or {}, outcomes)
+    new_cursor = advance_cursor(pending, {o.key: o for o in outcomes}, already_sent, cursor, failures)
+    completed = not pending or new_cursor == int(pending[-1]["telegram_id"])
+    # пройденных курсором пользователей больше не повторяем — их счётчики не нужны
+    failures = {key: count for key, count in failures.items() if new_cursor is None or int(key) > new_cursor}
+    await runtime.supabase.upsert_digest_cursor(digest_date, kind, shard, shards, new_cursor, completed, failures)
+    return {
+        "status": "ok",
+        "shard": shard,
+        "shards": shards,
+        "completed": completed,
+        "cursor": new_cursor,
+        "users_total": len(users),
+        "users_remaining": sum(1 for user in pending if new_cursor is None or int(user["telegram_id"]) > new_cursor),
+        "users_notified": sum(1 for o in outcomes if o.status == STATUS_OK),
+        "elapsed_ms": int(deadline.elapsed() * 1000),
+        "stages": {name: stats.as_dict() for name, stats in pipeline.stats.items()},
+        "outcomes": [o.as_dict() for o in outcomes],
+    }
+
+
+def _render_key(row: Dict, user: Dict):
+    from apps.telegram_assistant.services.scheduler import local_digest_date, parse_fire_at
+
+    digest_date = local_digest_date(parse_fire_at(row["next_fire_at"]), user, settings.default_timezone)
+    return int(row["telegram_id"]), digest_date, row["kind"]
+
+
+async def _load_schedule_users(rows: List[Dict]) -> Dict[int, Dict]:
+    ids = sorted({int(row["telegram_id"]) for row in rows})
+    return {int(user["telegram_id"]): user for user in await runtime.supabase.get_users_by_telegram_ids(ids)}
+
+
+async def _run_scheduled_digests() -> Dict:
+    from apps.telegram_assistant.services.digest import digest_outcome, plan_digest
+    from apps.telegram_assistant.services.executor import STATUS_FAILED, STATUS_OK, Deadline
+    from apps.telegram_assistant.services.prerender import index_renders, prerendered_pipeline
+    from apps.telegram_assistant.services.scheduler import is_missed, next_row, parse_fire_at, retry_row
+    from apps.telegram_assistant.services.sharding import DONE_STATUSES, MAX_ATTEMPTS, digest_dedupe_key
+
+    deadline = Deadline(budget=settings.digest_time_budget)
+    now = datetime.now(timezone.utc)
+    max_lateness = timedelta(seconds=settings.digest_max_lateness)
+
+    # только пользователи, у которых локальное время дайджеста уже наступило
+    due = await runtime.supabase.get_due_digests(now, limit=settings.digest_page_size)
+    users = await _load_schedule_users(due)
+
+    items, missed, dropped = [], [], set()
+    for row in due:
+        telegram_id = int(row["telegram_id"])
+        user = users.get(telegram_id)
+        if user is None or not user.get("notifications_enabled", True):
+            dropped.add(telegram_id)
+        elif is_missed(parse_fire_at(row["next_fire_at"]), now, max_lateness):
+            missed.append(row)
+        else:
+            items.append(row)
+
+    keys = {id(row): _render_key(row, users[int(row["telegram_id"])]) for row in items}
+    renders = index_renders(
+        await runtime.supabase.get_digest_renders(
+            [key[0] for key in keys.values()], [key[1] for key in keys.values()]
+        )
+    )
+    warmed = [row for row in items if keys[id(row)] in renders]
+    cold = [row for row in items if keys[id(row)] not in renders]
+
+    async def deliver(target) -> str | None:
+        telegram_id, digest_date, kind = keys[id(target.context)]
+        return await _deliver_digest(target, kind, digest_dedupe_key(digest_date, kind, telegram_id))
+
+    # прогретые дайджесты читаются из кэша и только отправляются; остальные собираются через Bitrix
+    warm_pipeline, rerendered = prerendered_pipeline(
+        runtime.supabase,
+        renders,
+        lambda target: keys[id(target.context)],
+        deliver,
+        deadline=deadline,
+        deliver_concurrency=settings.digest_concurrency,
+    )
+    warm_chunks = plan_digest(
+        [users[int(row["telegram_id"])] for row in warmed],
+        settings.default_timezone,
+        settings.digest_chunk_size,
+        contexts=warmed,
+        moments=[parse_fire_at(row["next_fire_at"]) for row in warmed],
+    )
+    cold_pipeline, cold_stream = _stream_digests(
+        [users[int(row["telegram_id"])] for row in cold],
+        cold,
+        deliver,
+        deadline,
+        moments=[parse_fire_at(row["next_fire_at"]) for row in cold],
+    )
+    warm_items, cold_items = await asyncio.gather(
+        warm_pipeline.run(warm_chunks), _collect(cold_stream)
+    )
+
+    outcomes = [
+        digest_outcome(item, key=lambda target: (target.telegram_id, target.context["kind"]))
+        for item in warm_items + cold_items
+    ]
+    for outcome in outcomes:
+        if outcome.status == STATUS_FAILED:
+            logger.error("Failed to send %s digest for %s: %s", outcome.key[1], outcome.key[0], outcome.error)
+        elif outcome.status not in DONE_STATUSES:
+            logger.warning("Scheduled %s digest for %s deferred: %s", outcome.key[1], outcome.key[0], outcome.error)
+
+    # сдвигаем расписание только для обработанных; отложенные останутся в выборке следующего тика,
+    # неудачные — тоже, но не больше MAX_ATTEMPTS раз
+    statuses = {o.key: o.status for o in outcomes}
+    done, retried = list(missed), []
+    for row in items:
+        status = statuses.get((int(row["telegram_id"]), row["kind"]))
+        retry = retry_row(row, MAX_ATTEMPTS) if status == STATUS_FAILED else None
+        if retry:
+            retried.append(retry)
+        elif status == STATUS_FAILED or status in DONE_STATUSES:
+            done.append(row)
+    rescheduled = [next_row(row, users.get(int(row["telegram_id"])), now, settings.default_timezone) for row in done]
+    await asyncio.gather(
+        runtime.supabase.upsert_digest_schedule([row for row in rescheduled if row] + retried),
+        runtime.supabase.delete_digest_schedule(sorted(dropped)),
+    )
+    return {
+        "status": "ok",
+        "due": len(due),
+        "prerendered": len(warmed),
+        "rerendered": len(rerendered),
+        "users_notified": sum(1 for o in outcomes if o.status == STATUS_OK),
+        "retried": len(retried),
+        "missed": len(missed),
+        "dropped": len(dropped),
+        "elapsed_ms": int(deadline.elapsed() * 1000),
+        "stages": {
+            "prerendered": {name: stats.as_dict() for name, stats in warm_pipeline.stats.items()},
+            "cold": {name: stats.as_dict() for name, stats in cold_pipeline.stats.items()},
+        },
+        "outcomes": [{**o.as_dict(), "key": f"{o.key[0]}:{o.key[1]}"} for o in outcomes],
+    }
+
+
+async def _collect(stream) -> List:
+    return [item async for item in stream]
+
+
+async def _run_digest_warmup() -> Dict:
+    from apps.telegram_assistant.services.digest import digest_pipeline, plan_digest
+    from apps.telegram_assistant.services.executor import Deadline
+    from apps.telegram_assistant.services.pipeline import Failure
+    from apps.telegram_assistant.services.prerender import index_renders, render_row
+    from apps.telegram_assistant.services.scheduler import parse_fire_at
+
+    deadline = Deadline(budget=settings.digest_time_budget)
+    now = datetime.now(timezone.utc)
+
+    # дайджесты, которые уйдут в ближайшие DIGEST_WARMUP_LEAD секунд
+    upcoming = await runtime.supabase.get_due_digests(
+        now + timedelta(seconds=settings.digest_warmup_lead), limit=settings.digest_page_size, after=now
+    )
+    users = await _load_schedule_users(upcoming)
+    upcoming = [
+        row
+        for row in upcoming
+        if int(row["telegram_id"]) in users and users[int(row["telegram_id"])].get("notifications_enabled", True)
+    ]
+    keys = {id(row): _render_key(row, users[int(row["telegram_id"])]) for row in upcoming}
+    existing = index_renders(
+        await runtime.supabase.get_digest_renders(
+            [key[0] for key in keys.values()], [key[1] for key in keys.values()]
+        )
+    )
+    # уже прогретые не трогаем: изменения после прогрева поймает проверка хэша при отправке
+    todo = [row for row in upcoming if keys[id(row)] not in existing]
+
+    pipeline = digest_pipeline(runtime.supabase, runtime.bitrix, deadline=deadline)
+    chunks = plan_digest(
+        [users[int(row["telegram_id"])] for row in todo],
+        settings.default_timezone,
+        settings.digest_chunk_size,
+        contexts=todo,
+        moments=[parse_fire_at(row["next_fire_at"]) for row in todo],
+    )
+    rendered, failed = [], 0
+    async for item in pipeline.stream(chunks):
+        if isinstance(item, Failure):
+            failed += 1
+        else:
+            rendered.append(render_row(item, keys[id(item.context)]))
+    await runtime.supabase.upsert_digest_renders(rendered)
+    await runtime.supabase.delete_digest_renders_before(now.date() - timedelta(days=1))
+    await runtime.supabase.delete_expired_page_snapshots(now)
+    return {
+        "status": "ok",
+        "upcoming": len(upcoming),
+        "already_rendered": len(upcoming) - len(todo),
+        "rendered": len(rendered),
+        "failed": failed,
+        "elapsed_ms": int(deadline.elapsed() * 1000),
+        "stages": {name: stats.as_dict() for name, stats in pipeline.stats.items()},
+    }
+
+
 @app.post("/jobs/morning_digest")
-async def morning_digest(x_cron_secret: str | None = Header(default=None, alias="X-CRON-SECRET")) -> Dict[str, str]:
-    if bot is None or supabase_client is None or bitrix_client is None or settings is None:
+async def morning_digest(
+    x_cron_secret: str | None = Header(default=None, alias="X-CRON-SECRET"),
+    shard: int = Query(0, ge=0),
+    shards: int = Query(1, ge=1),
+) -> Dict:
+    if settings is None:
         return {"status": "error", "detail": "Bot not initialized. Check environment variables."}
-    from apps.telegram_assistant.handlers.today import build_summary
     verify_cron(x_cron_secret)
-    users = supabase_client.get_all_users()
-    processed = 0
-    for user in users:
-        try:
-            text = await build_summary(supabase_client, bitrix_client, user, settings.default_timezone)
-            await bot.send_message(chat_id=user["telegram_chat_id"], text=f"Утренний дайджест:\n\n{text}")
-            processed += 1
-        except Exception as err:  # noqa: BLE001
-            logger.error("Failed to send morning digest for %s: %s", user.get("telegram_id"), err)
-    return {"status": "ok", "users_notified": processed}
+    return await _timed_job("morning_digest", _run_digest("morning", shard, shards))
 
 
 @app.post("/jobs/evening_digest")
-async def evening_digest(x_cron_secret: str | None = Header(default=None, alias="X-CRON-SECRET")) -> Dict[str, str]:
-    if bot is None or supabase_client is None or bitrix_client is None or settings is None:
+async def evening_digest(
+    x_cron_secret: str | None = Header(default=None, alias="X-CRON-SECRET"),
+    shard: int = Query(0, ge=0),
+    shards: int = Query(1, ge=1),
+) -> Dict:
+    if settings is None:
+        return {"status": "error", "detail": "Bot not initialized. Check environment variables."}
+    verify_cron(x_cron_secret)
+    return await _timed_job("evening_digest", _run_digest("evening", shard, shards))
+
+
+@app.post("/jobs/digest_tick")
+async def digest_tick(x_cron_secret: str | None = Header(default=None, alias="X-CRON-SECRET")) -> Dict:
+    """Scheduler tick: sends digests whose per-user local time has come; meant to run every few minutes."""
+    if settings is None:
+        return {"status": "error", "detail": "Bot not initialized. Check environment variables."}
+    verify_cron(x_cron_secret)
+    return await _timed_job("digest_tick", _run_scheduled_digests())
+
+
+@app.post("/jobs/digest_warmup")
+async def digest_warmup(x_cron_secret: str | None = Header(default=None, alias="X-CRON-SECRET")) -> Dict:
+    """Pre-renders digests due within DIGEST_WARMUP_LEAD so the tick only has to send them."""
+    if settings is None:
+        return {"status": "error", "detail": "Bot not initialized. Check environment variables."}
+    verify_cron(x_cron_secret)
+    return await _timed_job("digest_warmup", _run_digest_warmup())
+
+
+@app.post("/jobs/drain_updates")
+async def drain_updates(x_cron_secret: str | None = Header(default=None, alias="X-CRON-SECRET")) -> Dict:
+    """Drains the durable update queue; prunes old update ids and expired FSM states."""
+    if settings is None:
         return {"status": "error", "detail": "Bot not initialized. Check environment variables."}
-    from apps.telegram_assistant.handlers.today import build_summary
     verify_cron(x_cron_secret)
-    users = supabase_client.get_all_users()
-    processed = 0
-    for user in users:
-        try:
-            text = await build_summary(supabase_client, bitrix_client, user, settings.default_timezone)
-            await bot.send_message(chat_id=user["telegram_chat_id"], text=f"Вечерний дайджест:\n\n{text}")
-            processed += 1
-        except Exception as err:  # noqa: BLE001
-            logger.error("Failed to send evening digest for %s: %s", user.get("telegram_id"), err)
-    return {"status": "ok", "users_notified": processed}
+    now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(seconds=settings.update_dedupe_window)
+    if settings.fsm_storage == "supabase":
+        await runtime.supabase.delete_expired_fsm_states(now)
+    if runtime.update_queue is None or settings.telegram_update_mode != "durable":
+        if settings.update_dedupe_persist:
+            await runtime.supabase.delete_seen_updates_before(cutoff)
+        return {"status": "skipped", "detail": "TELEGRAM_UPDATE_MODE is not durable"}
+    result = await _timed_job("drain_updates", runtime.update_queue.drain(settings.update_drain_budget))
+    await runtime.supabase.delete_processed_updates_before(cutoff)
+    return {"status": "ok", **result, "backlog": await runtime.update_queue.backlog()}
@@ -0,0 +1,257 @@
+import hashlib
+import hmac
+import logging
+from datetime import timedelta
+from functools import cached_property
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+ERROR_REPLY = "Произошла ошибка при обработке запроса. Попробуйте позже."
+
+
+class Runtime:
+    """Process-wide dependencies of the assistant, each built on first use.
+
+    A serverless cold start only imports FastAPI; aiogram, the Bitrix and
+    Supabase clients and the queues are imported and constructed when an
+    endpoint actually touches them, so `/health` builds nothing and a `/help`
+    update builds the bot and dispatcher but no Bitrix client (Supabase only
+    when FSM state lives there).
+    Handlers reach the clients through `bot["supabase"]` / `bot["bitrix"]`,
+    which resolve here lazily as well.
+    """
+
+    def __init__(self, settings=None) -> None:
+        self.settings = settings
+
+    def built(self, name: str) -> bool:
+        """True if the dependency was already constructed (nothing is built by asking)."""
+        return name in self.__dict__
+
+    @cached_property
+    def supabase(self):
+        from packages.supabase_db.async_client import AsyncSupabaseClient
+
+        return AsyncSupabaseClient(self.settings.supabase_url, self.settings.supabase_service_role_key)
+
+    @cached_property
+    def bitrix(self):
+        from packages.bitrix_client import BitrixClient, CachedBitrixClient
+
+        settings = self.settings
+        return CachedBitrixClient(
+            BitrixClient(
+                settings.bitrix24_webhook,
+                http2=settings.bitrix_http2,
+                max_connections=settings.bitrix_max_connections,
+                max_keepalive_connections=settings.bitrix_max_keepalive,
+                rate_limit=settings.bitrix_rate_limit,
+                burst=settings.bitrix_burst,
+            )
+        )
+
+    @cached_property
+    def bitrix_events(self):
+        from apps.telegram_assistant.services.bitrix_events import BitrixEventIngestor
+
+        return BitrixEventIngestor(self.supabase, self.bitrix, debounce=self.settings.bitrix_events_debounce)
+
+    @cached_property
+    def telegram_queue(self):
+        from apps.telegram_assistant.services.telegram_queue import TelegramSendQueue
+
+        # Supabase нужен очереди только для outbox дайджестов, поэтому отдаём его лениво
+        return TelegramSendQueue(
+            _LazySupabase(self),
+            rate=self.settings.telegram_rate_limit,
+            per_chat_interval=self.settings.telegram_chat_interval,
+            claim_ttl=self.settings.outbox_claim_ttl,
+        )
+
+    @cached_property
+    def bot(self):
+        from aiogram.enums import ParseMode
+
+        from apps.telegram_assistant.bot import AssistantBot
+
+        bot = AssistantBot(self.settings.telegram_bot_token, resolve=self._resolve, parse_mode=ParseMode.HTML)
+        # все вызовы Bot API (дайджесты и ответы хендлеров) идут через общую очередь с лимитами Telegram
+        self.telegram_queue.install(bot)
+        return bot
+
+    def _resolve(self, key: str) -> Any:
+        if key not in ("supabase", "bitrix"):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    @cached_property
+    def fsm_storage(self):
+        settings = self.settings
+        if settings.fsm_storage == "memory":
+            from aiogram.fsm.storage.memory import MemoryStorage
+
+            return MemoryStorage()
+        from apps.telegram_assistant.services.fsm_storage import (
+            PersistentStorage,
+            SQLiteFSMBackend,
+            SupabaseFSMBackend,
+        )
+
+        backend = (
+            SQLiteFSMBackend(settings.fsm_sqlite_path)
+            if settings.fsm_storage == "sqlite"
+            else SupabaseFSMBackend(_LazySupabase(self))
+        )
+        return PersistentStorage(
+            backend, ttl=settings.fsm_ttl, cache_size=settings.fsm_cache_size, cache_ttl=settings.fsm_cache_ttl
+        )
+
+    @cached_property
+    def otp_secret(self) -> bytes:
+        settings = self.settings
+        if settings.otp_secret:
+            return settings.otp_secret.encode()
+        # отдельный ключ, а не сам service-role ключ: подпись OTP не раскрывает его даже косвенно
+        return hmac.new(settings.supabase_service_role_key.encode(), b"assistant-otp", hashlib.sha256).digest()
+
+    @cached_property
+    def otp_limiter(self):
+        from apps.telegram_assistant.utils.otp import AttemptLimiter
+
+        return AttemptLimiter(max_attempts=self.settings.otp_max_attempts, window=self.settings.otp_ttl)
+
+    @cached_property
+    def page_snapshots(self):
+        from apps.telegram_assistant.services.pages import PageSnapshots
+
+        return PageSnapshots(
+            ttl=self.settings.page_snapshot_ttl, max_users=self.settings.page_snapshot_size, supabase=self.supabase
+        )
+
+    @cached_property
+    def dp(self):
+        from aiogram import Dispatcher
+        from aiogram.types import ErrorEvent
+
+        from apps.telegram_assistant.handlers import (
+            register_code,
+            register_help,
+            register_pages,
+            register_start,
+            register_today,
+        )
+        from apps.telegram_assistant.handlers.metrics import HandlerMetrics
+        from apps.telegram_assistant.services.fsm_storage import LazyFSMContextMiddleware
+
+        # состояние читается, только когда хендлер его спрашивает: /help и /today не ходят в fsm_states
+        dp = Dispatcher(storage=self.fsm_storage, disable_fsm=True)
+        LazyFSMContextMiddleware.install(dp)
+        dp.message.middleware(HandlerMetrics())
+        dp.callback_query.middleware(HandlerMetrics())
+        register_start(dp, self.otp_secret, self.settings.otp_ttl)
+        register_help(dp)
+        register_today(
+            dp,
+            self.settings.default_timezone,
+            timedelta(seconds=self.settings.today_max_staleness),
+            self.page_snapshots,
+        )
+        register_code(dp, self.otp_secret, self.otp_limiter, lockout=self.settings.otp_lockout)
+        register_pages(dp, self.page_snapshots)
+
+        @dp.errors()
+        async def error_handler(event: ErrorEvent) -> bool:
+            logger.error("Unhandled error in dispatcher: %s", event.exception, exc_info=event.exception)
+            try:
+                if event.update.message:
+                    await event.update.message.answer(
+                        "Произошла ошибка при обработке команды. Попробуйте позже или используйте /help."
+                    )
+            except Exception:
+                pass  # Ignore errors in error handling
+            return True
+
+        return dp
+
+    async def feed_update(self, body: Dict[str, Any]) -> None:
+        from aiogram.types import Update
+
+        try:
+            await self.dp.feed_update(self.bot, Update.model_validate(body))
+        finally:
+            # изменения FSM за апдейт уходят в таблицу одной пачкой до ответа webhook
+            if hasattr(self.fsm_storage, "flush"):
+                await self.fsm_storage.flush()
+
+    async def process_update(self, body: Dict[str, Any]) -> None:
+        """Feeds the update to the dispatcher; on failure tells the user and re-raises."""
+        try:
+            await self.feed_update(body)
+        except Exception:
+            try:
+                chat_id = (body.get("message") or {}).get("chat", {}).get("id")
+                if chat_id:
+                    await self.bot.send_message(chat_id=chat_id, text=ERROR_REPLY)
+            except Exception:
+                pass  # Ignore errors in error handling
+            raise
+
+    @cached_property
+    def update_queue(self):
+        settings = self.settings
+        # inline — обрабатываем в запросе; background — пул в процессе; durable — таблица + drain (serverless)
+        if settings.telegram_update_mode == "background":
+            from apps.telegram_assistant.services.update_queue import UpdateQueue
+
+            return UpdateQueue(
+                self.process_update, concurrency=settings.update_concurrency, max_pending=settings.update_max_pending
+            )
+        if settings.telegram_update_mode == "durable":
+            from apps.telegram_assistant.services.update_queue import DurableUpdateQueue
+
+            # ошибку пользователю не пишем: апдейт будет повторён
+            return DurableUpdateQueue(self.supabase, self.feed_update, concurrency=settings.update_concurrency)
+        return None
+
+    @cached_property
+    def update_dedupe(self):
+        from apps.telegram_assistant.services.update_dedupe import UpdateDedupe
+
+        settings = self.settings
+        # в режиме durable повторы и так отсекает первичный ключ telegram_updates
+        persist_seen = settings.update_dedupe_persist and settings.telegram_update_mode != "durable"
+        return UpdateDedupe(self.supabase if persist_seen else None, capacity=settings.update_dedupe_size)
+
+    async def aclose(self) -> None:
+        if self.built("update_queue") and hasattr(self.update_queue, "aclose"):
+            await self.update_queue.aclose()
+        if self.built("bitrix_events"):
+            await self.bitrix_events.aclose()
+        if self.built("fsm_storage"):
+            await self.fsm_storage.close()
+        if self.built("bitrix"):
+            await self.bitrix.aclose()
+        if self.built("supabase"):
+            await self.supabase.aclose()
+        if self.built("bot"):
+            await self.bot.session.close()
+
+
+class _LazySupabase:
+    """Forwards attribute access to `runtime.supabase`, constructing it on first use."""
+
+    def __init__(self, runtime: Runtime) -> None:
+        self._runtime = runtime
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._runtime.supabase, name)
+
+
+def load_settings() -> Optional[Any]:
+    try:
+        from apps.telegram_assistant.config import settings
+    except Exception as e:
+        logger.error("Failed to load settings: %s", e, exc_info=True)
+        return None
+    return settings
@@ -0,0 +1,16 @@
+from .digest import DigestChunk, DigestTarget, digest_pipeline, plan_digest
+from .pipeline import Failure, Pipeline, Stage
+from .sync import SyncResult, sync_events, sync_tasks
+
+__all__ = [
+    "DigestChunk",
+    "DigestTarget",
+    "Failure",
+    "Pipeline",
+    "Stage",
+    "SyncResult",
+    "digest_pipeline",
+    "plan_digest",
+    "sync_events",
+    "sync_tasks",
+]
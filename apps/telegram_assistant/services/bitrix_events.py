@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl
+
+from apps.telegram_assistant.services.sync import COMPLETED_STATUSES, event_row, task_row
+
+logger = logging.getLogger(__name__)
+
+TASK_EVENTS = {"ONTASKADD", "ONTASKUPDATE", "ONTASKDELETE"}
+CALENDAR_EVENTS = {"ONCALENDARENTRYADD", "ONCALENDARENTRYUPDATE", "ONCALENDARENTRYDELETE"}
+DELETE_EVENTS = {"ONTASKDELETE", "ONCALENDARENTRYDELETE"}
+
+KNOWN_USERS_TTL = 300.0
+# сколько раз подряд пробуем получить сущность из Bitrix, прежде чем отбросить событие
+MAX_FETCH_ATTEMPTS = 3
+
+
+def parse_event(body: bytes) -> Dict[str, str]:
+    """Bitrix outbound webhooks are form-encoded with PHP-style keys (data[FIELDS_AFTER][ID])."""
+    return dict(parse_qsl(body.decode("utf-8"), keep_blank_values=True))
+
+
+def event_target(payload: Dict[str, str]) -> Optional[Tuple[str, int, bool]]:
+    """(entity, id, deleted) for a supported event, otherwise None."""
+    event = payload.get("event", "").upper()
+    if event in TASK_EVENTS:
+        raw_id = payload.get("data[FIELDS_AFTER][ID]") or payload.get("data[FIELDS_BEFORE][ID]")
+        entity = "task"
+    elif event in CALENDAR_EVENTS:
+        raw_id = payload.get("data[id]") or payload.get("data[ID]")
+        entity = "event"
+    else:
+        return None
+    if not raw_id or not raw_id.isdigit():
+        return None
+    return entity, int(raw_id), event in DELETE_EVENTS
+
+
+class BitrixEventIngestor:
+    """Applies Bitrix push events to tasks_cache/events_cache.
+
+    Events are debounced per entity: a burst of ONTASKUPDATE for one task results
+    in a single tasks.task.get after `debounce` seconds of quiet, and all entities
+    that become due together are fetched in the same tick (one Bitrix batch).
+    With `debounce=0` events are applied inline, which is what serverless needs.
+    Entities whose fetch failed are re-queued and retried with the next flush,
+    up to MAX_FETCH_ATTEMPTS times.
+    """
+
+    def __init__(self, supabase, bitrix, debounce: float = 2.0) -> None:
+        self.supabase = supabase
+        self.bitrix = bitrix
+        self.debounce = debounce
+        self._pending: Dict[Tuple[str, int], bool] = {}
+        self._attempts: Dict[Tuple[str, int], int] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._last_event = 0.0
+        self._known_users: Set[int] = set()
+        self._known_users_at = 0.0
+        self.received = 0
+        self.applied = 0
+        self.dropped = 0
+
+    async def submit(self, entity: str, entity_id: int, deleted: bool) -> None:
+        self.received += 1
+        self._pending[(entity, entity_id)] = deleted
+        self._last_event = time.monotonic()
+        if self.debounce <= 0:
+            await self.flush()
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._flush_when_quiet())
+
+    async def _flush_when_quiet(self) -> None:
+        while True:
+            remaining = self._last_event + self.debounce - time.monotonic()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+                continue
+            await self.flush()
+            if not self._pending:
+                break
+            # повторно запрошенные и пришедшие во время flush — после ещё одной паузы
+            self._last_event = time.monotonic()
+
+    async def _registered_users(self) -> Set[int]:
+        if time.monotonic() - self._known_users_at > KNOWN_USERS_TTL:
+            self._known_users = {int(u["bitrix_user_id"]) for u in await self.supabase.get_all_users()}
+            self._known_users_at = time.monotonic()
+        return self._known_users
+
+    def _requeue(self, entity: str, entity_id: int, err: BaseException) -> None:
+        key = (entity, entity_id)
+        attempts = self._attempts.get(key, 0) + 1
+        if attempts >= MAX_FETCH_ATTEMPTS:
+            logger.error("Dropping push update for %s %s after %s failed fetches: %s", entity, entity_id, attempts, err)
+            self._attempts.pop(key, None)
+            self.dropped += 1
+            return
+        logger.warning("Failed to fetch %s %s for push update, will retry: %s", entity, entity_id, err)
+        self._attempts[key] = attempts
+        # событие удаления, пришедшее за время запроса, важнее повтора обновления
+        self._pending.setdefault(key, False)
+
+    async def flush(self) -> None:
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        task_deletes = [i for (entity, i), deleted in pending.items() if entity == "task" and deleted]
+        event_deletes = [i for (entity, i), deleted in pending.items() if entity == "event" and deleted]
+        task_ids = [i for (entity, i), deleted in pending.items() if entity == "task" and not deleted]
+        event_ids = [i for (entity, i), deleted in pending.items() if entity == "event" and not deleted]
+
+        fetched = await asyncio.gather(
+            *(self.bitrix.get_task(i) for i in task_ids),
+            *(self.bitrix.get_event(i) for i in event_ids),
+            return_exceptions=True,
+        )
+        tasks, events = fetched[: len(task_ids)], fetched[len(task_ids) :]
+        known = await self._registered_users()
+
+        task_rows: List[Dict] = []
+        for task_id, item in zip(task_ids, tasks):
+            if isinstance(item, BaseException):
+                self._requeue("task", task_id, item)
+                continue
+            self._attempts.pop(("task", task_id), None)
+            if not item or str(item.get("STATUS")) in COMPLETED_STATUSES:
+                task_deletes.append(task_id)
+            elif int(item.get("RESPONSIBLE_ID") or 0) in known:
+                task_rows.append(task_row(item, int(item["RESPONSIBLE_ID"])))
+            else:
+                # передана незарегистрированному пользователю — убираем из кэша прежнего ответственного
+                task_deletes.append(task_id)
+
+        event_rows: List[Dict] = []
+        for event_id, item in zip(event_ids, events):
+            if isinstance(item, BaseException):
+                self._requeue("event", event_id, item)
+                continue
+            self._attempts.pop(("event", event_id), None)
+            if not item:
+                event_deletes.append(event_id)
+            elif int(item.get("OWNER_ID") or 0) in known:
+                event_rows.append(event_row(item, int(item["OWNER_ID"])))
+            else:
+                event_deletes.append(event_id)
+
+        await asyncio.gather(
+            self.supabase.upsert_tasks_cache(task_rows),
+            self.supabase.delete_tasks_cache(task_deletes),
+            self.supabase.upsert_events_cache(event_rows),
+            self.supabase.delete_events_cache(event_deletes),
+        )
+        self.applied += len(task_rows) + len(task_deletes) + len(event_rows) + len(event_deletes)
+        logger.info(
+            "Applied Bitrix push: %s tasks upserted, %s deleted; %s events upserted, %s deleted",
+            len(task_rows),
+            len(task_deletes),
+            len(event_rows),
+            len(event_deletes),
+        )
+
+    async def aclose(self) -> None:
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
@@ -0,0 +1,213 @@
+import asyncio
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Union
+
+from apps.telegram_assistant.services.executor import (
+    STATUS_FAILED,
+    STATUS_OK,
+    STATUS_SKIPPED,
+    STATUS_TIMEOUT,
+    Outcome,
+)
+from apps.telegram_assistant.services.pipeline import Failure, Pipeline, Stage
+from apps.telegram_assistant.services.sync import (
+    ENTITY_EVENT,
+    ENTITY_TASK,
+    sync_events,
+    sync_tasks,
+)
+from apps.telegram_assistant.utils.dates import day_bounds, now_utc
+from apps.telegram_assistant.utils.render import render_summary
+from packages.bitrix_client.models import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+DIGEST_CHUNK_SIZE = 50
+
+
+@dataclass
+class DigestTarget:
+    user: Dict[str, Any]
+    tz: str
+    start_day: datetime
+    end_day: datetime
+    # данные конкретного job (ключ дедупликации, строка расписания и т.п.)
+    context: Any = None
+    tasks_today: List[Dict[str, Any]] = field(default_factory=list)
+    tasks_overdue: List[Dict[str, Any]] = field(default_factory=list)
+    events_today: List[Dict[str, Any]] = field(default_factory=list)
+    text: Optional[str] = None
+    status: Optional[str] = None
+
+    @property
+    def bitrix_user_id(self) -> int:
+        return int(self.user["bitrix_user_id"])
+
+    @property
+    def telegram_id(self) -> int:
+        return int(self.user["telegram_id"])
+
+
+@dataclass
+class DigestChunk:
+    """Users of one timezone that are synced and read from the cache together."""
+
+    targets: List[DigestTarget]
+
+    def __iter__(self) -> Iterator[DigestTarget]:
+        return iter(self.targets)
+
+    @property
+    def user_ids(self) -> List[int]:
+        return sorted({t.bitrix_user_id for t in self.targets})
+
+    @property
+    def start_day(self) -> datetime:
+        return min(t.start_day for t in self.targets)
+
+    @property
+    def end_day(self) -> datetime:
+        return max(t.end_day for t in self.targets)
+
+
+def plan_digest(
+    users: List[Dict[str, Any]],
+    default_timezone: str,
+    chunk_size: int = DIGEST_CHUNK_SIZE,
+    contexts: Optional[List[Any]] = None,
+    moments: Optional[List[datetime]] = None,
+) -> List[DigestChunk]:
+    """Select stage: group users into chunks for bulk cache reads.
+
+    Users are grouped by timezone first so one chunk shares the same day
+    window and the cache queries do not over-fetch. `moments` pins the day of
+    each digest (e.g. its scheduled fire time) instead of the current one.
+    """
+    now = now_utc()
+    targets = []
+    for i, user in enumerate(users):
+        tz = user.get("timezone") or default_timezone
+        start_day, end_day = day_bounds(moments[i] if moments else now, tz)
+        targets.append(DigestTarget(user, tz, start_day, end_day, context=contexts[i] if contexts else None))
+
+    chunks: List[DigestChunk] = []
+    targets.sort(key=lambda t: t.tz)
+    for _, group in groupby(targets, key=lambda t: t.tz):
+        group_targets = list(group)
+        for i in range(0, len(group_targets), chunk_size):
+            chunks.append(DigestChunk(group_targets[i : i + chunk_size]))
+    return chunks
+
+
+async def sync_chunk(supabase, bitrix, chunk: DigestChunk) -> DigestChunk:
+    """Sync stage: apply the sync_state delta of every user of the chunk to tasks_cache/events_cache.
+
+    sync_state rows are preloaded with one query, so the Bitrix calls of all
+    users start in the same tick and go out as one batch. Tasks are requested
+    only above the high-water mark (a full re-read happens every
+    FULL_SYNC_INTERVAL); events are re-read for the chunk's day window.
+    """
+    window_end = chunk.end_day + timedelta(seconds=1)
+    states = await supabase.get_sync_states(chunk.user_ids)
+    async with bitrix.batch():
+        syncs = [
+            asyncio.ensure_future(sync_tasks(supabase, bitrix, user_id, state=states.get((user_id, ENTITY_TASK))))
+            for user_id in chunk.user_ids
+        ]
+        syncs.extend(
+            asyncio.ensure_future(
+                sync_events(
+                    supabase, bitrix, user_id, chunk.start_day, window_end, state=states.get((user_id, ENTITY_EVENT))
+                )
+            )
+            for user_id in chunk.user_ids
+        )
+    # ждём все синхронизации, чтобы после ошибки не оставлять их висеть в фоне
+    results = await asyncio.gather(*syncs, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return chunk
+
+
+async def load_chunk_from_cache(supabase, chunk: DigestChunk) -> DigestChunk:
+    """Load stage: tasks_cache/events_cache only, one query each per chunk."""
+    tasks, events = await asyncio.gather(
+        supabase.get_tasks_cache(chunk.user_ids, deadline_to=chunk.end_day),
+        supabase.get_events_cache(chunk.user_ids, chunk.start_day, chunk.end_day + timedelta(seconds=1)),
+    )
+    tasks_by_user: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+    events_by_user: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+    for row in tasks:
+        tasks_by_user[int(row["bitrix_user_id"])].append(row)
+    for row in events:
+        events_by_user[int(row["bitrix_user_id"])].append(row)
+
+    for target in chunk:
+        bucket_rows(target, tasks_by_user[target.bitrix_user_id], events_by_user[target.bitrix_user_id])
+    return chunk
+
+
+def bucket_rows(target: DigestTarget, task_rows: List[Dict[str, Any]], event_rows: List[Dict[str, Any]]) -> None:
+    """Split one user's cache rows into today / overdue / today's events of the target's day."""
+    for row in task_rows:
+        deadline = parse_datetime(row["deadline"])
+        if deadline is None:
+            continue
+        if deadline <= target.start_day:
+            target.tasks_overdue.append(row)
+        elif deadline <= target.end_day:
+            target.tasks_today.append(row)
+    target.events_today = [
+        row
+        for row in event_rows
+        if row["start_at"] and target.start_day <= parse_datetime(row["start_at"]) <= target.end_day
+    ]
+
+
+def render_target(target: DigestTarget) -> DigestTarget:
+    target.text = render_summary(target.tz, target.tasks_today, target.tasks_overdue, target.events_today)
+    return target
+
+
+def digest_pipeline(
+    supabase,
+    bitrix,
+    deliver: Optional[Callable[[DigestTarget], Awaitable[Optional[str]]]] = None,
+    deadline=None,
+    fetch_concurrency: int = 2,
+    deliver_concurrency: int = 8,
+) -> Pipeline:
+    """select → sync → load → render → deliver.
+
+    Chunks are synced and read from the cache as a whole; after load they fan
+    out into per-user targets. `deliver` returns an optional status override.
+    """
+
+    async def deliver_target(target: DigestTarget) -> DigestTarget:
+        target.status = await deliver(target) or STATUS_OK
+        return target
+
+    stages = [
+        Stage("sync", lambda chunk: sync_chunk(supabase, bitrix, chunk), concurrency=fetch_concurrency),
+        Stage("load", lambda chunk: load_chunk_from_cache(supabase, chunk), concurrency=fetch_concurrency, fan_out=True),
+        Stage("render", render_target),
+    ]
+    if deliver is not None:
+        stages.append(Stage("deliver", deliver_target, concurrency=deliver_concurrency))
+    return Pipeline(stages, deadline=deadline)
+
+
+def digest_outcome(item: Union[DigestTarget, Failure], key: Callable[[DigestTarget], Any]) -> Outcome:
+    """Executor-style outcome for a pipeline result."""
+    if not isinstance(item, Failure):
+        return Outcome(key(item), item.status or STATUS_OK)
+    if isinstance(item.error, asyncio.TimeoutError):
+        # не дошли до отправки — пользователь не тронут; оборвались на ней — таймаут
+        status = STATUS_TIMEOUT if item.stage == "deliver" else STATUS_SKIPPED
+        return Outcome(key(item.item), status, error=f"time budget exhausted in {item.stage}")
+    return Outcome(key(item.item), STATUS_FAILED, error=f"{item.stage}: {item.error}")
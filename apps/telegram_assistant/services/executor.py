@@ -0,0 +1,42 @@
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional
+
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+STATUS_TIMEOUT = "timeout"
+STATUS_SKIPPED = "skipped"
+STATUS_DUPLICATE = "duplicate"
+
+
+@dataclass
+class Outcome:
+    key: Any
+    status: str
+    error: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {k: v for k, v in asdict(self).items() if v is not None}
+
+
+class Deadline:
+    """Wall-clock budget of one job run.
+
+    The pipeline starts an item only while at least `min_item_time` of the
+    budget is left and bounds running items by `remaining()`, so the whole run
+    returns before the serverless function is killed.
+    """
+
+    def __init__(self, budget: float = 8.0, min_item_time: float = 0.5) -> None:
+        self.budget = budget
+        self.min_item_time = min_item_time
+        self._started = time.monotonic()
+
+    def start(self) -> None:
+        self._started = time.monotonic()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self._started
+
+    def remaining(self) -> float:
+        return max(0.0, self.budget - self.elapsed())
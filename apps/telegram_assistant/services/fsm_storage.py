@@ -0,0 +1,244 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from aiogram.fsm.middleware import FSMContextMiddleware
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+logger = logging.getLogger(__name__)
+
+
+def storage_key(key: StorageKey) -> str:
+    return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or 0}:{key.destiny}"
+
+
+class SupabaseFSMBackend:
+    """assistant.fsm_states over PostgREST: one select per cache miss, one upsert per flush."""
+
+    def __init__(self, supabase) -> None:
+        self.supabase = supabase
+
+    async def load(self, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        return {row["key"]: row for row in await self.supabase.get_fsm_states(keys)}
+
+    async def save(self, rows: List[Dict[str, Any]]) -> None:
+        await self.supabase.upsert_fsm_states(rows)
+
+    async def close(self) -> None:
+        pass
+
+
+class SQLiteFSMBackend:
+    """Local stand-in for assistant.fsm_states; queries run in a worker thread."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "create table if not exists fsm_states "
+                "(key text primary key, state text, data text not null, expires_at text)"
+            )
+        return self._conn
+
+    def _load(self, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        placeholders = ",".join("?" * len(keys))
+        rows = self._connect().execute(
+            f"select key, state, data, expires_at from fsm_states where key in ({placeholders})", keys
+        )
+        return {
+            key: {"key": key, "state": state, "data": json.loads(data), "expires_at": expires_at}
+            for key, state, data, expires_at in rows
+        }
+
+    def _save(self, rows: List[Dict[str, Any]]) -> None:
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "insert or replace into fsm_states (key, state, data, expires_at) values (?, ?, ?, ?)",
+                [(row["key"], row["state"], json.dumps(row["data"], ensure_ascii=False), row["expires_at"]) for row in rows],
+            )
+
+    async def load(self, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        return await asyncio.to_thread(self._load, keys)
+
+    async def save(self, rows: List[Dict[str, Any]]) -> None:
+        await asyncio.to_thread(self._save, rows)
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+@dataclass
+class _Entry:
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    expires_at: Optional[float] = None
+    loaded_at: float = 0.0
+
+    @classmethod
+    def from_row(cls, row: Optional[Dict[str, Any]]) -> "_Entry":
+        entry = cls(loaded_at=time.monotonic())
+        if row is None:
+            return entry
+        expires_at = datetime.fromisoformat(row["expires_at"]).timestamp() if row.get("expires_at") else None
+        if expires_at is not None and expires_at <= time.time():
+            return entry
+        entry.state, entry.data, entry.expires_at = row.get("state"), dict(row.get("data") or {}), expires_at
+        return entry
+
+    def live(self) -> "_Entry":
+        if self.expires_at is not None and self.expires_at <= time.time():
+            self.state, self.data, self.expires_at = None, {}, None
+        return self
+
+
+class PersistentStorage(BaseStorage):
+    """aiogram FSM storage shared by all instances through a table, with a local LRU in front.
+
+    Reads are served from the LRU while the entry is younger than `cache_ttl`
+    (a miss, including "no row", is cached too); after that the row is read
+    again, so a state written by another instance is seen within `cache_ttl`.
+    Writes go to the cache immediately and are written through in batches:
+    `flush()` upserts every key changed since the previous flush in one query
+    (Runtime flushes after each update). Every write extends the row's
+    lifetime to `ttl` seconds; expired rows read as empty state.
+    """
+
+    def __init__(self, backend, ttl: float = 86_400, cache_size: int = 10_000, cache_ttl: float = 10.0) -> None:
+        self.backend = backend
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._cache: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._dirty: Set[str] = set()
+        self._flush_lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    async def _entry(self, key: StorageKey) -> _Entry:
+        k = storage_key(key)
+        entry = self._cache.get(k)
+        # несохранённую запись перечитывать нельзя — потеряем собственную запись
+        if entry is not None and (k in self._dirty or time.monotonic() - entry.loaded_at < self.cache_ttl):
+            self._cache.move_to_end(k)
+            self.hits += 1
+            return entry.live()
+        self.misses += 1
+        entry = _Entry.from_row((await self.backend.load([k])).get(k))
+        if k in self._dirty:
+            # пока читали, запись успели изменить локально
+            return self._cache[k].live()
+        self._cache[k] = entry
+        self._cache.move_to_end(k)
+        self._evict()
+        return entry
+
+    def _evict(self) -> None:
+        if len(self._cache) <= self.cache_size:
+            return
+        for k in list(self._cache):
+            if len(self._cache) <= self.cache_size:
+                break
+            if k not in self._dirty:
+                del self._cache[k]
+
+    def _touch(self, key: StorageKey, entry: _Entry) -> None:
+        entry.expires_at = time.time() + self.ttl
+        entry.loaded_at = time.monotonic()
+        self._dirty.add(storage_key(key))
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        entry = await self._entry(key)
+        entry.state = state.state if isinstance(state, State) else state
+        self._touch(key, entry)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._entry(key)).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        entry = await self._entry(key)
+        entry.data = data.copy()
+        self._touch(key, entry)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._entry(key)).data.copy()
+
+    async def flush(self) -> None:
+        """Write all keys changed since the last flush in one batch."""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            keys, self._dirty = self._dirty, set()
+            rows = []
+            for k in keys:
+                entry = self._cache[k]
+                expires_at = datetime.fromtimestamp(entry.expires_at, timezone.utc).isoformat() if entry.expires_at else None
+                rows.append({"key": k, "state": entry.state, "data": entry.data, "expires_at": expires_at})
+            try:
+                await self.backend.save(rows)
+            except Exception:
+                # не теряем изменения: попробуем записать со следующим flush
+                self._dirty |= keys
+                raise
+            self.writes += len(rows)
+
+    async def close(self) -> None:
+        try:
+            await self.flush()
+        finally:
+            await self.backend.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cached": len(self._cache),
+            "dirty": len(self._dirty),
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+        }
+
+
+class LazyFSMContextMiddleware(FSMContextMiddleware):
+    """FSMContextMiddleware that does not read the state up front.
+
+    aiogram's middleware awaits `get_state()` for every update to fill
+    `raw_state`, i.e. a storage read even for stateless commands. Here the
+    handler gets the FSMContext only, and storage is touched when it calls
+    get_state/get_data. `raw_state` is not provided, so state filters
+    (StateFilter) are not supported: handlers check the state themselves.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any],
+    ) -> Any:
+        context = self.resolve_event_context(data["bot"], data)
+        data["fsm_storage"] = self.storage
+        if context:
+            async with self.events_isolation.lock(key=context.key):
+                data["state"] = context
+                return await handler(event, data)
+        return await handler(event, data)
+
+    @classmethod
+    def install(cls, dp) -> "LazyFSMContextMiddleware":
+        """Use instead of the built-in FSM middleware of a Dispatcher created with `disable_fsm=True`."""
+        dp.fsm = cls(storage=dp.fsm.storage, events_isolation=dp.fsm.events_isolation, strategy=dp.fsm.strategy)
+        dp.update.outer_middleware(dp.fsm)
+        return dp.fsm
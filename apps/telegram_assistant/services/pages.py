@@ -0,0 +1,83 @@
+import logging
+import secrets
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from packages.bitrix_client.models import parse_datetime
+from packages.common import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PageSnapshot:
+    token: str
+    pages: List[str]
+
+    @classmethod
+    def create(cls, pages: List[str]) -> "PageSnapshot":
+        return cls(secrets.token_urlsafe(6), pages)
+
+
+class PageSnapshots:
+    """Rendered pages of each user's latest digest, kept for navigation.
+
+    A snapshot is stored when a paginated message is sent; page buttons
+    carry its token, so flipping pages is served from process memory without
+    touching Bitrix. With `supabase` the snapshot is also written to
+    assistant.page_snapshots, and a memory miss (another serverless instance,
+    a cold start) is served from there. Only the latest snapshot per user is
+    kept; buttons of an older message miss.
+    """
+
+    def __init__(self, ttl: float = 21_600, max_users: int = 1000, supabase=None) -> None:
+        self.ttl = ttl
+        self.supabase = supabase
+        self._cache = TTLCache(max_users)
+        self.hits = 0
+        self.loaded = 0
+        self.misses = 0
+
+    async def put(self, user_id: int, snapshot: PageSnapshot) -> None:
+        self._cache.set(user_id, snapshot, self.ttl)
+        if self.supabase is None:
+            return
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+        try:
+            await self.supabase.upsert_page_snapshot(user_id, snapshot.token, snapshot.pages, expires_at)
+        except Exception as err:  # noqa: BLE001
+            # снимок в памяти уже есть, на этом инстансе листание работает
+            logger.warning("Failed to persist page snapshot for %s: %s", user_id, err)
+
+    async def get(self, user_id: int, token: str) -> Optional[PageSnapshot]:
+        snapshot = self._cache.get(user_id)
+        if isinstance(snapshot, PageSnapshot) and snapshot.token == token:
+            self.hits += 1
+            return snapshot
+        snapshot = await self._load(user_id, token)
+        if snapshot is None:
+            self.misses += 1
+            return None
+        self.loaded += 1
+        return snapshot
+
+    async def _load(self, user_id: int, token: str) -> Optional[PageSnapshot]:
+        if self.supabase is None:
+            return None
+        try:
+            row = await self.supabase.get_page_snapshot(user_id, token)
+        except Exception as err:  # noqa: BLE001
+            logger.warning("Failed to load page snapshot for %s: %s", user_id, err)
+            return None
+        if not row:
+            return None
+        remaining = (parse_datetime(row["expires_at"]) - datetime.now(timezone.utc)).total_seconds()
+        if remaining <= 0:
+            return None
+        snapshot = PageSnapshot(row["token"], list(row["pages"]))
+        self._cache.set(user_id, snapshot, remaining)
+        return snapshot
+
+    def stats(self) -> Dict[str, Any]:
+        return {"users": len(self._cache), "hits": self.hits, "loaded": self.loaded, "misses": self.misses}
@@ -0,0 +1,155 @@
+import asyncio
+import inspect
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, Iterable, List, Optional, Set, Union
+
+from packages.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+STAGE_SECONDS = REGISTRY.histogram("pipeline_stage_seconds", "Time one item spends in a pipeline stage", ["stage"])
+STAGE_FAILURES = REGISTRY.counter("pipeline_stage_failures_total", "Items that failed in a pipeline stage", ["stage", "error"])
+
+
+@dataclass
+class Stage:
+    """One pipeline step: `fn(item)` runs for up to `concurrency` items at a time.
+
+    With `fan_out` the result is iterated and every element goes downstream on
+    its own (e.g. a chunk of users becomes per-user items). `fn` may be sync.
+    """
+
+    name: str
+    fn: Callable[[Any], Any]
+    concurrency: int = 1
+    fan_out: bool = False
+
+
+@dataclass
+class Failure:
+    """An item that failed in `stage`; later stages pass it through untouched."""
+
+    item: Any
+    stage: str
+    error: BaseException
+
+
+@dataclass
+class StageStats:
+    items: int = 0
+    failures: int = 0
+    busy_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "items": self.items,
+            "failures": self.failures,
+            "busy_ms": int(self.busy_seconds * 1000),
+            "max_ms": int(self.max_seconds * 1000),
+        }
+
+
+@dataclass
+class Pipeline:
+    """Stages connected as async generators.
+
+    Each stage keeps at most `concurrency` items in flight and only pulls the
+    next item from upstream when a slot frees up, so a slow stage throttles
+    the ones before it (backpressure) while items still overlap across stages:
+    fetching the next chunk runs while the previous one is persisted and sent.
+    With `deadline` (a `Deadline`) no item is started once less than its
+    `min_item_time` is left and running items are cut off at the budget.
+    """
+
+    stages: List[Stage]
+    deadline: Any = None
+    stats: Dict[str, StageStats] = field(init=False, default_factory=dict)
+
+    def __post_init__(self) -> None:
+        self.stats = {stage.name: StageStats() for stage in self.stages}
+
+    async def stream(self, source: Union[Iterable[Any], AsyncIterable[Any]]) -> AsyncIterator[Any]:
+        stream = _aiter(source)
+        for stage in self.stages:
+            stream = self._run_stage(stage, stream)
+        async for item in stream:
+            yield item
+
+    async def run(self, source: Union[Iterable[Any], AsyncIterable[Any]]) -> List[Any]:
+        return [item async for item in self.stream(source)]
+
+    async def _apply(self, stage: Stage, item: Any) -> Any:
+        if isinstance(item, Failure):
+            return item
+        stats = self.stats[stage.name]
+        if self.deadline is not None and self.deadline.remaining() < self.deadline.min_item_time:
+            stats.failures += 1
+            STAGE_FAILURES.inc(stage.name, "TimeoutError")
+            return Failure(item, stage.name, asyncio.TimeoutError("time budget exhausted"))
+        started = time.monotonic()
+        try:
+            result = stage.fn(item)
+            if inspect.isawaitable(result):
+                timeout = self.deadline.remaining() if self.deadline is not None else None
+                result = await asyncio.wait_for(result, timeout=timeout)
+        except Exception as err:  # noqa: BLE001
+            stats.failures += 1
+            STAGE_FAILURES.inc(stage.name, type(err).__name__)
+            if not isinstance(err, asyncio.TimeoutError):
+                logger.error("Pipeline stage %s failed: %s", stage.name, err)
+            return Failure(item, stage.name, err)
+        finally:
+            elapsed = time.monotonic() - started
+            stats.items += 1
+            stats.busy_seconds += elapsed
+            stats.max_seconds = max(stats.max_seconds, elapsed)
+            STAGE_SECONDS.observe(elapsed, stage.name)
+        return result
+
+    async def _run_stage(self, stage: Stage, upstream: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        running: Set[asyncio.Future] = set()
+        pull: Optional[asyncio.Future] = None
+        exhausted = False
+        try:
+            while True:
+                if not exhausted and pull is None and len(running) < stage.concurrency:
+                    pull = asyncio.ensure_future(upstream.__anext__())
+                waiting = running | ({pull} if pull is not None else set())
+                if not waiting:
+                    return
+                done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+                if pull is not None and pull in done:
+                    try:
+                        running.add(asyncio.ensure_future(self._apply(stage, pull.result())))
+                    except StopAsyncIteration:
+                        exhausted = True
+                    done.discard(pull)
+                    pull = None
+                for task in done:
+                    running.discard(task)
+                    for item in _expand(stage, task.result()):
+                        yield item
+        finally:
+            for task in running | ({pull} if pull is not None else set()):
+                task.cancel()
+
+
+def _expand(stage: Stage, result: Any) -> Iterable[Any]:
+    if not stage.fan_out:
+        return [result]
+    # упавший чанк превращается в Failure для каждого своего элемента
+    if isinstance(result, Failure):
+        return [Failure(item, result.stage, result.error) for item in result.item]
+    return result
+
+
+async def _aiter(source: Union[Iterable[Any], AsyncIterable[Any]]) -> AsyncIterator[Any]:
+    if hasattr(source, "__aiter__"):
+        async for item in source:
+            yield item
+    else:
+        for item in source:
+            yield item
@@ -0,0 +1,94 @@
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import date, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from apps.telegram_assistant.services.digest import DigestTarget, load_chunk_from_cache, render_target
+from apps.telegram_assistant.services.executor import STATUS_OK
+from apps.telegram_assistant.services.pipeline import Pipeline, Stage
+from packages.bitrix_client.models import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+RenderKey = Tuple[int, date, str]
+
+
+def _utc(value: Optional[str]) -> Optional[str]:
+    # из Bitrix и из Postgres одно и то же время приходит в разных форматах
+    parsed = parse_datetime(value)
+    return parsed.astimezone(timezone.utc).isoformat() if parsed else None
+
+
+def digest_content_hash(target: DigestTarget) -> str:
+    """Hash of the data a digest is rendered from, independent of the row source."""
+    content = {
+        "today": sorted((row["bitrix_task_id"], row["title"], _utc(row["deadline"])) for row in target.tasks_today),
+        "overdue": sorted((row["bitrix_task_id"], row["title"], _utc(row["deadline"])) for row in target.tasks_overdue),
+        "events": sorted(
+            (row["bitrix_event_id"], row["title"], _utc(row["start_at"]), _utc(row["end_at"]))
+            for row in target.events_today
+        ),
+    }
+    return hashlib.sha256(json.dumps(content, ensure_ascii=False).encode()).hexdigest()
+
+
+def render_row(target: DigestTarget, key: RenderKey) -> Dict[str, Any]:
+    telegram_id, digest_date, kind = key
+    return {
+        "telegram_id": telegram_id,
+        "digest_date": digest_date.isoformat(),
+        "kind": kind,
+        "text": target.text,
+        "content_hash": digest_content_hash(target),
+    }
+
+
+def index_renders(rows: List[Dict[str, Any]]) -> Dict[RenderKey, Dict[str, Any]]:
+    return {(int(row["telegram_id"]), date.fromisoformat(row["digest_date"]), row["kind"]): row for row in rows}
+
+
+def reuse_or_render(target: DigestTarget, stored: Optional[Dict[str, Any]]) -> bool:
+    """Use the pre-rendered text unless the cached data changed since; True if re-rendered."""
+    if stored is not None and stored.get("content_hash") == digest_content_hash(target):
+        target.text = stored["text"]
+        return False
+    render_target(target)
+    return True
+
+
+def prerendered_pipeline(
+    supabase,
+    renders: Dict[RenderKey, Dict[str, Any]],
+    render_key: Callable[[DigestTarget], RenderKey],
+    deliver: Callable[[DigestTarget], Awaitable[Optional[str]]],
+    deadline=None,
+    deliver_concurrency: int = 8,
+) -> Tuple[Pipeline, List[RenderKey]]:
+    """Send path for warmed digests: cache → hash check → deliver, no Bitrix calls.
+
+    A digest whose cached tasks/events no longer match the stored content hash
+    (e.g. a push event updated the cache after the warm-up) is re-rendered from
+    the cache; the rest are sent as stored. Keys of re-rendered digests are
+    collected in the returned list.
+    """
+    rerendered: List[RenderKey] = []
+
+    def render(target: DigestTarget) -> DigestTarget:
+        if reuse_or_render(target, renders.get(render_key(target))):
+            rerendered.append(render_key(target))
+        return target
+
+    async def deliver_target(target: DigestTarget) -> DigestTarget:
+        target.status = await deliver(target) or STATUS_OK
+        return target
+
+    return Pipeline(
+        [
+            Stage("load", lambda chunk: load_chunk_from_cache(supabase, chunk), concurrency=2, fan_out=True),
+            Stage("render", render),
+            Stage("deliver", deliver_target, concurrency=deliver_concurrency),
+        ],
+        deadline=deadline,
+    ), rerendered
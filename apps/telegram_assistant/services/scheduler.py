@@ -0,0 +1,88 @@
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, List, Optional, Union
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+logger = logging.getLogger(__name__)
+
+# вид дайджеста → колонка assistant.users с локальным временем отправки
+DIGEST_TIME_COLUMNS = {"morning": "morning_time", "evening": "evening_time"}
+DEFAULT_DIGEST_TIMES = {"morning": time(8, 0), "evening": time(18, 0)}
+
+
+def user_zone(user: Dict[str, Any], default_timezone: str) -> ZoneInfo:
+    name = user.get("timezone") or default_timezone
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning("Unknown timezone %r for user %s, using %s", name, user.get("telegram_id"), default_timezone)
+        return ZoneInfo(default_timezone)
+
+
+def parse_local_time(value: Union[str, time, None], kind: str) -> time:
+    if isinstance(value, time):
+        return value
+    if not value:
+        return DEFAULT_DIGEST_TIMES[kind]
+    # PostgREST отдаёт time как "08:00:00"
+    return time.fromisoformat(value)
+
+
+def next_fire_at(zone: ZoneInfo, local_time: time, after: datetime) -> datetime:
+    """First UTC instant strictly after `after` when the local clock in `zone` shows `local_time`."""
+    local_day = after.astimezone(zone).date()
+    for offset in (0, 1, 2):
+        candidate = datetime.combine(local_day + timedelta(days=offset), local_time, tzinfo=zone).astimezone(timezone.utc)
+        if candidate > after:
+            return candidate
+    raise ValueError(f"No fire time for {local_time} in {zone} after {after}")
+
+
+def schedule_rows(user: Dict[str, Any], after: datetime, default_timezone: str) -> List[Dict[str, Any]]:
+    """digest_schedule rows for a user: one per digest kind, none if notifications are off."""
+    if not user.get("notifications_enabled", True):
+        return []
+    zone = user_zone(user, default_timezone)
+    return [
+        {
+            "telegram_id": int(user["telegram_id"]),
+            "kind": kind,
+            "next_fire_at": next_fire_at(zone, parse_local_time(user.get(column), kind), after).isoformat(),
+            "attempts": 0,
+        }
+        for kind, column in DIGEST_TIME_COLUMNS.items()
+    ]
+
+
+def local_digest_date(fire_at: datetime, user: Dict[str, Any], default_timezone: str) -> date:
+    """The user's calendar day the digest belongs to (part of the outbox dedupe key)."""
+    return fire_at.astimezone(user_zone(user, default_timezone)).date()
+
+
+def is_missed(fire_at: datetime, now: datetime, max_lateness: timedelta) -> bool:
+    # утренний дайджест, отправленный днём, бесполезен: пропускаем и планируем на завтра
+    return now - fire_at > max_lateness
+
+
+def parse_fire_at(value: Union[str, datetime]) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def next_row(row: Dict[str, Any], user: Optional[Dict[str, Any]], now: datetime, default_timezone: str) -> Optional[Dict[str, Any]]:
+    """Schedule row for the next fire of `row`'s kind, or None if the user no longer gets digests."""
+    if user is None:
+        return None
+    for candidate in schedule_rows(user, now, default_timezone):
+        if candidate["kind"] == row["kind"]:
+            return candidate
+    return None
+
+
+def retry_row(row: Dict[str, Any], max_attempts: int) -> Optional[Dict[str, Any]]:
+    """`row` left due for another try after a failed send, or None once `max_attempts` are used."""
+    attempts = int(row.get("attempts") or 0) + 1
+    if attempts >= max_attempts:
+        return None
+    return {"telegram_id": int(row["telegram_id"]), "kind": row["kind"], "next_fire_at": row["next_fire_at"], "attempts": attempts}
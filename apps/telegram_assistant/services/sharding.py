@@ -0,0 +1,74 @@
+import hashlib
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional
+
+from apps.telegram_assistant.services.executor import STATUS_DUPLICATE, STATUS_FAILED, STATUS_OK, Outcome
+
+HASH_SPACE = 2**32
+# итоговые статусы: пользователь обработан, курсор можно двигать дальше
+DONE_STATUSES = {STATUS_OK, STATUS_DUPLICATE}
+# неудачного пользователя повторяем в следующих вызовах, пока не кончатся попытки
+MAX_ATTEMPTS = 3
+
+
+def telegram_hash(telegram_id: int) -> int:
+    # стабильный между процессами хэш (builtin hash() рандомизирован для str и не равномерен для int)
+    return int.from_bytes(hashlib.blake2b(str(telegram_id).encode(), digest_size=4).digest(), "big")
+
+
+def in_shard(telegram_id: int, shard: int, shards: int) -> bool:
+    """Shard `shard` of `shards` owns the hash range [shard/shards, (shard+1)/shards) of HASH_SPACE."""
+    low = HASH_SPACE * shard // shards
+    high = HASH_SPACE * (shard + 1) // shards
+    return low <= telegram_hash(telegram_id) < high
+
+
+def shard_users(users: Iterable[Dict[str, Any]], shard: int, shards: int) -> List[Dict[str, Any]]:
+    """Users of one shard ordered by telegram_id, the order the cursor walks in."""
+    selected = [user for user in users if in_shard(int(user["telegram_id"]), shard, shards)]
+    return sorted(selected, key=lambda user: int(user["telegram_id"]))
+
+
+def digest_dedupe_key(digest_date: date, kind: str, telegram_id: int) -> str:
+    return f"digest:{digest_date.isoformat()}:{kind}:{telegram_id}"
+
+
+def count_failures(failures: Dict[str, int], outcomes: Iterable[Outcome]) -> Dict[str, int]:
+    """Failed attempts per user (string keys, as stored in JSON) including this run's outcomes."""
+    counted = dict(failures)
+    for outcome in outcomes:
+        if outcome.status == STATUS_FAILED:
+            counted[str(outcome.key)] = counted.get(str(outcome.key), 0) + 1
+    return counted
+
+
+def advance_cursor(
+    pending: List[Dict[str, Any]],
+    outcomes: Dict[int, Outcome],
+    already_sent: Iterable[int],
+    cursor: Optional[int],
+    failures: Optional[Dict[str, int]] = None,
+    max_attempts: int = MAX_ATTEMPTS,
+) -> Optional[int]:
+    """Move the cursor over the longest prefix of `pending` that is fully done.
+
+    Users processed concurrently finish out of order, so the cursor only passes
+    a user once everyone before it is done; later successes past a gap are
+    protected from re-sending by the outbox dedupe key. A failed user is done
+    only once `failures` (see `count_failures`) reaches `max_attempts`.
+    """
+    sent = set(already_sent)
+    failures = failures or {}
+    for user in pending:
+        telegram_id = int(user["telegram_id"])
+        outcome = outcomes.get(telegram_id)
+        if telegram_id not in sent and not _is_done(outcome, failures.get(str(telegram_id), 0), max_attempts):
+            break
+        cursor = telegram_id
+    return cursor
+
+
+def _is_done(outcome: Optional[Outcome], failures: int, max_attempts: int) -> bool:
+    if outcome is None:
+        return False
+    return outcome.status in DONE_STATUSES or (outcome.status == STATUS_FAILED and failures >= max_attempts)
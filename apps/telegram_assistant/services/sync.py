@@ -0,0 +1,139 @@
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from apps.telegram_assistant.utils.dates import now_utc
+from packages.bitrix_client.models import Event, Task, normalize_events, normalize_tasks, parse_datetime
+
+logger = logging.getLogger(__name__)
+
+ENTITY_TASK = "task"
+ENTITY_EVENT = "event"
+
+COMPLETED_STATUSES = {"5"}
+FULL_SYNC_INTERVAL = timedelta(hours=6)
+_LOAD_STATE: Any = object()
+
+# перекрытие водяного знака: CHANGED_DATE в Bitrix с точностью до секунды
+WATERMARK_OVERLAP = timedelta(seconds=5)
+
+
+@dataclass
+class SyncResult:
+    entity_type: str
+    full: bool
+    fetched: int = 0
+    upserted: int = 0
+    deleted: int = 0
+
+
+def task_row(item: Dict[str, Any], bitrix_user_id: int) -> Dict[str, Any]:
+    return Task.from_bitrix(item).row(bitrix_user_id)
+
+
+def event_row(ev: Dict[str, Any], bitrix_user_id: int) -> Dict[str, Any]:
+    return Event.from_bitrix(ev).row(bitrix_user_id)
+
+
+def high_water_mark(rows: List[Dict[str, Any]], previous: Optional[datetime], now: datetime) -> datetime:
+    marks = [parse_datetime(row["updated_at"]) for row in rows if row.get("updated_at")]
+    if previous:
+        marks.append(previous)
+    return max(marks) if marks else now
+
+
+def diff_events(
+    rows: List[Dict[str, Any]], cached_ids: Set[int], mark: Optional[datetime]
+) -> Tuple[List[Dict[str, Any]], List[int]]:
+    """(rows to upsert, cached ids to delete) for one user's event window."""
+    changed = [
+        row
+        for row in rows
+        if row["bitrix_event_id"] not in cached_ids
+        or mark is None
+        or not row["updated_at"]
+        or parse_datetime(row["updated_at"]) > mark
+    ]
+    fetched_ids = {row["bitrix_event_id"] for row in rows}
+    return changed, [event_id for event_id in cached_ids if event_id not in fetched_ids]
+
+
+async def sync_tasks(
+    supabase,
+    bitrix,
+    bitrix_user_id: int,
+    state: Optional[Dict[str, Any]] = _LOAD_STATE,
+    full_sync_interval: timedelta = FULL_SYNC_INTERVAL,
+) -> SyncResult:
+    """Bring tasks_cache for one user up to date.
+
+    Normally only tasks with CHANGED_DATE above the stored high-water mark are
+    requested. Every `full_sync_interval` the user's open tasks are re-read in
+    full and cached rows missing from Bitrix (deleted or closed) are removed.
+    `state` is a sync_state row preloaded via `get_sync_states`, so that Bitrix
+    calls of several syncs start in the same tick and get batched.
+    """
+    now = now_utc()
+    if state is _LOAD_STATE:
+        state = await supabase.get_sync_state(bitrix_user_id, ENTITY_TASK)
+    state = state or {}
+    mark = parse_datetime(state.get("last_synced_at"))
+    last_full = parse_datetime(state.get("last_full_sync_at"))
+    full = mark is None or last_full is None or now - last_full >= full_sync_interval
+
+    if full:
+        items = [item async for item in bitrix.iter_tasks(bitrix_user_id, open_only=True)]
+    else:
+        changed_since = mark - WATERMARK_OVERLAP
+        items = [item async for item in bitrix.iter_tasks(bitrix_user_id, changed_since=changed_since)]
+
+    rows = normalize_tasks(items, bitrix_user_id)
+    open_rows = [row for row in rows if str(row["status"]) not in COMPLETED_STATUSES]
+    closed_ids = [row["bitrix_task_id"] for row in rows if str(row["status"]) in COMPLETED_STATUSES]
+
+    await supabase.upsert_tasks_cache(open_rows)
+    if full:
+        fetched_ids = {row["bitrix_task_id"] for row in rows}
+        cached_ids = await supabase.get_cached_task_ids(bitrix_user_id)
+        closed_ids = [task_id for task_id in cached_ids if task_id not in fetched_ids]
+    await supabase.delete_tasks_cache(closed_ids)
+
+    await supabase.upsert_sync_state(
+        bitrix_user_id,
+        ENTITY_TASK,
+        high_water_mark(rows, mark, now),
+        last_full_sync_at=now if full else None,
+    )
+    return SyncResult(ENTITY_TASK, full, fetched=len(items), upserted=len(open_rows), deleted=len(closed_ids))
+
+
+async def sync_events(
+    supabase,
+    bitrix,
+    bitrix_user_id: int,
+    date_from: datetime,
+    date_to: datetime,
+    state: Optional[Dict[str, Any]] = _LOAD_STATE,
+) -> SyncResult:
+    """Sync events of one user inside [date_from, date_to).
+
+    calendar.event.get has no change filter, so the window is always fetched;
+    only events modified after the stored mark are upserted and cached events
+    that disappeared from the window are deleted.
+    """
+    now = now_utc()
+    if state is _LOAD_STATE:
+        state = await supabase.get_sync_state(bitrix_user_id, ENTITY_EVENT)
+    state = state or {}
+    mark = parse_datetime(state.get("last_synced_at"))
+
+    items = [ev async for ev in bitrix.iter_events(bitrix_user_id, date_from, date_to)]
+    rows = normalize_events(items, bitrix_user_id)
+    cached = await supabase.get_events_cache(bitrix_user_id, date_from, date_to)
+    changed, deleted = diff_events(rows, {row["bitrix_event_id"] for row in cached}, mark)
+    await supabase.upsert_events_cache(changed)
+    await supabase.delete_events_cache(deleted)
+
+    await supabase.upsert_sync_state(bitrix_user_id, ENTITY_EVENT, high_water_mark(rows, mark, now))
+    return SyncResult(ENTITY_EVENT, mark is None, fetched=len(items), upserted=len(changed), deleted=len(deleted))
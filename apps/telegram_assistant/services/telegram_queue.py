@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import random
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+from apps.telegram_assistant.services.executor import STATUS_DUPLICATE, STATUS_SKIPPED
+from packages.common import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+TRANSIENT_ERRORS = (TelegramNetworkError, TelegramServerError)
+
+
+class TelegramSendQueue(BaseRequestMiddleware):
+    """Request middleware that paces every chat-bound Bot API call.
+
+    Installed on the bot session, so digest jobs (`bot.send_message`) and
+    handlers (`message.answer`) share the same limits: a global token bucket
+    (~30 msg/s) and at most one message per `per_chat_interval` per chat.
+    Slots are reserved in call order, which makes the waiting callers a FIFO
+    queue without a worker task. `TelegramRetryAfter` pauses the whole queue
+    for `retry_after` and the call is repeated; network/5xx errors are retried
+    with backoff. Each kind is retried at most `max_retries` times; a call
+    that gives up is counted as dropped and re-raised.
+    """
+
+    def __init__(
+        self,
+        supabase=None,
+        rate: float = 30.0,
+        per_chat_interval: float = 1.0,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        max_retry_after: float = 30.0,
+        claim_ttl: int = 60,
+    ) -> None:
+        self.supabase = supabase
+        self.bucket = TokenBucket(rate=rate, burst=int(rate), min_rate=1.0, jitter=0.0)
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_retry_after = max_retry_after
+        self.claim_ttl = claim_ttl
+        self._chat_slots: Dict[Any, float] = {}
+        self._paused_until = 0.0
+        self._waiting = 0
+        self.sent = 0
+        self.retried = 0
+        self.retry_after_events = 0
+        self.dropped: Counter = Counter()
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    def install(self, bot) -> "TelegramSendQueue":
+        bot.session.middleware(self)
+        return self
+
+    def _reserve_chat(self, chat_id: Any) -> float:
+        now = time.monotonic()
+        slot = max(now, self._chat_slots.get(chat_id, 0.0), self._paused_until)
+        self._chat_slots[chat_id] = slot + self.per_chat_interval
+        if len(self._chat_slots) > 10_000:
+            # старые слоты уже в прошлом и ни на что не влияют
+            self._chat_slots = {chat: at for chat, at in self._chat_slots.items() if at > now}
+        return slot - now
+
+    async def _wait_turn(self, chat_id: Any) -> None:
+        self._waiting += 1
+        try:
+            delay = self._reserve_chat(chat_id)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self.bucket.acquire()
+            # пауза от RetryAfter могла начаться, пока мы ждали
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+        finally:
+            self._waiting -= 1
+
+    def _drop(self, reason: str, method: Any, err: Exception) -> None:
+        self.dropped[reason] += 1
+        logger.error("Dropped Telegram %s for chat %s (%s): %s", type(method).__name__, getattr(method, "chat_id", None), reason, err)
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        enqueued = time.monotonic()
+        attempt = 0
+        pauses = 0
+        while True:
+            await self._wait_turn(chat_id)
+            try:
+                response = await make_request(bot, method)
+            except TelegramRetryAfter as err:
+                self.retry_after_events += 1
+                self.bucket.throttle()
+                pauses += 1
+                # без предела повторов вызов мог бы ждать дольше, чем живёт функция, и не отдать захват outbox
+                if err.retry_after > self.max_retry_after or pauses > self.max_retries:
+                    self._drop("retry_after", method, err)
+                    raise
+                # лимит общий для бота: останавливаем всю очередь, а не только этот чат
+                self._paused_until = max(self._paused_until, time.monotonic() + err.retry_after)
+                logger.warning("Telegram flood control, pausing sends for %ss", err.retry_after)
+                continue
+            except TRANSIENT_ERRORS as err:
+                attempt += 1
+                if attempt > self.max_retries:
+                    self._drop("transient", method, err)
+                    raise
+                self.retried += 1
+                base = self.backoff_factor * 2 ** (attempt - 1)
+                await asyncio.sleep(base / 2 + random.uniform(0, base / 2))
+                continue
+            except Exception as err:
+                self._drop("rejected", method, err)
+                raise
+            self.bucket.success()
+            latency = time.monotonic() - enqueued
+            self.sent += 1
+            self._latency_total += latency
+            self._latency_max = max(self._latency_max, latency)
+            return response
+
+    async def deliver(
+        self,
+        bot,
+        chat_id: int,
+        text: str,
+        dedupe_key: str,
+        payload: Optional[Dict[str, Any]] = None,
+        reply_markup: Any = None,
+    ) -> Optional[str]:
+        """Send once per `dedupe_key`, recording the delivery in notification_outbox.
+
+        The outbox row is claimed before sending and marked sent afterwards:
+        an already sent key gets STATUS_DUPLICATE, a key claimed by a live
+        overlapping job gets STATUS_SKIPPED (retried later), and a send that
+        fails releases the claim. A claim left by a killed job expires after
+        `claim_ttl` seconds.
+        """
+        payload = dict(payload or {})
+        claim = await self.supabase.claim_outbox(dedupe_key, chat_id, payload, lease_seconds=self.claim_ttl)
+        if claim == "sent":
+            return STATUS_DUPLICATE
+        if claim != "claimed":
+            return STATUS_SKIPPED
+        started = time.monotonic()
+        try:
+            message = await bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup)
+        except BaseException:
+            await self.supabase.release_outbox(dedupe_key)
+            raise
+        payload.update(message_id=message.message_id, latency_ms=int((time.monotonic() - started) * 1000))
+        await self.supabase.mark_outbox_sent(dedupe_key, payload)
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sent": self.sent,
+            "queue_depth": self._waiting,
+            "avg_latency_ms": int(self._latency_total / self.sent * 1000) if self.sent else 0,
+            "max_latency_ms": int(self._latency_max * 1000),
+            "retried": self.retried,
+            "retry_after_events": self.retry_after_events,
+            "dropped": dict(self.dropped),
+            "global_rate": self.bucket.stats()["rate"],
+        }
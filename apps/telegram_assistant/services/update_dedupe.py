@@ -0,0 +1,69 @@
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateDedupe:
+    """Remembers recent Telegram `update_id`s so redelivered updates are skipped.
+
+    The first layer is a bounded in-process LRU (O(1) per check). With
+    `supabase` the id is also inserted into assistant.telegram_update_ids,
+    which catches redeliveries that land on another serverless instance; the
+    table is pruned to the dedupe window by `/jobs/drain_updates`. An id is
+    recorded before the update is processed, so a retry that arrives while
+    the first delivery is still running is skipped as well.
+    """
+
+    def __init__(self, supabase=None, capacity: int = 10_000) -> None:
+        self.supabase = supabase
+        self.capacity = capacity
+        self._seen: "OrderedDict[int, None]" = OrderedDict()
+        self.hits = 0
+        self.persisted_hits = 0
+
+    def _remember(self, update_id: int) -> bool:
+        if update_id in self._seen:
+            self._seen.move_to_end(update_id)
+            return True
+        self._seen[update_id] = None
+        if len(self._seen) > self.capacity:
+            self._seen.popitem(last=False)
+        return False
+
+    async def seen(self, update_id: Optional[Any]) -> bool:
+        """True if `update_id` was already seen; otherwise records it."""
+        if update_id is None:
+            return False
+        update_id = int(update_id)
+        if self._remember(update_id):
+            self.hits += 1
+            return True
+        if self.supabase is None:
+            return False
+        try:
+            fresh = await self.supabase.mark_update_seen(update_id)
+        except Exception as err:  # noqa: BLE001
+            # лучше обработать апдейт дважды, чем потерять его из-за недоступной БД
+            logger.warning("Persisted update dedupe unavailable: %s", err)
+            return False
+        if not fresh:
+            self.hits += 1
+            self.persisted_hits += 1
+        return not fresh
+
+    async def forget(self, update_id: Any) -> None:
+        """Drop an id whose update was refused, so Telegram's redelivery is processed."""
+        self._seen.pop(int(update_id), None)
+        if self.supabase is not None:
+            await self.supabase.delete_seen_update(int(update_id))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._seen),
+            "capacity": self.capacity,
+            "persisted": self.supabase is not None,
+            "duplicates": self.hits,
+            "persisted_duplicates": self.persisted_hits,
+        }
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from packages.bitrix_client.models import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+DUPLICATE = "duplicate"
+FULL = "full"
+
+Process = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+def update_chat_id(body: Dict[str, Any]) -> Optional[int]:
+    """Chat an update belongs to (message, callback, member change...); None if it has none."""
+    for key, value in body.items():
+        if key == "update_id" or not isinstance(value, dict):
+            continue
+        chat = value.get("chat") or (value.get("message") or {}).get("chat") or value.get("from")
+        if isinstance(chat, dict) and "id" in chat:
+            return int(chat["id"])
+    return None
+
+
+class _LagStats:
+    def __init__(self) -> None:
+        self.processed = 0
+        self.failed = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+
+    def record(self, lag: float, ok: bool) -> None:
+        if ok:
+            self.processed += 1
+        else:
+            self.failed += 1
+        self.lag_total += lag
+        self.lag_max = max(self.lag_max, lag)
+
+    def as_dict(self) -> Dict[str, Any]:
+        handled = self.processed + self.failed
+        return {
+            "processed": self.processed,
+            "failed": self.failed,
+            "avg_lag_ms": int(self.lag_total / handled * 1000) if handled else 0,
+            "max_lag_ms": int(self.lag_max * 1000),
+        }
+
+
+class UpdateQueue:
+    """In-process update queue for a long-running server.
+
+    Every chat has its own FIFO drained by a single task, so updates of one
+    chat are handled in order while different chats run in parallel; the
+    number of updates processed at once is capped by `concurrency`. When
+    `max_pending` updates are waiting, new ones are refused (the webhook
+    answers 503 and Telegram retries later).
+    """
+
+    def __init__(self, process: Process, concurrency: int = 8, max_pending: int = 1000) -> None:
+        self.process = process
+        self.max_pending = max_pending
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._chats: Dict[Any, Deque[Tuple[float, Dict[str, Any]]]] = {}
+        self._workers: Dict[Any, asyncio.Task] = {}
+        self._depth = 0
+        self.refused = 0
+        self.lag = _LagStats()
+
+    async def submit(self, body: Dict[str, Any]) -> str:
+        if self._depth >= self.max_pending:
+            self.refused += 1
+            return FULL
+        chat = update_chat_id(body)
+        # апдейты без чата не упорядочиваем между собой
+        key = chat if chat is not None else ("update", body.get("update_id"))
+        self._chats.setdefault(key, deque()).append((time.monotonic(), body))
+        self._depth += 1
+        if key not in self._workers:
+            self._workers[key] = asyncio.ensure_future(self._drain_chat(key))
+        return QUEUED
+
+    async def _drain_chat(self, key: Any) -> None:
+        pending = self._chats[key]
+        try:
+            while pending:
+                async with self._semaphore:
+                    enqueued, body = pending.popleft()
+                    self._depth -= 1
+                    lag = time.monotonic() - enqueued
+                    try:
+                        await self.process(body)
+                    except Exception as err:  # noqa: BLE001
+                        logger.error("Failed to process update %s: %s", body.get("update_id"), err, exc_info=True)
+                        self.lag.record(lag, ok=False)
+                    else:
+                        self.lag.record(lag, ok=True)
+        finally:
+            self._workers.pop(key, None)
+            if not pending:
+                self._chats.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": "background",
+            "queue_depth": self._depth,
+            "active_chats": len(self._workers),
+            "refused": self.refused,
+            **self.lag.as_dict(),
+        }
+
+    async def aclose(self, timeout: float = 5.0) -> None:
+        workers = list(self._workers.values())
+        if not workers:
+            return
+        _, unfinished = await asyncio.wait(workers, timeout=timeout)
+        for task in unfinished:
+            task.cancel()
+
+
+class DurableUpdateQueue:
+    """Update queue backed by assistant.telegram_updates, for serverless.
+
+    The webhook only inserts the update (a repeated update_id is ignored) and
+    returns; `drain` claims updates through `claim_telegram_updates`, which
+    hands out at most the oldest unprocessed update of each chat, so per-chat
+    order holds across instances. A failed update is retried until
+    `max_attempts`, then marked processed with the error so the chat moves on.
+    """
+
+    def __init__(
+        self,
+        supabase,
+        process: Process,
+        concurrency: int = 8,
+        lease_seconds: int = 30,
+        max_attempts: int = 3,
+    ) -> None:
+        self.supabase = supabase
+        self.process = process
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.lag = _LagStats()
+
+    async def submit(self, body: Dict[str, Any]) -> str:
+        inserted = await self.supabase.enqueue_telegram_update(int(body["update_id"]), update_chat_id(body), body)
+        return QUEUED if inserted else DUPLICATE
+
+    async def _handle(self, row: Dict[str, Any]) -> None:
+        received_at = parse_datetime(row.get("received_at"))
+        lag = (datetime.now(timezone.utc) - received_at).total_seconds() if received_at else 0.0
+        try:
+            await self.process(row["payload"])
+        except Exception as err:  # noqa: BLE001
+            logger.error("Failed to process update %s: %s", row["update_id"], err, exc_info=True)
+            self.lag.record(lag, ok=False)
+            if int(row.get("attempts") or 0) >= self.max_attempts:
+                await self.supabase.complete_telegram_update(row["update_id"], error=str(err))
+            else:
+                await self.supabase.release_telegram_update(row["update_id"])
+            return
+        self.lag.record(lag, ok=True)
+        await self.supabase.complete_telegram_update(row["update_id"])
+
+    async def drain(self, budget: float = 8.0) -> Dict[str, Any]:
+        """Process claimed updates until the queue is empty or `budget` seconds are used."""
+        started = time.monotonic()
+        handled = 0
+        while time.monotonic() - started < budget:
+            rows: List[Dict[str, Any]] = await self.supabase.claim_telegram_updates(
+                self.concurrency, self.lease_seconds
+            )
+            if not rows:
+                break
+            await asyncio.gather(*(self._handle(row) for row in rows))
+            handled += len(rows)
+        return {"handled": handled, "elapsed_ms": int((time.monotonic() - started) * 1000)}
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters of this instance only; the shared backlog is reported by `backlog`."""
+        return {"mode": "durable", **self.lag.as_dict()}
+
+    async def backlog(self) -> Dict[str, Any]:
+        """Unprocessed updates of all instances (two PostgREST queries)."""
+        pending, oldest = await self.supabase.get_telegram_update_backlog()
+        oldest_at = parse_datetime(oldest)
+        return {
+            "queue_depth": pending,
+            "oldest_lag_ms": int((datetime.now(timezone.utc) - oldest_at).total_seconds() * 1000) if oldest_at else 0,
+        }
@@ -0,0 +1,88 @@
+import asyncio
+
+from apps.telegram_assistant.services.bitrix_events import BitrixEventIngestor, event_target, parse_event
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.upserted, self.deleted = [], []
+
+    async def get_all_users(self):
+        return [{"bitrix_user_id": 7}]
+
+    async def upsert_tasks_cache(self, rows):
+        self.upserted.extend(rows)
+
+    async def delete_tasks_cache(self, ids):
+        self.deleted.extend(ids)
+
+    async def upsert_events_cache(self, rows):
+        pass
+
+    async def delete_events_cache(self, ids):
+        pass
+
+
+class FakeBitrix:
+    def __init__(self, responsible_id="7"):
+        self.fetched = []
+        self.responsible_id = responsible_id
+
+    async def get_task(self, task_id):
+        self.fetched.append(task_id)
+        return {"ID": str(task_id), "TITLE": "t", "STATUS": "2", "RESPONSIBLE_ID": self.responsible_id, "DEADLINE": None}
+
+
+def test_parse_task_update_event():
+    body = b"event=ONTASKUPDATE&data%5BFIELDS_AFTER%5D%5BID%5D=42&auth%5Bapplication_token%5D=secret"
+    payload = parse_event(body)
+    assert payload["auth[application_token]"] == "secret"
+    assert event_target(payload) == ("task", 42, False)
+    assert event_target({"event": "ONTASKDELETE", "data[FIELDS_BEFORE][ID]": "42"}) == ("task", 42, True)
+    assert event_target({"event": "ONUSERADD"}) is None
+
+
+def test_burst_of_updates_is_debounced_into_one_fetch():
+    supabase, bitrix = FakeSupabase(), FakeBitrix()
+    ingestor = BitrixEventIngestor(supabase, bitrix, debounce=0.02)
+
+    async def scenario():
+        for _ in range(5):
+            await ingestor.submit("task", 42, False)
+        await ingestor.submit("task", 43, True)
+        await asyncio.sleep(0.1)
+
+    asyncio.run(scenario())
+    assert bitrix.fetched == [42]
+    assert [row["bitrix_task_id"] for row in supabase.upserted] == [42]
+    assert supabase.deleted == [43]
+
+
+def test_task_reassigned_to_unregistered_user_is_removed_from_cache():
+    supabase, bitrix = FakeSupabase(), FakeBitrix(responsible_id="99")
+    ingestor = BitrixEventIngestor(supabase, bitrix, debounce=0)
+
+    asyncio.run(ingestor.submit("task", 42, False))
+    assert supabase.upserted == []
+    assert supabase.deleted == [42]
+
+
+def test_failed_fetch_is_requeued_and_retried():
+    class FlakyBitrix(FakeBitrix):
+        async def get_task(self, task_id):
+            if not self.fetched:
+                self.fetched.append(None)
+                raise RuntimeError("portal down")
+            return await super().get_task(task_id)
+
+    supabase, bitrix = FakeSupabase(), FlakyBitrix()
+    ingestor = BitrixEventIngestor(supabase, bitrix, debounce=0.02)
+
+    async def scenario():
+        await ingestor.submit("task", 42, False)
+        await asyncio.sleep(0.1)
+
+    asyncio.run(scenario())
+    assert bitrix.fetched == [None, 42]
+    assert [row["bitrix_task_id"] for row in supabase.upserted] == [42]
+    assert ingestor.dropped == 0
@@ -0,0 +1,40 @@
+import json
+
+from apps.telegram_assistant.utils.diagnostics import DiagnosticsSink, parse_sample_rates
+
+
+def read(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_batches_are_written_on_flush(tmp_path):
+    path = tmp_path / "debug.log"
+    sink = DiagnosticsSink(str(path), flush_interval=60)
+    sink.emit("H_init", "main.py:init", "started", {"ok": True})
+    sink.emit("H_init", "main.py:init", "ready")
+    assert not path.exists()
+
+    sink.flush()
+    records = read(path)
+    assert [r["message"] for r in records] == ["started", "ready"]
+    assert records[0]["hypothesisId"] == "H_init" and records[0]["data"] == {"ok": True}
+    assert sink.stats()["written"] == 2
+
+
+def test_sampling_and_memory_cap(tmp_path):
+    path = tmp_path / "debug.log"
+    sink = DiagnosticsSink(
+        str(path), flush_interval=60, max_records=3, sample_rates=parse_sample_rates("H_noisy=0, *=1")
+    )
+    for i in range(5):
+        sink.emit("H_noisy", "main.py:health", "health called")
+        sink.emit("H_webhook", "main.py:webhook", str(i))
+    sink.flush()
+
+    # остались три самые новые записи, шумный тип отфильтрован целиком
+    assert [r["message"] for r in read(path)] == ["2", "3", "4"]
+    assert sink.stats()["dropped"] == 2 and sink.stats()["sampled_out"] == 5
+
+
+def test_malformed_sample_rates_are_skipped():
+    assert parse_sample_rates("H_a=0.5, H_b=half, =1, H_c=2") == {"H_a": 0.5, "H_c": 1.0}
@@ -0,0 +1,121 @@
+import asyncio
+import contextlib
+
+from apps.telegram_assistant.services.digest import digest_outcome, digest_pipeline, plan_digest
+from apps.telegram_assistant.services.executor import STATUS_DUPLICATE
+from apps.telegram_assistant.utils.dates import now_utc
+
+
+class RecordingBitrix:
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.requests = []
+        self.event_requests = []
+
+    def batch(self):
+        return contextlib.AsyncExitStack()
+
+    async def iter_tasks(self, responsible_id, changed_since=None, open_only=False):
+        self.requests.append((responsible_id, "delta" if changed_since else "full"))
+        for task in self.tasks:
+            if int(task["RESPONSIBLE_ID"]) == responsible_id:
+                yield task
+
+    async def iter_events(self, user_id, date_from, date_to):
+        self.event_requests.append(user_id)
+        return
+        yield
+
+
+class CacheRecorder:
+    def __init__(self, cached_tasks=(), states=None):
+        self.tasks = {row["bitrix_task_id"]: row for row in cached_tasks}
+        self.states = states or {}
+        self.marks = {}
+
+    async def get_sync_states(self, bitrix_user_ids, entity_type=None):
+        return {key: row for key, row in self.states.items() if key[0] in bitrix_user_ids}
+
+    async def upsert_tasks_cache(self, rows):
+        self.tasks.update({row["bitrix_task_id"]: row for row in rows})
+
+    async def get_cached_task_ids(self, bitrix_user_id):
+        return [task_id for task_id, row in self.tasks.items() if row["bitrix_user_id"] == bitrix_user_id]
+
+    async def delete_tasks_cache(self, ids):
+        for task_id in ids:
+            self.tasks.pop(task_id, None)
+
+    async def get_tasks_cache(self, bitrix_user_id, deadline_from=None, deadline_to=None):
+        rows = [row for row in self.tasks.values() if row["bitrix_user_id"] in bitrix_user_id]
+        return sorted(rows, key=lambda row: row["deadline"] or "")
+
+    async def get_events_cache(self, bitrix_user_id, start_from, start_to):
+        return []
+
+    async def upsert_events_cache(self, rows):
+        pass
+
+    async def delete_events_cache(self, ids):
+        pass
+
+    async def upsert_sync_state(self, bitrix_user_id, entity_type, last_synced_at, last_full_sync_at=None):
+        self.marks[(bitrix_user_id, entity_type)] = last_synced_at
+
+
+def _user(n, tz="Europe/Moscow"):
+    return {"telegram_id": n, "bitrix_user_id": n, "timezone": tz}
+
+
+def test_plan_digest_chunks_users_by_timezone():
+    users = [_user(i) for i in range(5)] + [_user(10, "Asia/Makassar")]
+    chunks = plan_digest(users, "Europe/Moscow", chunk_size=2)
+    assert [len(chunk.targets) for chunk in chunks] == [1, 2, 2, 1]
+    assert {t.tz for t in chunks[0]} == {"Asia/Makassar"}
+
+
+def test_pipeline_syncs_delta_and_renders_from_cache():
+    (chunk,) = plan_digest([_user(1), _user(2)], "Europe/Moscow")
+    start = chunk.start_day
+    tasks = [
+        {"ID": "10", "TITLE": "today", "STATUS": "2", "RESPONSIBLE_ID": "1", "DEADLINE": (start.replace(hour=15)).isoformat()},
+        {"ID": "12", "TITLE": "other", "STATUS": "3", "RESPONSIBLE_ID": "2", "DEADLINE": "2020-01-01T10:00:00+03:00"},
+    ]
+    bitrix = RecordingBitrix(tasks)
+    fresh = now_utc().isoformat()
+    old = {"bitrix_task_id": 11, "bitrix_user_id": 1, "title": "old", "status": "2", "deadline": "2020-01-01T10:00:00+03:00"}
+    gone = {"bitrix_task_id": 99, "bitrix_user_id": 2, "title": "gone", "status": "2", "deadline": "2020-01-01T10:00:00+03:00"}
+    # у пользователя 1 свежая полная сверка: из Bitrix только дельта, остальное — из кэша
+    supabase = CacheRecorder([old, gone], {(1, "task"): {"last_synced_at": fresh, "last_full_sync_at": fresh}})
+    delivered = {}
+
+    async def deliver(target):
+        delivered[target.telegram_id] = target.text
+        return STATUS_DUPLICATE if target.telegram_id == 2 else None
+
+    pipeline = digest_pipeline(supabase, bitrix, deliver)
+    items = asyncio.run(pipeline.run([chunk]))
+
+    assert sorted(bitrix.requests) == [(1, "delta"), (2, "full")]
+    assert sorted(bitrix.event_requests) == [1, 2]
+    assert {key[0] for key in supabase.marks} == {1, 2}
+    # полная сверка убирает из кэша задачу, которой больше нет в Bitrix
+    assert 99 not in supabase.tasks
+    assert "today" in delivered[1] and "old" in delivered[1] and "other" in delivered[2]
+    outcomes = {o.key: o.status for o in (digest_outcome(item, key=lambda t: t.telegram_id) for item in items)}
+    assert outcomes == {1: "ok", 2: "duplicate"}
+    assert pipeline.stats["sync"].items == 1 and pipeline.stats["deliver"].items == 2
+
+
+def test_failed_chunk_fails_every_user_of_it():
+    class BrokenBitrix(RecordingBitrix):
+        async def iter_tasks(self, *args, **kwargs):
+            raise RuntimeError("portal down")
+            yield
+
+    chunks = plan_digest([_user(1), _user(2)], "Europe/Moscow")
+    items = asyncio.run(digest_pipeline(CacheRecorder(), BrokenBitrix([])).run(chunks))
+    outcomes = [digest_outcome(item, key=lambda t: t.telegram_id) for item in items]
+    assert sorted(o.key for o in outcomes) == [1, 2]
+    assert {o.status for o in outcomes} == {"failed"}
+    assert "portal down" in outcomes[0].error
@@ -0,0 +1,20 @@
+import time
+
+from apps.telegram_assistant.services.executor import Deadline, Outcome
+
+
+def test_deadline_counts_down_from_start():
+    deadline = Deadline(budget=0.2, min_item_time=0.05)
+    time.sleep(0.05)
+    assert 0.05 <= deadline.elapsed() < 0.15
+    assert 0.05 < deadline.remaining() <= 0.15
+
+    time.sleep(0.2)
+    assert deadline.remaining() == 0.0
+    deadline.start()
+    assert deadline.remaining() > deadline.min_item_time
+
+
+def test_outcome_dict_omits_empty_error():
+    assert Outcome(1, "ok").as_dict() == {"key": 1, "status": "ok"}
+    assert Outcome(1, "failed", "boom").as_dict() == {"key": 1, "status": "failed", "error": "boom"}
@@ -0,0 +1,114 @@
+import asyncio
+
+from aiogram.fsm.storage.base import StorageKey
+
+from apps.telegram_assistant.services.fsm_storage import PersistentStorage, SQLiteFSMBackend
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=10)
+
+
+class CountingBackend(SQLiteFSMBackend):
+    def __init__(self, path):
+        super().__init__(path)
+        self.loads = 0
+        self.saves = []
+
+    async def load(self, keys):
+        self.loads += 1
+        return await super().load(keys)
+
+    async def save(self, rows):
+        self.saves.append(len(rows))
+        await super().save(rows)
+
+
+def test_write_through_cache_and_batched_flush(tmp_path):
+    path = str(tmp_path / "fsm.sqlite3")
+    backend = CountingBackend(path)
+    storage = PersistentStorage(backend)
+    other = StorageKey(bot_id=1, chat_id=20, user_id=20)
+
+    async def main():
+        assert await storage.get_state(KEY) is None
+        await storage.set_state(KEY, "awaiting_code")
+        await storage.update_data(KEY, {"email": "a@b.c"})
+        await storage.set_state(other, "awaiting_code")
+        await storage.flush()
+        # второй инстанс видит то же состояние через таблицу
+        fresh = PersistentStorage(SQLiteFSMBackend(path))
+        result = await fresh.get_state(KEY), await fresh.get_data(KEY), await storage.get_data(KEY)
+        await fresh.close()
+        await storage.close()
+        return result
+
+    state, data, cached = asyncio.run(main())
+    assert (state, data, cached) == ("awaiting_code", {"email": "a@b.c"}, {"email": "a@b.c"})
+    # два промаха (по ключу), остальное из кэша; оба ключа записаны одной пачкой
+    assert backend.loads == 2
+    assert backend.saves == [2]
+
+
+def test_ttl_expiry_and_stale_cache(tmp_path):
+    path = str(tmp_path / "fsm.sqlite3")
+
+    async def main():
+        writer = PersistentStorage(SQLiteFSMBackend(path), ttl=0.05)
+        reader = PersistentStorage(SQLiteFSMBackend(path), cache_ttl=0)
+        await writer.set_state(KEY, "awaiting_code")
+        await writer.flush()
+        seen = await reader.get_state(KEY)
+        await asyncio.sleep(0.06)
+        expired = await writer.get_state(KEY), await reader.get_state(KEY)
+        await writer.close()
+        await reader.close()
+        return seen, expired
+
+    assert asyncio.run(main()) == ("awaiting_code", (None, None))
+
+
+def test_lazy_middleware_reads_state_only_when_handler_asks(tmp_path):
+    from aiogram import Bot, Dispatcher
+    from aiogram.filters import Command
+    from aiogram.fsm.context import FSMContext
+    from aiogram.types import Message, Update
+
+    from apps.telegram_assistant.services.fsm_storage import LazyFSMContextMiddleware
+
+    backend = CountingBackend(str(tmp_path / "fsm.sqlite3"))
+    storage = PersistentStorage(backend)
+    dp = Dispatcher(storage=storage, disable_fsm=True)
+    LazyFSMContextMiddleware.install(dp)
+    seen = []
+
+    @dp.message(Command("help"))
+    async def stateless(message: Message) -> None:
+        seen.append("help")
+
+    @dp.message(Command("code"))
+    async def stateful(message: Message, state: FSMContext) -> None:
+        seen.append(await state.get_data())
+
+    def update(update_id, text):
+        message = {
+            "message_id": update_id,
+            "date": 1,
+            "chat": {"id": 10, "type": "private"},
+            "from": {"id": 10, "is_bot": False, "first_name": "u"},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text)}],
+        }
+        return Update.model_validate({"update_id": update_id, "message": message})
+
+    async def main():
+        bot = Bot("123456:test")
+        await dp.feed_update(bot, update(1, "/help"))
+        loads_after_help = backend.loads
+        await dp.feed_update(bot, update(2, "/code"))
+        await storage.flush()
+        await bot.session.close()
+        return loads_after_help
+
+    assert asyncio.run(main()) == 0
+    assert seen == ["help", {}]
+    # ничего не менялось — и писать нечего
+    assert backend.loads == 1 and backend.saves == []
@@ -0,0 +1,108 @@
+import asyncio
+
+from aiogram import Dispatcher
+from aiogram.methods import SendMessage
+from aiogram.types import Update
+
+from apps.telegram_assistant.bot import AssistantBot
+from apps.telegram_assistant.handlers import register_code, register_start
+from apps.telegram_assistant.utils.otp import AttemptLimiter, is_expired, issue_code, verify_code
+
+SECRET = b"test-secret"
+
+
+def test_code_is_bound_to_user_email_and_expiry():
+    code, challenge = issue_code(SECRET, 1, "a@b.c", 7, ttl=60)
+
+    # в вызове нет ни кода, ни его хэша без ключа
+    assert set(challenge) == {"email", "bitrix_user_id", "expires", "mac"}
+    assert verify_code(SECRET, challenge, 1, code)
+    assert verify_code(SECRET, challenge, 1, f" {code} ")
+    assert not verify_code(SECRET, challenge, 2, code)
+    assert not verify_code(b"other", challenge, 1, code)
+    assert not verify_code(SECRET, {**challenge, "email": "x@b.c"}, 1, code)
+    assert not verify_code(SECRET, {**challenge, "bitrix_user_id": 8}, 1, code)
+    assert not verify_code(SECRET, {**challenge, "expires": challenge["expires"] + 3600}, 1, code)
+    assert not is_expired(challenge) and is_expired(challenge, now=challenge["expires"])
+
+
+def test_attempt_limiter_slides_window():
+    limiter = AttemptLimiter(max_attempts=2, window=10)
+    assert limiter.hit("u", now=0) and limiter.hit("u", now=1)
+    assert not limiter.hit("u", now=2)
+    # попытки старше окна забываются
+    assert limiter.hit("u", now=12)
+    limiter.reset("u")
+    assert limiter.stats() == {"keys": 0}
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.users = []
+
+    async def get_user_by_telegram_id(self, telegram_id):
+        return None
+
+    async def upsert_user(self, user):
+        self.users.append(user)
+
+
+class FakeBitrix:
+    def __init__(self):
+        self.sent = []
+
+    async def find_user_by_email(self, email):
+        return {"ID": "7"}
+
+    async def send_im_notify(self, to_user_id, message):
+        self.sent.append(message.rsplit(" ", 1)[-1])
+
+
+def _run(texts, max_attempts=5):
+    supabase, bitrix, replies = FakeSupabase(), FakeBitrix(), []
+    bot = AssistantBot("123456:test", resolve={"supabase": supabase, "bitrix": bitrix}.__getitem__)
+
+    async def offline(make_request, bot, method):
+        if isinstance(method, SendMessage):
+            replies.append(method.text)
+        return True
+
+    bot.session.middleware(offline)
+    dp = Dispatcher()
+    register_start(dp, SECRET)
+    register_code(dp, SECRET, AttemptLimiter(max_attempts=max_attempts), lockout=600)
+
+    async def main():
+        for update_id, text in enumerate(texts, 1):
+            if callable(text):
+                text = text(bitrix)
+            message = {
+                "message_id": update_id,
+                "date": 1,
+                "chat": {"id": 1, "type": "private"},
+                "from": {"id": 1, "is_bot": False, "first_name": "u"},
+                "text": text,
+                "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}],
+            }
+            await dp.feed_update(bot, Update.model_validate({"update_id": update_id, "message": message}))
+        await bot.session.close()
+
+    asyncio.run(main())
+    return supabase, replies
+
+
+def test_start_then_code_links_user_without_auth_code_queries():
+    supabase, replies = _run(["/start a@b.c", "/code 000000x", lambda bitrix: f"/code {bitrix.sent[-1]}"])
+
+    assert replies[1].startswith("Неверный код")
+    assert replies[2].startswith("Привязка завершена")
+    assert supabase.users == [{"telegram_id": 1, "telegram_chat_id": 1, "bitrix_user_id": 7, "email": "a@b.c"}]
+
+
+def test_too_many_attempts_lock_out_even_the_right_code():
+    right = lambda bitrix: f"/code {bitrix.sent[-1]}"  # noqa: E731
+    supabase, replies = _run(["/start a@b.c", "/code 1", "/code 2", "/code 3", right, "/start a@b.c"], max_attempts=2)
+
+    assert replies[3].startswith("Слишком много") and replies[4].startswith("Слишком много")
+    assert replies[5].startswith("Слишком много")
+    assert supabase.users == []
@@ -0,0 +1,102 @@
+import asyncio
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import AnswerCallbackQuery, EditMessageText
+from aiogram.types import Update
+
+from apps.telegram_assistant.handlers.pages import page_keyboard, register_pages
+from apps.telegram_assistant.services.pages import PageSnapshot, PageSnapshots
+from apps.telegram_assistant.utils.render import PAGE_SIZE, paginate, render_summary
+
+
+def _tasks(count):
+    return [{"title": f"Задача <{i}> & отчёт " + "x" * 80, "deadline": "2026-01-13T18:00:00+03:00"} for i in range(count)]
+
+
+def test_long_digest_is_split_into_escaped_pages_under_the_limit():
+    text = render_summary("Europe/Moscow", _tasks(10), _tasks(200), [])
+    pages = paginate(text)
+
+    assert len(text) > 4096 and len(pages) > 1
+    assert all(0 < len(page) <= PAGE_SIZE for page in pages)
+    assert "<0>" not in text and "Задача &lt;0&gt; &amp; отчёт" in pages[0]
+    # страницы режутся по строкам и вместе содержат весь текст
+    assert [line for page in pages for line in page.split("\n") if line] == [line for line in text.split("\n") if line]
+
+    # строку длиннее страницы режем, не разрывая HTML-сущность
+    parts = paginate("&amp;" * 10, size=12)
+    assert all(part.count("&") == part.count(";") for part in parts) and "".join(parts) == "&amp;" * 10
+
+
+def test_page_callbacks_are_answered_from_snapshot():
+    snapshots = PageSnapshots()
+    snapshot = PageSnapshot.create(["page 1", "page 2", "page 3"])
+    asyncio.run(snapshots.put(42, snapshot))
+    dp = Dispatcher()
+    register_pages(dp, snapshots)
+    bot = Bot("123456:test")
+    calls = []
+
+    async def offline(make_request, bot, method):
+        calls.append(method)
+        return True
+
+    bot.session.middleware(offline)
+
+    def callback(data, update_id):
+        return Update.model_validate(
+            {
+                "update_id": update_id,
+                "callback_query": {
+                    "id": str(update_id),
+                    "chat_instance": "1",
+                    "data": data,
+                    "from": {"id": 42, "is_bot": False, "first_name": "u"},
+                    "message": {"message_id": 7, "date": 1, "chat": {"id": 42, "type": "private"}, "text": "page 1"},
+                },
+            }
+        )
+
+    async def main():
+        await dp.feed_update(bot, callback(f"pg:{snapshot.token}:1", 1))
+        await dp.feed_update(bot, callback("pg:stale:1", 2))
+        await bot.session.close()
+
+    asyncio.run(main())
+
+    edit, answer, stale = calls
+    assert isinstance(edit, EditMessageText) and edit.text == "page 2"
+    assert [b.text for b in edit.reply_markup.inline_keyboard[0]] == ["« Назад", "2/3", "Вперёд »"]
+    assert isinstance(answer, AnswerCallbackQuery) and not answer.show_alert
+    assert isinstance(stale, AnswerCallbackQuery) and stale.show_alert
+    assert snapshots.stats() == {"users": 1, "hits": 1, "loaded": 0, "misses": 1}
+
+    assert page_keyboard(PageSnapshot.create(["only"]), 0) is None
+    first = page_keyboard(snapshot, 0).inline_keyboard[0]
+    assert [b.text for b in first] == ["1/3", "Вперёд »"]
+
+
+def test_snapshot_missing_in_memory_is_loaded_from_supabase():
+    class SnapshotStore:
+        def __init__(self):
+            self.rows = {}
+
+        async def upsert_page_snapshot(self, telegram_id, token, pages, expires_at):
+            self.rows[telegram_id] = {"token": token, "pages": pages, "expires_at": expires_at.isoformat()}
+
+        async def get_page_snapshot(self, telegram_id, token):
+            row = self.rows.get(telegram_id)
+            return row if row and row["token"] == token else None
+
+    store = SnapshotStore()
+    snapshot = PageSnapshot.create(["page 1", "page 2"])
+    # отправил один инстанс, кнопку обрабатывает другой
+    sender, other = PageSnapshots(supabase=store), PageSnapshots(supabase=store)
+
+    async def scenario():
+        await sender.put(42, snapshot)
+        return await other.get(42, snapshot.token), await other.get(42, snapshot.token), await other.get(42, "stale")
+
+    loaded, cached, stale = asyncio.run(scenario())
+    assert loaded == snapshot and cached == snapshot and stale is None
+    assert other.stats() == {"users": 1, "hits": 1, "loaded": 1, "misses": 1}
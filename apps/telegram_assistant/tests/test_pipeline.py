@@ -0,0 +1,57 @@
+import asyncio
+
+from apps.telegram_assistant.services.executor import Deadline
+from apps.telegram_assistant.services.pipeline import Failure, Pipeline, Stage
+
+
+def test_stages_overlap_and_respect_concurrency():
+    in_flight = {"slow": 0}
+    peak = {"slow": 0}
+    log = []
+
+    async def fetch(item):
+        log.append(("fetch", item))
+        await asyncio.sleep(0.01)
+        return item
+
+    async def slow(item):
+        in_flight["slow"] += 1
+        peak["slow"] = max(peak["slow"], in_flight["slow"])
+        await asyncio.sleep(0.03)
+        in_flight["slow"] -= 1
+        log.append(("send", item))
+        return item * 10
+
+    pipeline = Pipeline([Stage("fetch", fetch), Stage("send", slow, concurrency=2)])
+    results = asyncio.run(pipeline.run(range(6)))
+
+    assert sorted(results) == [0, 10, 20, 30, 40, 50]
+    assert peak["slow"] == 2
+    # следующий элемент уже скачивается, пока предыдущий отправляется
+    assert log.index(("fetch", 3)) < log.index(("send", 2))
+    assert pipeline.stats["send"].items == 6
+
+
+def test_failures_pass_through_and_fan_out():
+    def split(chunk):
+        if chunk == "bad":
+            raise ValueError("boom")
+        return list(chunk)
+
+    pipeline = Pipeline([Stage("split", split, fan_out=True), Stage("upper", str.upper)])
+    results = asyncio.run(pipeline.run(["ab"]))
+    assert sorted(results) == ["A", "B"]
+
+    (failure,) = asyncio.run(Pipeline([Stage("split", split), Stage("upper", str.upper)]).run(["bad"]))
+    assert isinstance(failure, Failure) and failure.stage == "split"
+
+
+def test_deadline_skips_items_that_cannot_start():
+    async def work(item):
+        await asyncio.sleep(0.1)
+        return item
+
+    deadline = Deadline(budget=0.15, min_item_time=0.05)
+    results = asyncio.run(Pipeline([Stage("work", work)], deadline=deadline).run([1, 2, 3]))
+    assert results[0] == 1
+    assert all(isinstance(item, Failure) for item in results[1:])
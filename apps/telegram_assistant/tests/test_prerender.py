@@ -0,0 +1,32 @@
+from apps.telegram_assistant.services.digest import DigestTarget
+from apps.telegram_assistant.services.prerender import digest_content_hash, reuse_or_render
+from apps.telegram_assistant.utils.dates import day_bounds, now_utc
+
+
+def _target(deadline):
+    start, end = day_bounds(now_utc(), "Europe/Moscow")
+    target = DigestTarget({"telegram_id": 1, "bitrix_user_id": 1}, "Europe/Moscow", start, end)
+    target.tasks_today = [{"bitrix_task_id": 10, "title": "Отчёт", "deadline": deadline}]
+    return target
+
+
+def test_hash_ignores_datetime_format_of_the_source():
+    # строка из Bitrix и та же дата, прочитанная из Postgres
+    assert digest_content_hash(_target("2026-01-13T18:00:00+03:00")) == digest_content_hash(
+        _target("2026-01-13T15:00:00+00:00")
+    )
+    assert digest_content_hash(_target("2026-01-13T18:00:00+03:00")) != digest_content_hash(
+        _target("2026-01-13T19:00:00+03:00")
+    )
+
+
+def test_stored_text_is_reused_until_data_changes():
+    stored = {"text": "pre-rendered", "content_hash": digest_content_hash(_target("2026-01-13T18:00:00+03:00"))}
+
+    same = _target("2026-01-13T15:00:00+00:00")
+    assert reuse_or_render(same, stored) is False
+    assert same.text == "pre-rendered"
+
+    moved = _target("2026-01-13T20:00:00+03:00")
+    assert reuse_or_render(moved, stored) is True
+    assert "Отчёт" in moved.text
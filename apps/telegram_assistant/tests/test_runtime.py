@@ -0,0 +1,24 @@
+from types import SimpleNamespace
+
+from apps.telegram_assistant.runtime import Runtime
+
+SETTINGS = SimpleNamespace(
+    telegram_bot_token="123456:test",
+    supabase_url="http://127.0.0.1:9",
+    supabase_service_role_key="key",
+    telegram_rate_limit=30.0,
+    telegram_chat_interval=1.0,
+    outbox_claim_ttl=60,
+)
+
+
+def test_dependencies_are_built_on_first_use():
+    runtime = Runtime(SETTINGS)
+    assert not runtime.built("bot")
+
+    bot = runtime.bot
+    assert runtime.built("telegram_queue")
+    # бот создан, а Supabase — нет, пока хендлер его не попросит
+    assert not runtime.built("supabase")
+    assert bot["supabase"] is runtime.supabase
+    assert runtime.built("supabase") and not runtime.built("bitrix")
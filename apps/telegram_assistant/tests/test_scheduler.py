@@ -0,0 +1,54 @@
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from apps.telegram_assistant.services.scheduler import (
+    is_missed,
+    local_digest_date,
+    next_fire_at,
+    next_row,
+    retry_row,
+    schedule_rows,
+)
+
+UTC = timezone.utc
+
+
+def test_next_fire_at_uses_local_time_of_the_user():
+    after = datetime(2026, 1, 13, 3, 0, tzinfo=UTC)
+    # 08:00 в Москве (UTC+3) — 05:00 UTC того же дня
+    assert next_fire_at(ZoneInfo("Europe/Moscow"), time(8, 0), after) == datetime(2026, 1, 13, 5, 0, tzinfo=UTC)
+    # 08:00 на Бали (UTC+8) уже прошло — следующий раз завтра
+    assert next_fire_at(ZoneInfo("Asia/Makassar"), time(8, 0), after) == datetime(2026, 1, 14, 0, 0, tzinfo=UTC)
+
+
+def test_next_fire_at_follows_dst():
+    zone = ZoneInfo("Europe/Berlin")
+    winter = next_fire_at(zone, time(8, 0), datetime(2026, 3, 28, 12, 0, tzinfo=UTC))
+    summer = next_fire_at(zone, time(8, 0), winter)
+    assert winter == datetime(2026, 3, 29, 6, 0, tzinfo=UTC)
+    assert summer == datetime(2026, 3, 30, 6, 0, tzinfo=UTC)
+    assert summer - winter == timedelta(hours=24)
+
+
+def test_schedule_rows_respect_user_settings():
+    now = datetime(2026, 1, 13, 0, 0, tzinfo=UTC)
+    user = {"telegram_id": 7, "timezone": "Europe/Moscow", "morning_time": "09:30:00", "evening_time": "19:00:00"}
+    rows = {row["kind"]: row["next_fire_at"] for row in schedule_rows(user, now, "Europe/Moscow")}
+    assert rows == {"morning": "2026-01-13T06:30:00+00:00", "evening": "2026-01-13T16:00:00+00:00"}
+    assert schedule_rows({**user, "notifications_enabled": False}, now, "Europe/Moscow") == []
+    assert next_row({"telegram_id": 7, "kind": "evening"}, None, now, "Europe/Moscow") is None
+
+
+def test_digest_date_and_lateness():
+    fire_at = datetime(2026, 1, 13, 22, 0, tzinfo=UTC)
+    assert local_digest_date(fire_at, {"timezone": "Asia/Makassar"}, "Europe/Moscow") == date(2026, 1, 14)
+    assert not is_missed(fire_at, fire_at + timedelta(minutes=5), timedelta(hours=1))
+    assert is_missed(fire_at, fire_at + timedelta(hours=2), timedelta(hours=1))
+
+
+def test_failed_row_stays_due_until_attempts_run_out():
+    row = {"telegram_id": 7, "kind": "morning", "next_fire_at": "2026-01-13T05:00:00+00:00"}
+    first = retry_row(row, max_attempts=3)
+    assert first == {**row, "attempts": 1}
+    assert retry_row(first, max_attempts=3) == {**row, "attempts": 2}
+    assert retry_row({**row, "attempts": 2}, max_attempts=3) is None
@@ -0,0 +1,40 @@
+from datetime import date
+
+from apps.telegram_assistant.services.executor import Outcome
+from apps.telegram_assistant.services.sharding import advance_cursor, count_failures, digest_dedupe_key, shard_users
+
+
+def test_shards_partition_users_exactly_once():
+    users = [{"telegram_id": i} for i in range(1000, 1400)]
+    shards = [shard_users(users, shard, 4) for shard in range(4)]
+    ids = sorted(u["telegram_id"] for shard in shards for u in shard)
+    assert ids == list(range(1000, 1400))
+    assert all(40 < len(shard) < 160 for shard in shards)
+    assert all(shard == sorted(shard, key=lambda u: u["telegram_id"]) for shard in shards)
+
+
+def test_cursor_stops_at_first_unfinished_user():
+    pending = [{"telegram_id": i} for i in (1, 2, 3, 4, 5)]
+    outcomes = {
+        1: Outcome(1, "ok"),
+        3: Outcome(3, "failed"),
+        4: Outcome(4, "timeout"),
+        5: Outcome(5, "ok"),
+    }
+    assert advance_cursor(pending, outcomes, already_sent=[2], cursor=None) == 2
+    assert advance_cursor(pending, {}, already_sent=[], cursor=0) == 0
+
+
+def test_failed_user_is_retried_until_attempts_run_out():
+    pending = [{"telegram_id": i} for i in (1, 2, 3)]
+    outcomes = {1: Outcome(1, "ok"), 2: Outcome(2, "failed"), 3: Outcome(3, "ok")}
+
+    failures = count_failures({}, outcomes.values())
+    assert failures == {"2": 1}
+    assert advance_cursor(pending, outcomes, [], None, failures, max_attempts=2) == 1
+    failures = count_failures(failures, [outcomes[2]])
+    assert advance_cursor(pending, outcomes, [], None, failures, max_attempts=2) == 3
+
+
+def test_dedupe_key_format():
+    assert digest_dedupe_key(date(2026, 1, 13), "morning", 42) == "digest:2026-01-13:morning:42"
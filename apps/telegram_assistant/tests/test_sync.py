@@ -0,0 +1,82 @@
+import asyncio
+from datetime import timedelta
+
+from apps.telegram_assistant.services.sync import sync_tasks
+
+
+class MemorySupabase:
+    def __init__(self):
+        self.tasks = {}
+        self.state = {}
+
+    async def get_sync_state(self, bitrix_user_id, entity_type):
+        return self.state.get((bitrix_user_id, entity_type))
+
+    async def upsert_sync_state(self, bitrix_user_id, entity_type, last_synced_at, last_full_sync_at=None):
+        record = dict(self.state.get((bitrix_user_id, entity_type)) or {})
+        record["last_synced_at"] = last_synced_at.isoformat()
+        if last_full_sync_at:
+            record["last_full_sync_at"] = last_full_sync_at.isoformat()
+        self.state[(bitrix_user_id, entity_type)] = record
+
+    async def upsert_tasks_cache(self, rows):
+        for row in rows:
+            self.tasks[row["bitrix_task_id"]] = row
+
+    async def get_cached_task_ids(self, bitrix_user_id):
+        return [task_id for task_id, row in self.tasks.items() if row["bitrix_user_id"] == bitrix_user_id]
+
+    async def delete_tasks_cache(self, task_ids):
+        for task_id in task_ids:
+            self.tasks.pop(task_id, None)
+
+
+class FakeBitrix:
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.calls = []
+
+    async def iter_tasks(self, responsible_id, changed_since=None, open_only=False):
+        self.calls.append({"changed_since": changed_since, "open_only": open_only})
+        for task in self.tasks:
+            if open_only and task["STATUS"] == "5":
+                continue
+            if changed_since and task["CHANGED_DATE"] <= changed_since.isoformat():
+                continue
+            yield task
+
+
+def _task(task_id, changed, status="2"):
+    return {
+        "ID": str(task_id),
+        "TITLE": f"Task {task_id}",
+        "STATUS": status,
+        "DEADLINE": "2026-01-13T18:00:00+00:00",
+        "CHANGED_DATE": changed,
+    }
+
+
+def test_first_sync_is_full_then_only_changes_are_requested():
+    supabase = MemorySupabase()
+    bitrix = FakeBitrix([_task(1, "2026-01-10T10:00:00+00:00"), _task(2, "2026-01-11T10:00:00+00:00")])
+
+    first = asyncio.run(sync_tasks(supabase, bitrix, 7))
+    assert first.full and set(supabase.tasks) == {1, 2}
+    assert supabase.state[(7, "task")]["last_synced_at"].startswith("2026-01-11T10:00:00")
+
+    bitrix.tasks = [_task(1, "2026-01-10T10:00:00+00:00"), _task(2, "2026-01-12T09:00:00+00:00", status="5")]
+    second = asyncio.run(sync_tasks(supabase, bitrix, 7))
+    assert not second.full
+    assert bitrix.calls[-1]["changed_since"] is not None
+    assert second.fetched == 1 and set(supabase.tasks) == {1}
+
+
+def test_periodic_full_sync_drops_tasks_deleted_in_bitrix():
+    supabase = MemorySupabase()
+    bitrix = FakeBitrix([_task(1, "2026-01-10T10:00:00+00:00"), _task(2, "2026-01-11T10:00:00+00:00")])
+    asyncio.run(sync_tasks(supabase, bitrix, 7))
+
+    bitrix.tasks = [_task(1, "2026-01-10T10:00:00+00:00")]
+    result = asyncio.run(sync_tasks(supabase, bitrix, 7, full_sync_interval=timedelta(0)))
+    assert result.full and result.deleted == 1
+    assert set(supabase.tasks) == {1}
@@ -0,0 +1,111 @@
+import asyncio
+import time
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError, TelegramRetryAfter
+from aiogram.methods import GetMe, SendMessage
+
+from apps.telegram_assistant.services.telegram_queue import TelegramSendQueue
+
+
+class FakeApi:
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.calls = []
+
+    async def __call__(self, bot, method):
+        self.calls.append((getattr(method, "chat_id", None), time.monotonic()))
+        if self.errors:
+            error = self.errors.pop(0)
+            if error is not None:
+                raise error
+        return "ok"
+
+
+def test_per_chat_interval_and_global_pass_through():
+    queue = TelegramSendQueue(rate=100, per_chat_interval=0.1)
+    api = FakeApi()
+
+    async def main():
+        await asyncio.gather(
+            queue(api, None, SendMessage(chat_id=1, text="a")),
+            queue(api, None, SendMessage(chat_id=1, text="b")),
+            queue(api, None, SendMessage(chat_id=2, text="c")),
+            queue(api, None, GetMe()),
+        )
+
+    asyncio.run(main())
+    chat1 = [at for chat, at in api.calls if chat == 1]
+    chat2 = [at for chat, at in api.calls if chat == 2]
+    assert chat1[1] - chat1[0] >= 0.09
+    assert chat2[0] - chat1[0] < 0.05
+    assert queue.stats()["sent"] == 3
+
+
+def test_retry_after_and_transient_errors_are_retried():
+    method = SendMessage(chat_id=1, text="a")
+    api = FakeApi([TelegramRetryAfter(method, "flood", retry_after=0), TelegramNetworkError(method, "reset")])
+    queue = TelegramSendQueue(rate=100, per_chat_interval=0.0, backoff_factor=0.01)
+    assert asyncio.run(queue(api, None, method)) == "ok"
+    stats = queue.stats()
+    assert len(api.calls) == 3
+    assert stats["retry_after_events"] == 1 and stats["retried"] == 1 and stats["dropped"] == {}
+
+
+def test_permanent_errors_are_dropped():
+    method = SendMessage(chat_id=1, text="a")
+    queue = TelegramSendQueue(rate=100, per_chat_interval=0.0, max_retry_after=5)
+    with pytest.raises(TelegramBadRequest):
+        asyncio.run(queue(FakeApi([TelegramBadRequest(method, "chat not found")]), None, method))
+    with pytest.raises(TelegramRetryAfter):
+        asyncio.run(queue(FakeApi([TelegramRetryAfter(method, "flood", retry_after=60)]), None, method))
+    assert queue.stats()["dropped"] == {"rejected": 1, "retry_after": 1}
+
+    # повторяющийся flood control не держит вызов бесконечно
+    capped = TelegramSendQueue(rate=100, per_chat_interval=0.0, max_retries=2)
+    api = FakeApi([TelegramRetryAfter(method, "flood", retry_after=0)] * 5)
+    with pytest.raises(TelegramRetryAfter):
+        asyncio.run(capped(api, None, method))
+    assert len(api.calls) == 3 and capped.stats()["dropped"] == {"retry_after": 1}
+
+
+class FakeOutbox:
+    def __init__(self, claim):
+        self.claim = claim
+        self.calls = []
+
+    async def claim_outbox(self, dedupe_key, chat_id, payload, lease_seconds):
+        self.calls.append(("claim", dedupe_key, lease_seconds))
+        return self.claim
+
+    async def mark_outbox_sent(self, dedupe_key, payload):
+        self.calls.append(("sent", dedupe_key, payload["message_id"]))
+
+    async def release_outbox(self, dedupe_key):
+        self.calls.append(("release", dedupe_key))
+
+
+class FakeBot:
+    def __init__(self, error=None):
+        self.error = error
+
+    async def send_message(self, chat_id, text, reply_markup=None):
+        if self.error:
+            raise self.error
+        return type("Message", (), {"message_id": 5})()
+
+
+def test_deliver_marks_sent_only_after_the_send():
+    outbox = FakeOutbox("claimed")
+    queue = TelegramSendQueue(outbox, claim_ttl=30)
+    assert asyncio.run(queue.deliver(FakeBot(), 1, "hi", "k")) is None
+    assert outbox.calls == [("claim", "k", 30), ("sent", "k", 5)]
+
+    failing = FakeOutbox("claimed")
+    with pytest.raises(RuntimeError):
+        asyncio.run(TelegramSendQueue(failing).deliver(FakeBot(RuntimeError("down")), 1, "hi", "k"))
+    assert failing.calls[-1] == ("release", "k")
+
+    # уже доставленный ключ — дубликат, чужой живой захват — повтор в следующем вызове
+    assert asyncio.run(TelegramSendQueue(FakeOutbox("sent")).deliver(FakeBot(), 1, "hi", "k")) == "duplicate"
+    assert asyncio.run(TelegramSendQueue(FakeOutbox("busy")).deliver(FakeBot(), 1, "hi", "k")) == "skipped"
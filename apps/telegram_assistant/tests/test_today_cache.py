@@ -0,0 +1,77 @@
+import asyncio
+from datetime import timedelta
+
+from apps.telegram_assistant.handlers.today import build_summary
+from apps.telegram_assistant.utils.dates import now_utc
+
+
+class CacheOnlySupabase:
+    def __init__(self, refreshed_ago):
+        self.writes = 0
+        refreshed_at = (now_utc() - refreshed_ago).isoformat()
+        self.states = {
+            (7, entity): {"last_synced_at": refreshed_at, "last_full_sync_at": refreshed_at, "refreshed_at": refreshed_at}
+            for entity in ("task", "event")
+        }
+
+    async def get_sync_states(self, bitrix_user_ids, entity_type=None):
+        return self.states
+
+    async def get_tasks_cache(self, bitrix_user_id, deadline_from=None, deadline_to=None):
+        return [{"title": "cached task", "deadline": None}] if deadline_from else []
+
+    async def get_events_cache(self, bitrix_user_id, start_from, start_to):
+        return []
+
+    async def _write(self, *args, **kwargs):
+        self.writes += 1
+
+    upsert_tasks_cache = delete_tasks_cache = upsert_events_cache = delete_events_cache = upsert_sync_state = _write
+
+    async def get_cached_task_ids(self, bitrix_user_id):
+        return []
+
+
+class SlowBitrix:
+    def __init__(self):
+        self.calls = 0
+        self.finished = False
+
+    async def iter_tasks(self, *args, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        self.finished = True
+        return
+        yield
+
+    async def iter_events(self, *args, **kwargs):
+        self.calls += 1
+        return
+        yield
+
+
+USER = {"bitrix_user_id": 7, "timezone": "UTC"}
+
+
+def test_fresh_cache_is_served_without_bitrix_calls():
+    bitrix = SlowBitrix()
+    supabase = CacheOnlySupabase(refreshed_ago=timedelta(seconds=10))
+    text = asyncio.run(build_summary(supabase, bitrix, USER, "UTC", max_staleness=timedelta(minutes=5)))
+    assert "cached task" in text
+    assert bitrix.calls == 0
+
+
+def test_stale_cache_is_served_immediately_and_refreshed_in_background():
+    bitrix = SlowBitrix()
+    supabase = CacheOnlySupabase(refreshed_ago=timedelta(minutes=10))
+
+    async def scenario():
+        text = await build_summary(supabase, bitrix, USER, "UTC", max_staleness=timedelta(minutes=5))
+        finished_before_answer = bitrix.finished
+        await asyncio.sleep(0.1)
+        return text, finished_before_answer
+
+    text, finished_before_answer = asyncio.run(scenario())
+    assert "cached task" in text
+    assert not finished_before_answer
+    assert bitrix.finished and supabase.writes > 0
@@ -0,0 +1,55 @@
+import asyncio
+
+from apps.telegram_assistant.services.update_dedupe import UpdateDedupe
+
+
+class FakeSupabase:
+    def __init__(self, fail=False):
+        self.ids = set()
+        self.fail = fail
+
+    async def mark_update_seen(self, update_id):
+        if self.fail:
+            raise RuntimeError("down")
+        fresh = update_id not in self.ids
+        self.ids.add(update_id)
+        return fresh
+
+    async def delete_seen_update(self, update_id):
+        self.ids.discard(update_id)
+
+
+def test_lru_skips_repeats_and_evicts_oldest():
+    dedupe = UpdateDedupe(capacity=2)
+
+    async def main():
+        return [await dedupe.seen(i) for i in (1, 2, 1, 3, 1, 2)]
+
+    # 1 освежён повтором, поэтому вытесняется 2
+    assert asyncio.run(main()) == [False, False, True, False, True, False]
+    assert dedupe.stats()["duplicates"] == 2
+
+
+def test_persisted_window_across_instances():
+    supabase = FakeSupabase()
+    first, second = UpdateDedupe(supabase), UpdateDedupe(supabase)
+
+    async def main():
+        return await first.seen(10), await second.seen(10), await second.seen(None)
+
+    assert asyncio.run(main()) == (False, True, False)
+    assert second.stats()["persisted_duplicates"] == 1
+
+
+def test_forget_and_fail_open():
+    supabase = FakeSupabase()
+    dedupe = UpdateDedupe(supabase)
+
+    async def main():
+        await dedupe.seen(5)
+        await dedupe.forget(5)
+        fresh = await dedupe.seen(5)
+        supabase.fail = True
+        return fresh, await dedupe.seen(6)
+
+    assert asyncio.run(main()) == (False, False)
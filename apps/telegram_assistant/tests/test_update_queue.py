@@ -0,0 +1,107 @@
+import asyncio
+
+from apps.telegram_assistant.services.update_queue import (
+    DUPLICATE,
+    FULL,
+    QUEUED,
+    DurableUpdateQueue,
+    UpdateQueue,
+    update_chat_id,
+)
+
+
+def message(update_id, chat_id):
+    return {"update_id": update_id, "message": {"message_id": update_id, "chat": {"id": chat_id}, "text": "x"}}
+
+
+def test_update_chat_id():
+    assert update_chat_id(message(1, 42)) == 42
+    callback = {"update_id": 2, "callback_query": {"id": "q", "from": {"id": 7}, "message": {"chat": {"id": 9}}}}
+    assert update_chat_id(callback) == 9
+    assert update_chat_id({"update_id": 3, "poll": {"id": "p"}}) is None
+
+
+def test_per_chat_order_and_parallel_chats():
+    log = []
+    active = {"now": 0, "max": 0}
+
+    async def process(body):
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        await asyncio.sleep(0.01)
+        log.append((body["message"]["chat"]["id"], body["update_id"]))
+        active["now"] -= 1
+
+    async def main():
+        queue = UpdateQueue(process, concurrency=2)
+        for update_id in range(6):
+            assert await queue.submit(message(update_id, update_id % 3)) == QUEUED
+        await queue.aclose()
+        return queue.stats()
+
+    stats = asyncio.run(main())
+    for chat in range(3):
+        assert [u for c, u in log if c == chat] == [u for u in range(6) if u % 3 == chat]
+    assert active["max"] == 2
+    assert stats["processed"] == 6 and stats["queue_depth"] == 0
+
+
+def test_full_queue_refuses():
+    async def process(body):
+        await asyncio.sleep(0.01)
+
+    async def main():
+        queue = UpdateQueue(process, max_pending=2)
+        results = [await queue.submit(message(i, 1)) for i in range(3)]
+        await queue.aclose()
+        return results, queue.refused
+
+    results, refused = asyncio.run(main())
+    assert results == [QUEUED, QUEUED, FULL]
+    assert refused == 1
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.rows = {}
+        self.completed = {}
+        self.released = []
+
+    async def enqueue_telegram_update(self, update_id, chat_id, payload):
+        if update_id in self.rows:
+            return False
+        self.rows[update_id] = {"update_id": update_id, "chat_id": chat_id, "payload": payload, "attempts": 0}
+        return True
+
+    async def claim_telegram_updates(self, limit, lease_seconds):
+        pending = [r for u, r in sorted(self.rows.items()) if u not in self.completed and u not in self.released]
+        for row in pending[:limit]:
+            row["attempts"] += 1
+        return pending[:limit]
+
+    async def complete_telegram_update(self, update_id, error=None):
+        self.completed[update_id] = error
+
+    async def release_telegram_update(self, update_id):
+        self.released.append(update_id)
+
+
+def test_durable_queue_dedupes_and_gives_up():
+    supabase = FakeSupabase()
+
+    async def process(body):
+        if body["update_id"] == 2:
+            raise RuntimeError("boom")
+
+    async def main():
+        queue = DurableUpdateQueue(supabase, process, max_attempts=1)
+        assert await queue.submit(message(1, 5)) == QUEUED
+        assert await queue.submit(message(1, 5)) == DUPLICATE
+        await queue.submit(message(2, 6))
+        return await queue.drain(budget=1.0), queue.stats()
+
+    result, stats = asyncio.run(main())
+    assert result["handled"] == 2
+    assert supabase.completed == {1: None, 2: "boom"}
+    # /health берёт только счётчики процесса, в FakeSupabase нет запроса backlog
+    assert stats["mode"] == "durable" and stats["processed"] == 1 and stats["failed"] == 1
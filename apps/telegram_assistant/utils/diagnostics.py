@@ -0,0 +1,157 @@
+import atexit
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+DEFAULT_PATH = os.path.join(ROOT, ".cursor", "debug.log")
+
+
+def parse_sample_rates(value: Optional[str]) -> Dict[str, float]:
+    rates: Dict[str, float] = {}
+    for item in (value or "").split(","):
+        name, _, rate = item.partition("=")
+        if not (name.strip() and rate.strip()):
+            continue
+        try:
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+        except ValueError:
+            # разбирается при импорте main.py: опечатка в переменной не должна ронять приложение
+            logger.warning("Ignoring malformed sample rate %r", item.strip())
+    return rates
+
+
+class DiagnosticsSink:
+    """Debug-mode NDJSON log written off the hot path.
+
+    `emit` only samples the record and appends it to an in-memory buffer; a
+    daemon thread serializes and writes buffered records in batches, once
+    `batch_size` records are waiting or every `flush_interval` seconds. The
+    buffer holds at most `max_records`: under pressure the oldest records are
+    dropped. Never log secrets.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        max_records: int = 10_000,
+        sample_rates: Optional[Dict[str, float]] = None,
+        run_id: str = "pre-fix",
+    ) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sample_rates = dict(sample_rates or {})
+        self.run_id = run_id
+        # deque с maxlen сам вытесняет самые старые записи; append потокобезопасен
+        self._buffer: Deque[Dict[str, Any]] = deque(maxlen=max_records)
+        self._wakeup = threading.Event()
+        self._write_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.counters: Counter = Counter()
+
+    def _rate(self, event_type: str) -> float:
+        return self.sample_rates.get(event_type, self.sample_rates.get("*", 1.0))
+
+    def emit(self, event_type: str, location: str, message: str, data: Optional[Dict[str, Any]] = None) -> None:
+        rate = self._rate(event_type)
+        if rate < 1.0 and random.random() >= rate:
+            self.counters["sampled_out"] += 1
+            return
+        if len(self._buffer) == self._buffer.maxlen:
+            self.counters["dropped"] += 1
+        self._buffer.append(
+            {
+                "sessionId": "debug-session",
+                "runId": self.run_id,
+                "hypothesisId": event_type,
+                "location": location,
+                "message": message,
+                "data": data or {},
+                "timestamp": int(time.time() * 1000),
+            }
+        )
+        if self._thread is None:
+            self._start()
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def _start(self) -> None:
+        with self._write_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="diagnostics-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """Write everything buffered so far; safe to call from any thread."""
+        with self._write_lock:
+            lines = []
+            while self._buffer:
+                try:
+                    record = self._buffer.popleft()
+                except IndexError:
+                    break
+                lines.append(json.dumps(record, ensure_ascii=False, default=str))
+            if not lines:
+                return
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+                self.counters["written"] += len(lines)
+            except Exception:
+                # диагностика никогда не ломает приложение
+                self.counters["write_errors"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"buffered": len(self._buffer), **self.counters}
+
+
+_sink: Optional[DiagnosticsSink] = None
+_configured = False
+_sink_lock = threading.Lock()
+
+
+def get_sink() -> Optional[DiagnosticsSink]:
+    """Process-wide sink, None when diagnostics are off.
+
+    DIAGNOSTICS_PATH (default `<repo>/.cursor/debug.log`; off if its directory
+    is missing), DIAGNOSTICS_SAMPLE_RATES (`"H_runtime_requests=0.1,*=1"`),
+    AGENT_RUN_ID (runId of every record).
+    """
+    global _sink, _configured
+    if not _configured:
+        with _sink_lock:
+            if not _configured:
+                path = os.getenv("DIAGNOSTICS_PATH", DEFAULT_PATH)
+                # локальный отладочный лог: без каталога (Vercel, CI) ничего не пишем и поток не стартуем
+                if os.path.isdir(os.path.dirname(path) or "."):
+                    _sink = DiagnosticsSink(
+                        path,
+                        sample_rates=parse_sample_rates(os.getenv("DIAGNOSTICS_SAMPLE_RATES")),
+                        run_id=os.getenv("AGENT_RUN_ID", "pre-fix"),
+                    )
+                    atexit.register(_sink.flush)
+                _configured = True
+    return _sink
+
+
+def agent_log(hypothesis_id: str, location: str, message: str, data: Optional[Dict[str, Any]] = None) -> None:
+    sink = get_sink()
+    if sink is not None:
+        sink.emit(hypothesis_id, location, message, data)
@@ -1,19 +1,87 @@
 import hashlib
+import hmac
 import secrets
-from datetime import datetime, timedelta, timezone
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+OTP_TTL = 900
 
 
 def generate_code(length: int = 6) -> str:
     return "".join(secrets.choice("0123456789") for _ in range(length))
 
 
-def hash_code(code: str) -> str:
-    return hashlib.sha256(code.encode()).hexdigest()
+def _mac(secret: bytes, telegram_id: int, email: str, bitrix_user_id: int, expires: int, code: str) -> str:
+    message = f"{telegram_id}\n{email.lower()}\n{bitrix_user_id}\n{expires}\n{code}".encode()
+    return hmac.new(secret, message, hashlib.sha256).hexdigest()
+
+
+def issue_code(
+    secret: bytes, telegram_id: int, email: str, bitrix_user_id: int, ttl: int = OTP_TTL
+) -> Tuple[str, Dict[str, Any]]:
+    """New code and its challenge: email, Bitrix user and expiry bound to the code by HMAC.
+
+    The challenge holds no code or unkeyed hash of it, so it can be kept in
+    FSM data; `verify_code` then needs nothing but the secret.
+    """
+    code = generate_code()
+    expires = int(time.time()) + ttl
+    challenge = {
+        "email": email,
+        "bitrix_user_id": bitrix_user_id,
+        "expires": expires,
+        "mac": _mac(secret, telegram_id, email, bitrix_user_id, expires, code),
+    }
+    return code, challenge
+
+
+def is_expired(challenge: Dict[str, Any], now: Optional[float] = None) -> bool:
+    return int(challenge["expires"]) <= (time.time() if now is None else now)
+
+
+def verify_code(secret: bytes, challenge: Dict[str, Any], telegram_id: int, code: str) -> bool:
+    """Constant-time check of `code` against a challenge from `issue_code` (expiry is checked separately)."""
+    expected = _mac(
+        secret,
+        telegram_id,
+        challenge["email"],
+        int(challenge["bitrix_user_id"]),
+        int(challenge["expires"]),
+        code.strip(),
+    )
+    return hmac.compare_digest(expected, str(challenge["mac"]))
+
+
+class AttemptLimiter:
+    """Sliding-window attempt counter per key, in process memory.
+
+    `hit` records an attempt and returns False once more than `max_attempts`
+    were made within `window` seconds. Keys are LRU-bounded by `max_keys`.
+    """
 
+    def __init__(self, max_attempts: int = 5, window: float = OTP_TTL, max_keys: int = 10_000) -> None:
+        self.max_attempts = max_attempts
+        self.window = window
+        self.max_keys = max_keys
+        self._attempts: "OrderedDict[Any, Deque[float]]" = OrderedDict()
 
-def expires_at(minutes: int = 15) -> str:
-    return (datetime.now(timezone.utc) + timedelta(minutes=minutes)).isoformat()
+    def hit(self, key: Any, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        attempts = self._attempts.get(key)
+        if attempts is None:
+            # хранить больше max_attempts + 1 отметок не нужно: решение зависит только от последних
+            attempts = self._attempts[key] = deque(maxlen=self.max_attempts + 1)
+            while len(self._attempts) > self.max_keys:
+                self._attempts.popitem(last=False)
+        self._attempts.move_to_end(key)
+        while attempts and attempts[0] <= now - self.window:
+            attempts.popleft()
+        attempts.append(now)
+        return len(attempts) <= self.max_attempts
 
+    def reset(self, key: Any) -> None:
+        self._attempts.pop(key, None)
 
-def verify_code(code: str, code_hash: str) -> bool:
-    return hash_code(code) == code_hash
+    def stats(self) -> Dict[str, Any]:
+        return {"keys": len(self._attempts)}
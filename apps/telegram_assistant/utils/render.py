@@ -0,0 +1,76 @@
+from html import escape
+from typing import Any, Dict, List
+
+# Telegram режет сообщения длиннее 4096 символов; запас под заголовок дайджеста
+PAGE_SIZE = 3800
+TITLE_LIMIT = 300
+
+
+def _title(value: Any) -> str:
+    text = str(value)
+    if len(text) > TITLE_LIMIT:
+        text = text[: TITLE_LIMIT - 1] + "…"
+    # сообщения уходят с parse_mode=HTML: "<" в названии задачи ломает отправку
+    return escape(text, quote=False)
+
+
+def fmt_tasks(items: List[Dict[str, Any]]) -> str:
+    rows = []
+    for item in items:
+        deadline = item.get("deadline")
+        rows.append(f"- {_title(item.get('title'))} (до {deadline or '—'})")
+    return "\n".join(rows) if rows else "—"
+
+
+def fmt_events(items: List[Dict[str, Any]]) -> str:
+    rows = []
+    for ev in items:
+        rows.append(f"- {_title(ev.get('title') or 'Событие')} ({ev.get('start_at')} - {ev.get('end_at')})")
+    return "\n".join(rows) if rows else "—"
+
+
+def render_summary(
+    tz: str,
+    tasks_today: List[Dict[str, Any]],
+    tasks_overdue: List[Dict[str, Any]],
+    events_today: List[Dict[str, Any]],
+) -> str:
+    return (
+        f"Задачи на сегодня (tz {escape(tz)}):\n{fmt_tasks(tasks_today)}\n\n"
+        f"Просроченные:\n{fmt_tasks(tasks_overdue)}\n\n"
+        f"События сегодня:\n{fmt_events(events_today)}"
+    )
+
+
+def _split_line(line: str, size: int) -> List[str]:
+    parts = []
+    while len(line) > size:
+        cut = size
+        # не разрываем HTML-сущность вроде &amp;
+        amp = line.rfind("&", cut - 8, cut)
+        if amp > 0 and ";" not in line[amp:cut]:
+            cut = amp
+        parts.append(line[:cut])
+        line = line[cut:]
+    parts.append(line)
+    return parts
+
+
+def paginate(text: str, size: int = PAGE_SIZE) -> List[str]:
+    """Split rendered HTML text into pages of at most `size` characters, on line boundaries."""
+    pages: List[str] = []
+    current: List[str] = []
+    length = 0
+    for line in text.split("\n"):
+        for part in _split_line(line, size):
+            if current and length + 1 + len(part) > size:
+                pages.append("\n".join(current).strip("\n"))
+                current, length = [], 0
+            if not current and not part:
+                # страница не начинается с пустой строки-разделителя секций
+                continue
+            length += len(part) + (1 if current else 0)
+            current.append(part)
+    if current or not pages:
+        pages.append("\n".join(current).strip("\n"))
+    return pages
@@ -0,0 +1,5 @@
+-- Delta sync: отметка последней полной сверки (для удаления задач, пропавших в Bitrix)
+alter table assistant.sync_state add column if not exists last_full_sync_at timestamptz;
+
+create index if not exists idx_tasks_user_deadline on assistant.tasks_cache (bitrix_user_id, deadline);
+create index if not exists idx_events_user_start on assistant.events_cache (bitrix_user_id, start_at);
@@ -0,0 +1,2 @@
+-- Когда кэш пользователя последний раз сверялся с Bitrix (для cache-first /today)
+alter table assistant.sync_state add column if not exists refreshed_at timestamptz;
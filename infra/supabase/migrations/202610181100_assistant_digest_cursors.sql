@@ -0,0 +1,22 @@
+-- Курсор шардированных дайджестов: следующий вызов продолжает с last_telegram_id
+create table if not exists assistant.digest_cursors (
+  id bigserial primary key,
+  digest_date date not null,
+  kind text not null,
+  shard smallint not null default 0,
+  shards smallint not null default 1,
+  last_telegram_id bigint,
+  completed boolean not null default false,
+  updated_at timestamptz not null default now(),
+  unique (digest_date, kind, shard, shards)
+);
+
+alter table assistant.digest_cursors enable row level security;
+
+do $$
+begin
+  if not exists (select 1 from pg_policies where polname = 'assistant_digest_cursors_service_role') then
+    create policy assistant_digest_cursors_service_role on assistant.digest_cursors for all
+      to public using (auth.role() = 'service_role') with check (auth.role() = 'service_role');
+  end if;
+end $$;
@@ -0,0 +1,74 @@
+-- Расписание дайджестов: ближайшее время отправки в UTC по каждому пользователю и виду.
+-- Тик планировщика читает только строки с next_fire_at <= now() по индексу, без обхода users.
+create table if not exists assistant.digest_schedule (
+  telegram_id bigint not null references assistant.users (telegram_id) on delete cascade,
+  kind text not null check (kind in ('morning','evening')),
+  next_fire_at timestamptz not null,
+  primary key (telegram_id, kind)
+);
+
+create index if not exists idx_digest_schedule_next_fire on assistant.digest_schedule (next_fire_at);
+
+-- Ближайший момент после p_after, когда в часовом поясе p_timezone наступает p_local_time
+create or replace function assistant.next_digest_fire(p_timezone text, p_local_time time, p_after timestamptz default now())
+returns timestamptz
+language sql
+stable
+as $$
+  select case
+    when (((p_after at time zone p_timezone)::date + p_local_time) at time zone p_timezone) > p_after
+      then ((p_after at time zone p_timezone)::date + p_local_time) at time zone p_timezone
+    else ((p_after at time zone p_timezone)::date + 1 + p_local_time) at time zone p_timezone
+  end
+$$;
+
+-- Пересчёт расписания при привязке пользователя и смене его настроек
+create or replace function assistant.sync_digest_schedule()
+returns trigger
+language plpgsql
+as $$
+begin
+  delete from assistant.digest_schedule where telegram_id = new.telegram_id;
+  if new.notifications_enabled then
+    insert into assistant.digest_schedule (telegram_id, kind, next_fire_at)
+    values
+      (new.telegram_id, 'morning', assistant.next_digest_fire(new.timezone, new.morning_time)),
+      (new.telegram_id, 'evening', assistant.next_digest_fire(new.timezone, new.evening_time));
+  end if;
+  return new;
+end $$;
+
+drop trigger if exists users_digest_schedule_insert on assistant.users;
+create trigger users_digest_schedule_insert
+  after insert on assistant.users
+  for each row execute function assistant.sync_digest_schedule();
+
+drop trigger if exists users_digest_schedule_update on assistant.users;
+create trigger users_digest_schedule_update
+  after update of timezone, morning_time, evening_time, notifications_enabled on assistant.users
+  for each row
+  when (
+    old.timezone is distinct from new.timezone
+    or old.morning_time is distinct from new.morning_time
+    or old.evening_time is distinct from new.evening_time
+    or old.notifications_enabled is distinct from new.notifications_enabled
+  )
+  execute function assistant.sync_digest_schedule();
+
+insert into assistant.digest_schedule (telegram_id, kind, next_fire_at)
+select telegram_id, 'morning', assistant.next_digest_fire(timezone, morning_time)
+from assistant.users where notifications_enabled
+union all
+select telegram_id, 'evening', assistant.next_digest_fire(timezone, evening_time)
+from assistant.users where notifications_enabled
+on conflict (telegram_id, kind) do nothing;
+
+alter table assistant.digest_schedule enable row level security;
+
+do $$
+begin
+  if not exists (select 1 from pg_policies where polname = 'assistant_digest_schedule_service_role') then
+    create policy assistant_digest_schedule_service_role on assistant.digest_schedule for all
+      to public using (auth.role() = 'service_role') with check (auth.role() = 'service_role');
+  end if;
+end $$;
@@ -0,0 +1,22 @@
+-- Заранее отрендеренные дайджесты: warm-up job пишет текст и хэш данных, тик планировщика только отправляет
+create table if not exists assistant.digest_renders (
+  telegram_id bigint not null references assistant.users (telegram_id) on delete cascade,
+  digest_date date not null,
+  kind text not null check (kind in ('morning','evening')),
+  text text not null,
+  content_hash text not null,
+  rendered_at timestamptz not null default now(),
+  primary key (telegram_id, digest_date, kind)
+);
+
+create index if not exists idx_digest_renders_date on assistant.digest_renders (digest_date);
+
+alter table assistant.digest_renders enable row level security;
+
+do $$
+begin
+  if not exists (select 1 from pg_policies where polname = 'assistant_digest_renders_service_role') then
+    create policy assistant_digest_renders_service_role on assistant.digest_renders for all
+      to public using (auth.role() = 'service_role') with check (auth.role() = 'service_role');
+  end if;
+end $$;
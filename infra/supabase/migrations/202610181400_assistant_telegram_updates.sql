@@ -0,0 +1,57 @@
+-- Очередь входящих апдейтов Telegram: webhook только вставляет апдейт, обработка идёт отдельным drain
+create table if not exists assistant.telegram_updates (
+  update_id bigint primary key,
+  chat_id bigint,
+  payload jsonb not null,
+  received_at timestamptz not null default now(),
+  locked_until timestamptz,
+  attempts smallint not null default 0,
+  processed_at timestamptz,
+  error text
+);
+
+create index if not exists idx_telegram_updates_pending on assistant.telegram_updates (chat_id, update_id)
+  where processed_at is null;
+create index if not exists idx_telegram_updates_processed on assistant.telegram_updates (processed_at)
+  where processed_at is not null;
+
+-- Выдаёт только самый старый необработанный апдейт каждого чата, так что порядок внутри чата
+-- сохраняется при параллельных drain; апдейты без чата между собой не упорядочены
+create or replace function assistant.claim_telegram_updates(p_limit int, p_lease_seconds int)
+returns setof assistant.telegram_updates
+language plpgsql
+as $$
+begin
+  return query
+  with heads as (
+    select distinct on (chat_id is null, coalesce(chat_id, update_id)) update_id
+    from assistant.telegram_updates
+    where processed_at is null
+    order by chat_id is null, coalesce(chat_id, update_id), update_id
+  ),
+  ready as (
+    select u.update_id
+    from assistant.telegram_updates u
+    join heads h on h.update_id = u.update_id
+    where u.locked_until is null or u.locked_until < now()
+    order by u.update_id
+    limit p_limit
+    for update of u skip locked
+  )
+  update assistant.telegram_updates t
+     set locked_until = now() + make_interval(secs => p_lease_seconds),
+         attempts = t.attempts + 1
+    from ready
+   where t.update_id = ready.update_id
+  returning t.*;
+end $$;
+
+alter table assistant.telegram_updates enable row level security;
+
+do $$
+begin
+  if not exists (select 1 from pg_policies where polname = 'assistant_telegram_updates_service_role') then
+    create policy assistant_telegram_updates_service_role on assistant.telegram_updates for all
+      to public using (auth.role() = 'service_role') with check (auth.role() = 'service_role');
+  end if;
+end $$;
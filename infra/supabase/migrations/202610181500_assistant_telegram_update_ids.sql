@@ -0,0 +1,17 @@
+-- Окно дедупликации update_id для режимов inline/background: Telegram повторяет апдейт, если webhook ответил медленно
+create table if not exists assistant.telegram_update_ids (
+  update_id bigint primary key,
+  seen_at timestamptz not null default now()
+);
+
+create index if not exists idx_telegram_update_ids_seen_at on assistant.telegram_update_ids (seen_at);
+
+alter table assistant.telegram_update_ids enable row level security;
+
+do $$
+begin
+  if not exists (select 1 from pg_policies where polname = 'assistant_telegram_update_ids_service_role') then
+    create policy assistant_telegram_update_ids_service_role on assistant.telegram_update_ids for all
+      to public using (auth.role() = 'service_role') with check (auth.role() = 'service_role');
+  end if;
+end $$;
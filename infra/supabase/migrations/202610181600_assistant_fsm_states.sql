@@ -0,0 +1,20 @@
+-- Состояние FSM aiogram, общее для всех инстансов (вместо MemoryStorage)
+create table if not exists assistant.fsm_states (
+  key text primary key, -- bot_id:chat_id:user_id:thread_id:destiny
+  state text,
+  data jsonb not null default '{}'::jsonb,
+  expires_at timestamptz,
+  updated_at timestamptz not null default now()
+);
+
+create index if not exists idx_fsm_states_expires_at on assistant.fsm_states (expires_at);
+
+alter table assistant.fsm_states enable row level security;
+
+do $$
+begin
+  if not exists (select 1 from pg_policies where polname = 'assistant_fsm_states_service_role') then
+    create policy assistant_fsm_states_service_role on assistant.fsm_states for all
+      to public using (auth.role() = 'service_role') with check (auth.role() = 'service_role');
+  end if;
+end $$;
@@ -0,0 +1,39 @@
+-- Захват outbox до отправки: sent_at ставится только после успешной отправки, а незавершённый захват
+-- (функцию убили между захватом и отправкой) через p_lease_seconds снова можно захватить
+alter table assistant.notification_outbox
+  alter column sent_at drop not null,
+  alter column sent_at drop default,
+  add column if not exists claimed_at timestamptz not null default now();
+
+-- 'claimed' — отправляет вызывающий, 'sent' — уже доставлено, 'busy' — захват ещё держит другой вызов
+create or replace function assistant.claim_outbox(
+  p_dedupe_key text,
+  p_telegram_chat_id bigint,
+  p_payload jsonb,
+  p_lease_seconds int
+)
+returns text
+language plpgsql
+as $$
+declare
+  v_sent_at timestamptz;
+begin
+  insert into assistant.notification_outbox (dedupe_key, telegram_chat_id, payload, claimed_at, sent_at)
+  values (p_dedupe_key, p_telegram_chat_id, p_payload, now(), null)
+  on conflict (dedupe_key) do update
+     set telegram_chat_id = excluded.telegram_chat_id,
+         payload = excluded.payload,
+         claimed_at = now()
+   where notification_outbox.sent_at is null
+     and notification_outbox.claimed_at < now() - make_interval(secs => p_lease_seconds);
+  if found then
+    return 'claimed';
+  end if;
+
+  select sent_at into v_sent_at from assistant.notification_outbox where dedupe_key = p_dedupe_key;
+  return case when v_sent_at is null then 'busy' else 'sent' end;
+end $$;
+
+-- Повторы неудачных пользователей в шарде: telegram_id -> число неудачных попыток за день
+alter table assistant.digest_cursors
+  add column if not exists failures jsonb not null default '{}'::jsonb;
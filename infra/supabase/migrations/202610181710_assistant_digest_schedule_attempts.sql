@@ -0,0 +1,4 @@
+-- Неудачный дайджест остаётся в выборке тика: attempts ограничивает число повторов,
+-- после последней попытки строка переносится на следующий раз и счётчик сбрасывается
+alter table assistant.digest_schedule
+  add column if not exists attempts smallint not null default 0;
@@ -0,0 +1,20 @@
+-- Снимки страниц длинных дайджестов: листание работает на любом инстансе, а не только на отправившем
+create table if not exists assistant.page_snapshots (
+  telegram_id bigint primary key references assistant.users (telegram_id) on delete cascade,
+  token text not null,
+  pages jsonb not null,
+  expires_at timestamptz not null,
+  created_at timestamptz not null default now()
+);
+
+create index if not exists idx_page_snapshots_expires_at on assistant.page_snapshots (expires_at);
+
+alter table assistant.page_snapshots enable row level security;
+
+do $$
+begin
+  if not exists (select 1 from pg_policies where polname = 'assistant_page_snapshots_service_role') then
+    create policy assistant_page_snapshots_service_role on assistant.page_snapshots for all
+      to public using (auth.role() = 'service_role') with check (auth.role() = 'service_role');
+  end if;
+end $$;
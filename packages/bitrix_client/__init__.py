@@ -1,3 +1,24 @@
-from .client import BitrixClient, BitrixAPIError
+from packages.common import TokenBucket, TTLCache
 
-__all__ = ["BitrixClient", "BitrixAPIError"]
+from .batch import BitrixBatch
+from .cache import CachedBitrixClient
+from .client import BitrixAPIError, BitrixClient, BitrixThrottledError
+from .models import Event, Task, User, normalize_events, normalize_tasks, parse_datetime
+from .ratelimit import shared_limiter
+
+__all__ = [
+    "BitrixClient",
+    "BitrixAPIError",
+    "BitrixThrottledError",
+    "BitrixBatch",
+    "CachedBitrixClient",
+    "TTLCache",
+    "Task",
+    "Event",
+    "User",
+    "normalize_tasks",
+    "normalize_events",
+    "parse_datetime",
+    "TokenBucket",
+    "shared_limiter",
+]
@@ -0,0 +1,105 @@
+import asyncio
+import contextvars
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+from urllib.parse import quote
+
+if TYPE_CHECKING:
+    from .client import BitrixClient
+
+MAX_BATCH_COMMANDS = 50
+
+_current_batch: contextvars.ContextVar[Optional["BitrixBatch"]] = contextvars.ContextVar(
+    "bitrix_current_batch", default=None
+)
+
+
+def build_query(params: Any, prefix: Optional[str] = None) -> str:
+    """PHP-style http_build_query: Bitrix batch commands are `method?query`."""
+    if isinstance(params, dict):
+        items = params.items()
+    elif isinstance(params, (list, tuple)):
+        items = enumerate(params)
+    else:
+        return f"{quote(prefix or '', safe='[]')}={quote(_scalar(params), safe='')}"
+
+    parts = []
+    for key, value in items:
+        name = f"{prefix}[{key}]" if prefix is not None else str(key)
+        if isinstance(value, (dict, list, tuple)):
+            if value:
+                parts.append(build_query(value, name))
+        elif value is not None:
+            parts.append(f"{quote(name, safe='[]')}={quote(_scalar(value), safe='')}")
+    return "&".join(parts)
+
+
+def _scalar(value: Any) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return str(value)
+
+
+@dataclass
+class BatchCall:
+    method: str
+    params: Dict[str, Any]
+    future: asyncio.Future
+    attempts: int = 0
+
+
+def current_batch() -> Optional["BitrixBatch"]:
+    batch = _current_batch.get()
+    if batch is None or batch.closed:
+        return None
+    return batch
+
+
+class BitrixBatch:
+    """Explicit coalescing scope.
+
+    Calls made inside `async with client.batch():` (including from tasks created
+    inside the scope) are queued and sent as `batch` requests when the scope exits
+    or when a full batch of 50 commands has accumulated. Callers therefore spawn
+    tasks inside the scope and await them after it.
+    """
+
+    def __init__(self, client: "BitrixClient", settle_ticks: int = 3) -> None:
+        self._client = client
+        self._settle_ticks = settle_ticks
+        self._calls: List[BatchCall] = []
+        self._inflight: List[asyncio.Task] = []
+        self._token: Optional[contextvars.Token] = None
+        self.closed = False
+
+    async def __aenter__(self) -> "BitrixBatch":
+        self._token = _current_batch.set(self)
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        # Даём задачам, созданным внутри scope, дойти до своих вызовов Bitrix.
+        quiet = 0
+        seen = len(self._calls)
+        while quiet < self._settle_ticks:
+            await asyncio.sleep(0)
+            if len(self._calls) == seen:
+                quiet += 1
+            else:
+                seen = len(self._calls)
+                quiet = 0
+        self.closed = True
+        if self._token is not None:
+            _current_batch.reset(self._token)
+        calls, self._calls = self._calls, []
+        if calls:
+            await self._client._dispatch(calls)
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    def add(self, method: str, params: Dict[str, Any]) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._calls.append(BatchCall(method, params, future))
+        if len(self._calls) >= MAX_BATCH_COMMANDS:
+            calls, self._calls = self._calls, []
+            self._inflight.append(asyncio.ensure_future(self._client._dispatch(calls)))
+        return future
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from packages.common import MISSING, TTLCache
+
+from .client import BitrixClient
+
+logger = logging.getLogger(__name__)
+
+# TTL в секундах по методам; методы без TTL не кэшируются
+DEFAULT_TTLS: Dict[str, float] = {
+    "find_user_by_email": 600.0,
+    "list_users": 300.0,
+    "list_tasks": 30.0,
+    "list_events": 30.0,
+}
+DEFAULT_NEGATIVE_TTL = 60.0
+
+
+class CachedBitrixClient:
+    """Read-through cache in front of BitrixClient.
+
+    Concurrent identical reads share one in-flight call (single-flight), a `None`
+    from `find_user_by_email` is cached for `negative_ttl`, and anything that is
+    not a cached read method (`send_im_notify`, `batch`, `aclose`, ...) goes
+    straight to the wrapped client.
+    """
+
+    def __init__(
+        self,
+        client: BitrixClient,
+        ttls: Optional[Dict[str, float]] = None,
+        negative_ttl: float = DEFAULT_NEGATIVE_TTL,
+        max_entries: int = 1024,
+    ) -> None:
+        self._client = client
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.negative_ttl = negative_ttl
+        self._cache = TTLCache(max_entries)
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+    async def _cached(self, method: str, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        value = self._cache.get(key)
+        if value is not MISSING:
+            self.hits += 1
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.shared += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        future = asyncio.ensure_future(loader())
+        self._inflight[key] = future
+        try:
+            value = await asyncio.shield(future)
+        finally:
+            self._inflight.pop(key, None)
+        ttl = self.ttls[method] if value is not None else self.negative_ttl
+        self._cache.set(key, value, ttl)
+        return value
+
+    async def find_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        key = ("find_user_by_email", email.strip().lower())
+        return await self._cached(key[0], key, lambda: self._client.find_user_by_email(email))
+
+    async def list_users(self, filters: Optional[Dict[str, Any]] = None):
+        key = ("list_users", repr(sorted((filters or {}).items())))
+        return await self._cached(key[0], key, lambda: self._client.list_users(filters))
+
+    async def list_tasks(self, responsible_id: int, deadline_from=None, deadline_to=None, **filters):
+        key = ("list_tasks", responsible_id, deadline_from, deadline_to, tuple(sorted(filters.items())))
+        return await self._cached(
+            key[0], key, lambda: self._client.list_tasks(responsible_id, deadline_from, deadline_to, **filters)
+        )
+
+    async def list_events(self, user_id: int, date_from, date_to):
+        key = ("list_events", user_id, date_from, date_to)
+        return await self._cached(key[0], key, lambda: self._client.list_events(user_id, date_from, date_to))
+
+    def invalidate(self, method: Optional[str] = None) -> None:
+        self._cache.invalidate(method)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared_inflight": self.shared,
+            "entries": len(self._cache),
+        }
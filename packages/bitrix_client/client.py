@@ -1,17 +1,54 @@
 import asyncio
 import logging
+import random
+import time
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Union
+from urllib.parse import urlsplit
 
 import httpx
 
+from packages.common import TokenBucket
+from packages.metrics import REGISTRY, SIZE_BUCKETS
+
+from .batch import MAX_BATCH_COMMANDS, BatchCall, BitrixBatch, build_query, current_batch
+from .ratelimit import shared_limiter
+
 logger = logging.getLogger(__name__)
 
+PAGE_SIZE = 50  # фиксированный размер страницы list-методов Bitrix
+
+COMPLETED_STATUS = 5
+
+TASK_FIELDS = [
+    "ID",
+    "TITLE",
+    "STATUS",
+    "DEADLINE",
+    "RESPONSIBLE_ID",
+    "CREATED_DATE",
+    "CHANGED_DATE",
+]
+
+
+THROTTLE_ERRORS = {"QUERY_LIMIT_EXCEEDED"}
+
+REQUEST_SECONDS = REGISTRY.histogram("bitrix_request_seconds", "Bitrix REST call latency per HTTP attempt", ["method"])
+REQUEST_ERRORS = REGISTRY.counter("bitrix_request_errors_total", "Failed Bitrix REST attempts", ["method", "error"])
+REQUEST_RETRIES = REGISTRY.counter("bitrix_request_retries_total", "Retried Bitrix REST attempts", ["method"])
+PAYLOAD_BYTES = REGISTRY.histogram(
+    "bitrix_payload_bytes", "Bitrix request/response body size", ["method", "direction"], buckets=SIZE_BUCKETS
+)
+
 
 class BitrixAPIError(Exception):
     pass
 
 
+class BitrixThrottledError(BitrixAPIError):
+    pass
+
+
 class BitrixClient:
     def __init__(
         self,
@@ -19,75 +56,309 @@ class BitrixClient:
         timeout: float = 10.0,
         max_retries: int = 3,
         backoff_factor: float = 1.5,
+        http2: bool = False,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+        coalesce: bool = True,
+        page_concurrency: int = 4,
+        rate_limit: float = 2.0,
+        burst: int = 5,
+        limiter: Optional[TokenBucket] = None,
     ) -> None:
         self.webhook_url = webhook_url.rstrip("/")
         self.timeout = timeout
         self.max_retries = max_retries
         self.backoff_factor = backoff_factor
+        self.http2 = http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._http: Optional[httpx.AsyncClient] = None
+        self.coalesce = coalesce
+        self.page_concurrency = page_concurrency
+        self.limiter = limiter or shared_limiter(urlsplit(self.webhook_url).netloc, rate=rate_limit, burst=burst)
+        self._pending: List[BatchCall] = []
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "BitrixClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    def _client(self) -> httpx.AsyncClient:
+        # Пул создаётся лениво: так он привязывается к уже запущенному event loop,
+        # а после aclose() прозрачно пересоздаётся.
+        if self._http is None or self._http.is_closed:
+            http2 = self.http2
+            if http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    logger.warning("HTTP/2 requested but 'h2' is not installed, falling back to HTTP/1.1")
+                    http2 = False
+            self._http = httpx.AsyncClient(timeout=self.timeout, limits=self.limits, http2=http2)
+        return self._http
+
+    async def aclose(self) -> None:
+        if self._http is not None and not self._http.is_closed:
+            await self._http.aclose()
+        self._http = None
 
     async def _post(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
         url = f"{self.webhook_url}/{method}"
         attempt = 0
         while True:
             try:
-                async with httpx.AsyncClient(timeout=self.timeout) as client:
-                    response = await client.post(url, json=params)
+                await self.limiter.acquire()
+                started = time.perf_counter()
+                try:
+                    response = await self._client().post(url, json=params)
+                finally:
+                    REQUEST_SECONDS.observe(time.perf_counter() - started, method)
+                PAYLOAD_BYTES.observe(len(response.request.content), method, "request")
+                PAYLOAD_BYTES.observe(len(response.content), method, "response")
+                if response.status_code == 503:
+                    raise BitrixThrottledError(f"HTTP 503 for {method}")
                 data = response.json()
                 if "error" in data:
-                    raise BitrixAPIError(f"{data.get('error')}: {data.get('error_description')}")
+                    error_cls = BitrixThrottledError if data["error"] in THROTTLE_ERRORS else BitrixAPIError
+                    raise error_cls(f"{data.get('error')}: {data.get('error_description')}")
+                self.limiter.success()
                 return data
             except (httpx.HTTPError, BitrixAPIError) as err:
                 attempt += 1
+                REQUEST_ERRORS.inc(method, type(err).__name__)
+                if isinstance(err, BitrixThrottledError):
+                    self.limiter.throttle()
                 if attempt > self.max_retries:
                     logger.error("Bitrix request failed permanently: %s", err)
                     raise
-                sleep_for = self.backoff_factor**attempt
-                logger.warning("Bitrix request failed (attempt %s), retry in %.2fs", attempt, sleep_for)
+                if isinstance(err, BitrixThrottledError):
+                    # темп задаёт лимитер, здесь только небольшой разброс
+                    sleep_for = random.uniform(0, 1.0 / self.limiter.rate)
+                else:
+                    base = self.backoff_factor**attempt
+                    sleep_for = base / 2 + random.uniform(0, base / 2)
+                logger.warning(
+                    "Bitrix request failed (attempt %s), retry in %.2fs (rate %.2f/s, queue %s)",
+                    attempt,
+                    sleep_for,
+                    self.limiter.rate,
+                    self.limiter.queue_depth,
+                )
+                REQUEST_RETRIES.inc(method)
                 await asyncio.sleep(sleep_for)
 
+    def batch(self) -> BitrixBatch:
+        return BitrixBatch(self)
+
+    async def _call(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        batch = current_batch()
+        if batch is not None:
+            return await batch.add(method, params)
+        if not self.coalesce:
+            return await self._post(method, params)
+        # Вызовы, сделанные в одном тике event loop, уходят одним batch-запросом.
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(BatchCall(method, params, future))
+        if self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush_pending())
+        return await future
+
+    async def _flush_pending(self) -> None:
+        await asyncio.sleep(0)
+        calls, self._pending = self._pending, []
+        self._flush_task = None
+        await self._dispatch(calls)
+
+    async def _dispatch(self, calls: List[BatchCall]) -> None:
+        chunks = [calls[i : i + MAX_BATCH_COMMANDS] for i in range(0, len(calls), MAX_BATCH_COMMANDS)]
+        await asyncio.gather(*(self._send_chunk(chunk) for chunk in chunks))
+
+    async def _send_chunk(self, calls: List[BatchCall]) -> None:
+        if len(calls) == 1:
+            call = calls[0]
+            try:
+                _resolve(call, await self._post(call.method, call.params))
+            except Exception as err:  # noqa: BLE001
+                _reject(call, err)
+            return
+
+        commands = {f"c{i}": f"{call.method}?{build_query(call.params)}" for i, call in enumerate(calls)}
+        try:
+            data = await self._post("batch", {"halt": 0, "cmd": commands})
+        except Exception as err:  # noqa: BLE001
+            for call in calls:
+                _reject(call, err)
+            return
+
+        payload = data.get("result") or {}
+        results = _as_dict(payload.get("result"))
+        errors = _as_dict(payload.get("result_error"))
+        totals = _as_dict(payload.get("result_total"))
+        nexts = _as_dict(payload.get("result_next"))
+        throttled: List[BatchCall] = []
+        for key, call in zip(commands, calls):
+            if key in errors:
+                error = errors[key] or {}
+                if error.get("error") in THROTTLE_ERRORS:
+                    REQUEST_ERRORS.inc(call.method, BitrixThrottledError.__name__)
+                    call.attempts += 1
+                    if call.attempts <= self.max_retries:
+                        throttled.append(call)
+                        continue
+                    error_cls = BitrixThrottledError
+                else:
+                    error_cls = BitrixAPIError
+                _reject(call, error_cls(f"{error.get('error')}: {error.get('error_description')}"))
+                continue
+            item: Dict[str, Any] = {"result": results.get(key)}
+            if key in totals:
+                item["total"] = totals[key]
+            if key in nexts:
+                item["next"] = nexts[key]
+            _resolve(call, item)
+        if throttled:
+            await self._requeue(throttled)
+
+    async def _requeue(self, calls: List[BatchCall]) -> None:
+        """Throttled sub-calls of a batch go back to the queue and leave with the next chunk."""
+        self.limiter.throttle()
+        # как в _post: темп задаёт лимитер, здесь только небольшой разброс
+        sleep_for = random.uniform(0, 1.0 / self.limiter.rate)
+        logger.warning(
+            "%s batch sub-calls throttled, requeued in %.2fs (rate %.2f/s)", len(calls), sleep_for, self.limiter.rate
+        )
+        for call in calls:
+            REQUEST_RETRIES.inc(call.method)
+        await asyncio.sleep(sleep_for)
+        self._pending.extend(calls)
+        if self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush_pending())
+
+    async def _iter_pages(
+        self,
+        method: str,
+        params: Dict[str, Any],
+        extract: Callable[[Dict[str, Any]], List[Dict[str, Any]]],
+    ) -> AsyncIterator[Dict[str, Any]]:
+        first = await self._call(method, {**params, "start": 0})
+        for item in extract(first):
+            yield item
+
+        next_start = first.get("next")
+        total = first.get("total")
+        if next_start is None or total is None:
+            return
+
+        # Зная total, остальные страницы запрашиваем параллельно (с ограничением),
+        # а отдаём строго по порядку.
+        semaphore = asyncio.Semaphore(self.page_concurrency)
+
+        async def fetch(start: int) -> List[Dict[str, Any]]:
+            async with semaphore:
+                return extract(await self._call(method, {**params, "start": start}))
+
+        pages = [asyncio.ensure_future(fetch(start)) for start in range(int(next_start), int(total), PAGE_SIZE)]
+        try:
+            for page in pages:
+                for item in await page:
+                    yield item
+        finally:
+            for page in pages:
+                page.cancel()
+
     async def find_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
-        params = {"filter": {"EMAIL": email}, "select": ["ID", "EMAIL", "NAME", "LAST_NAME"]}  # user.get supports filter
-        result = await self._post("user.get", params)
+        params = {"filter": {"EMAIL": email}, "select": ["ID", "EMAIL", "NAME", "LAST_NAME", "ACTIVE"]}  # user.get supports filter
+        result = await self._call("user.get", params)
         users = result.get("result", [])
         return users[0] if users else None
 
+    def iter_users(self, filters: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+        params = {"filter": filters or {}, "select": ["ID", "EMAIL", "NAME", "LAST_NAME", "ACTIVE"]}
+        return self._iter_pages("user.get", params, lambda data: data.get("result") or [])
+
+    async def list_users(self, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return [user async for user in self.iter_users(filters)]
+
     async def send_im_notify(self, to_user_id: int, message: str) -> None:
         params = {"to": to_user_id, "message": message}
-        await self._post("im.notify", params)
+        await self._call("im.notify", params)
 
-    async def list_tasks(
+    def iter_tasks(
         self,
-        responsible_id: int,
+        responsible_id: Union[int, List[int]],
         deadline_from: Optional[datetime] = None,
         deadline_to: Optional[datetime] = None,
-    ) -> List[Dict[str, Any]]:
+        changed_since: Optional[datetime] = None,
+        open_only: bool = False,
+    ) -> AsyncIterator[Dict[str, Any]]:
         filters: Dict[str, Any] = {"RESPONSIBLE_ID": responsible_id}
         if deadline_from:
             filters[">=DEADLINE"] = deadline_from.isoformat()
         if deadline_to:
             filters["<=DEADLINE"] = deadline_to.isoformat()
-        params = {
-            "filter": filters,
-            "select": [
-                "ID",
-                "TITLE",
-                "STATUS",
-                "DEADLINE",
-                "RESPONSIBLE_ID",
-                "CREATED_DATE",
-                "CHANGED_DATE",
-            ],
-        }
-        result = await self._post("tasks.task.list", params)
-        tasks = result.get("result", {}).get("tasks", [])
-        return tasks
+        if changed_since:
+            filters[">CHANGED_DATE"] = changed_since.isoformat()
+        if open_only:
+            filters["!STATUS"] = COMPLETED_STATUS
+        params = {"filter": filters, "select": TASK_FIELDS}
+        return self._iter_pages("tasks.task.list", params, lambda data: (data.get("result") or {}).get("tasks") or [])
 
-    async def list_events(
+    async def list_tasks(
+        self,
+        responsible_id: int,
+        deadline_from: Optional[datetime] = None,
+        deadline_to: Optional[datetime] = None,
+        changed_since: Optional[datetime] = None,
+        open_only: bool = False,
+    ) -> List[Dict[str, Any]]:
+        iterator = self.iter_tasks(responsible_id, deadline_from, deadline_to, changed_since, open_only)
+        return [task async for task in iterator]
+
+    async def list_tasks_by_responsible(
+        self,
+        responsible_ids: Iterable[int],
+        deadline_from: Optional[datetime] = None,
+        deadline_to: Optional[datetime] = None,
+        open_only: bool = False,
+    ) -> Dict[int, List[Dict[str, Any]]]:
+        # RESPONSIBLE_ID принимает массив: один постраничный запрос на всю группу пользователей
+        ids = [int(i) for i in responsible_ids]
+        grouped: Dict[int, List[Dict[str, Any]]] = {i: [] for i in ids}
+        async for task in self.iter_tasks(ids, deadline_from, deadline_to, open_only=open_only):
+            grouped.setdefault(int(task["RESPONSIBLE_ID"]), []).append(task)
+        return grouped
+
+    async def get_task(self, task_id: int) -> Optional[Dict[str, Any]]:
+        try:
+            result = await self._call("tasks.task.get", {"taskId": task_id, "select": TASK_FIELDS})
+        except BitrixThrottledError:
+            raise
+        except BitrixAPIError:
+            # удалённая задача или нет доступа
+            return None
+        return (result.get("result") or {}).get("task") or None
+
+    async def get_event(self, event_id: int) -> Optional[Dict[str, Any]]:
+        try:
+            result = await self._call("calendar.event.getbyid", {"id": event_id})
+        except BitrixThrottledError:
+            raise
+        except BitrixAPIError:
+            return None
+        return result.get("result") or None
+
+    def iter_events(
         self,
         user_id: int,
         date_from: datetime,
         date_to: datetime,
-    ) -> List[Dict[str, Any]]:
+    ) -> AsyncIterator[Dict[str, Any]]:
         params = {
             "type": "user",
             "ownerId": user_id,
@@ -95,5 +366,27 @@ class BitrixClient:
             "to": date_to.isoformat(),
             "skipDeclined": "Y",
         }
-        result = await self._post("calendar.event.get", params)
-        return result.get("result", [])
+        return self._iter_pages("calendar.event.get", params, lambda data: data.get("result") or [])
+
+    async def list_events(
+        self,
+        user_id: int,
+        date_from: datetime,
+        date_to: datetime,
+    ) -> List[Dict[str, Any]]:
+        return [event async for event in self.iter_events(user_id, date_from, date_to)]
+
+
+def _as_dict(value: Any) -> Dict[str, Any]:
+    # PHP отдаёт пустой ассоциативный массив как [].
+    return value if isinstance(value, dict) else {}
+
+
+def _resolve(call: BatchCall, value: Dict[str, Any]) -> None:
+    if not call.future.done():
+        call.future.set_result(value)
+
+
+def _reject(call: BatchCall, err: Exception) -> None:
+    if not call.future.done():
+        call.future.set_exception(err)
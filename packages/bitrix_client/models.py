@@ -0,0 +1,150 @@
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+# смещения ("+03:00"), с которыми строка `YYYY-MM-DDTHH:MM:SS±HH:MM` уже совпадает с isoformat();
+# у портала их единицы, поэтому кэш не растёт
+_CANONICAL_OFFSETS: Set[str] = set()
+_OFFSET_RE = re.compile(r"[+-]\d\d:\d\d")
+
+
+def parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    """Bitrix/Postgres timestamp -> aware datetime (naive values are taken as UTC).
+
+    ISO 8601 (tasks.task.list, PostgREST) is parsed by the C `fromisoformat`;
+    only the portal format of calendar dates falls back to dateutil.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        # dateutil (~15 мс импорта) не нужен холодному старту, пока не пришли даты в формате портала
+        from dateutil import parser
+
+        try:
+            parsed = parser.isoparse(value)
+        except ValueError:
+            # календарь отдаёт даты в формате портала: 13.01.2026 10:00:00
+            parsed = parser.parse(value, dayfirst=True)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def iso_text(value: Optional[str]) -> Optional[str]:
+    """`parse_datetime(value).isoformat()`, returning `value` itself when it is already in that form."""
+    if not value:
+        return None
+    canonical = len(value) == 25 and value[10] == "T"
+    if canonical and value[19:] in _CANONICAL_OFFSETS:
+        return value
+    text = parse_datetime(value).isoformat()
+    if canonical and text == value and _OFFSET_RE.fullmatch(value[19:]):
+        _CANONICAL_OFFSETS.add(value[19:])
+    return text
+
+
+@dataclass(slots=True)
+class Task:
+    """tasks.task.list item; timestamps are kept as canonical ISO text (see `iso_text`)."""
+
+    id: int
+    title: str
+    status: str
+    responsible_id: Optional[int]
+    deadline: Optional[str]
+    updated_at: Optional[str]
+    raw: Dict[str, Any] = field(repr=False)
+
+    @classmethod
+    def from_bitrix(cls, item: Dict[str, Any]) -> "Task":
+        get = item.get
+        responsible_id = get("RESPONSIBLE_ID")
+        return cls(
+            int(item["ID"]),
+            item["TITLE"],
+            item["STATUS"],
+            int(responsible_id) if responsible_id else None,
+            iso_text(get("DEADLINE")),
+            iso_text(get("CHANGED_DATE") or get("CREATED_DATE")),
+            item,
+        )
+
+    def row(self, bitrix_user_id: Optional[int] = None) -> Dict[str, Any]:
+        """tasks_cache row; the Bitrix payload is referenced, not copied."""
+        return {
+            "bitrix_task_id": self.id,
+            "bitrix_user_id": self.responsible_id if bitrix_user_id is None else bitrix_user_id,
+            "title": self.title,
+            "status": self.status,
+            "deadline": self.deadline,
+            "updated_at": self.updated_at,
+            "raw_payload": self.raw,
+        }
+
+
+@dataclass(slots=True)
+class Event:
+    """calendar.event.get item; timestamps are kept as canonical ISO text (see `iso_text`)."""
+
+    id: int
+    title: str
+    start_at: Optional[str]
+    end_at: Optional[str]
+    updated_at: Optional[str]
+    raw: Dict[str, Any] = field(repr=False)
+
+    @classmethod
+    def from_bitrix(cls, ev: Dict[str, Any]) -> "Event":
+        get = ev.get
+        return cls(
+            int(ev["ID"]),
+            get("NAME") or get("TITLE") or "Событие",
+            iso_text(get("DATE_FROM")),
+            iso_text(get("DATE_TO")),
+            iso_text(get("TIMESTAMP_X") or get("DATE_CREATE")),
+            ev,
+        )
+
+    def row(self, bitrix_user_id: int) -> Dict[str, Any]:
+        """events_cache row; the Bitrix payload is referenced, not copied."""
+        return {
+            "bitrix_event_id": self.id,
+            "bitrix_user_id": bitrix_user_id,
+            "title": self.title,
+            "start_at": self.start_at,
+            "end_at": self.end_at,
+            "updated_at": self.updated_at,
+            "raw_payload": self.raw,
+        }
+
+
+
+@dataclass(slots=True)
+class User:
+    id: int
+    email: Optional[str]
+    name: str
+    active: bool
+
+    @classmethod
+    def from_bitrix(cls, item: Dict[str, Any]) -> "User":
+        name = " ".join(part for part in (item.get("NAME"), item.get("LAST_NAME")) if part)
+        return cls(int(item["ID"]), item.get("EMAIL"), name, item.get("ACTIVE", True) not in (False, "N"))
+
+def normalize_tasks(items: Iterable[Dict[str, Any]], bitrix_user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Bitrix tasks -> upsert-ready tasks_cache rows in one pass.
+
+    Without `bitrix_user_id` each row is attributed to the task's
+    RESPONSIBLE_ID, so a bulk query over several users is normalized at once.
+    """
+    from_bitrix = Task.from_bitrix
+    return [from_bitrix(item).row(bitrix_user_id) for item in items]
+
+
+def normalize_events(items: Iterable[Dict[str, Any]], bitrix_user_id: int) -> List[Dict[str, Any]]:
+    """Bitrix calendar events of one user -> events_cache rows ordered by start."""
+    from_bitrix = Event.from_bitrix
+    rows = [from_bitrix(ev).row(bitrix_user_id) for ev in items]
+    rows.sort(key=lambda row: row["start_at"] or "")
+    return rows
@@ -0,0 +1,17 @@
+import threading
+from typing import Dict, Optional
+
+from packages.common import TokenBucket
+
+_shared: Dict[str, TokenBucket] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_limiter(key: str, rate: float = 2.0, burst: int = 5) -> TokenBucket:
+    """Process-wide bucket per portal: all BitrixClient instances for one webhook share it."""
+    with _shared_lock:
+        bucket: Optional[TokenBucket] = _shared.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rate=rate, burst=burst)
+            _shared[key] = bucket
+        return bucket
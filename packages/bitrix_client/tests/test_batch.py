@@ -0,0 +1,94 @@
+import asyncio
+
+from packages.bitrix_client import BitrixAPIError, BitrixClient, BitrixThrottledError
+from packages.bitrix_client.batch import build_query
+
+
+class FakeBitrix(BitrixClient):
+    def __init__(self):
+        super().__init__("https://example.bitrix24.ru/rest/1/token")
+        self.posts = []
+
+    async def _post(self, method, params):
+        self.posts.append((method, params))
+        if method != "batch":
+            return {"result": [{"ID": "7"}]}
+        cmd = params["cmd"]
+        return {
+            "result": {
+                "result": {key: {"tasks": [{"ID": key}]} for key in cmd if key != "c1"},
+                "result_error": {"c1": {"error": "ACCESS_DENIED", "error_description": "nope"}},
+                "result_total": {key: 1 for key in cmd},
+            }
+        }
+
+
+def test_build_query_encodes_nested_params_php_style():
+    query = build_query({"filter": {">=DEADLINE": "2026-01-13T00:00:00+03:00"}, "select": ["ID", "TITLE"]})
+    assert query == "filter[%3E%3DDEADLINE]=2026-01-13T00%3A00%3A00%2B03%3A00&select[0]=ID&select[1]=TITLE"
+
+
+def test_calls_in_same_tick_are_coalesced_and_errors_split_back():
+    async def scenario():
+        client = FakeBitrix()
+        results = await asyncio.gather(
+            client.list_tasks(responsible_id=1),
+            client.list_tasks(responsible_id=2),
+            client.list_tasks(responsible_id=3),
+            return_exceptions=True,
+        )
+        return client, results
+
+    client, results = asyncio.run(scenario())
+    assert [method for method, _ in client.posts] == ["batch"]
+    assert results[0] == [{"ID": "c0"}]
+    assert isinstance(results[1], BitrixAPIError)
+    assert results[2] == [{"ID": "c2"}]
+
+
+def test_explicit_batch_scope_collects_across_tasks():
+    async def scenario():
+        client = FakeBitrix()
+        async with client.batch():
+            jobs = [asyncio.ensure_future(client.find_user_by_email(f"{i}@example.com")) for i in range(120)]
+        await asyncio.gather(*jobs, return_exceptions=True)
+        return client
+
+    client = asyncio.run(scenario())
+    sizes = [len(params["cmd"]) for method, params in client.posts]
+    assert sizes == [50, 50, 20]
+
+
+class ThrottledBitrix(FakeBitrix):
+    def __init__(self, throttled_posts):
+        super().__init__()
+        self.throttled_posts = throttled_posts
+
+    async def _post(self, method, params):
+        self.posts.append((method, params))
+        keys = list(params["cmd"]) if method == "batch" else []
+        limited = keys[1:] if len(self.posts) <= self.throttled_posts else []
+        return {
+            "result": {
+                "result": {key: {"tasks": [{"ID": key}]} for key in keys if key not in limited},
+                "result_error": {key: {"error": "QUERY_LIMIT_EXCEEDED", "error_description": "slow down"} for key in limited},
+            }
+        }
+
+
+def test_throttled_batch_sub_calls_are_requeued_then_rejected():
+    async def scenario(client):
+        results = await asyncio.gather(*(client.list_tasks(responsible_id=i) for i in range(3)), return_exceptions=True)
+        return [len(params["cmd"]) for _, params in client.posts], results
+
+    sizes, results = asyncio.run(scenario(ThrottledBitrix(throttled_posts=1)))
+    # два вызова из трёх упёрлись в лимит и ушли следующим batch
+    assert sizes == [3, 2]
+    assert results == [[{"ID": "c0"}], [{"ID": "c0"}], [{"ID": "c1"}]]
+
+    client = ThrottledBitrix(throttled_posts=100)
+    client.max_retries = 1
+    sizes, results = asyncio.run(scenario(client))
+    # повтор исчерпан — вызов отклоняется, как одиночный запрос после max_retries
+    assert sizes == [3, 2]
+    assert results[1] == [{"ID": "c0"}] and isinstance(results[2], BitrixThrottledError)
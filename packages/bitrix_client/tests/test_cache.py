@@ -0,0 +1,47 @@
+import asyncio
+
+from packages.bitrix_client import CachedBitrixClient
+
+
+class CountingBitrix:
+    def __init__(self):
+        self.calls = 0
+        self.sent = []
+
+    async def find_user_by_email(self, email):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return {"ID": "1"} if email == "known@example.com" else None
+
+    async def send_im_notify(self, to_user_id, message):
+        self.sent.append((to_user_id, message))
+
+
+def test_concurrent_lookups_share_one_call_and_then_hit_cache():
+    inner = CountingBitrix()
+    client = CachedBitrixClient(inner)
+
+    async def scenario():
+        first = await asyncio.gather(*(client.find_user_by_email("known@example.com") for _ in range(5)))
+        again = await client.find_user_by_email("Known@example.com")
+        return first, again
+
+    first, again = asyncio.run(scenario())
+    assert inner.calls == 1
+    assert all(user == {"ID": "1"} for user in first) and again == {"ID": "1"}
+    assert client.stats()["hits"] == 1 and client.stats()["shared_inflight"] == 4
+
+
+def test_not_found_is_negatively_cached_and_writes_bypass_cache():
+    inner = CountingBitrix()
+    client = CachedBitrixClient(inner)
+
+    async def scenario():
+        await client.find_user_by_email("ghost@example.com")
+        await client.find_user_by_email("ghost@example.com")
+        await client.send_im_notify(1, "a")
+        await client.send_im_notify(1, "a")
+
+    asyncio.run(scenario())
+    assert inner.calls == 1
+    assert len(inner.sent) == 2
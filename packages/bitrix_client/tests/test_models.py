@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta, timezone
+
+from packages.bitrix_client import Event, Task, User, normalize_events, normalize_tasks, parse_datetime
+from packages.bitrix_client.models import iso_text
+
+
+def test_parse_datetime_fast_path_matches_dateutil():
+    from dateutil import parser
+
+    for value in (
+        "2026-01-13T18:00:00+03:00",
+        "2026-01-13T18:00:00-05:30",
+        "2026-01-13T18:00:00Z",
+        "2026-01-13 18:00:00+00:00",
+        "2026-01-13T18:00:00.123456+00:00",
+        "2026-01-13",
+    ):
+        expected = parser.isoparse(value)
+        expected = expected if expected.tzinfo else expected.replace(tzinfo=timezone.utc)
+        assert parse_datetime(value) == expected
+        assert parse_datetime(value).isoformat() == expected.isoformat()
+
+    # строка в каноническом виде переиспользуется, остальные приводятся к isoformat()
+    value = "2026-02-01T09:00:00+03:00"
+    assert iso_text("2026-01-13T18:00:00+03:00") == "2026-01-13T18:00:00+03:00"
+    # смещение уже встречалось — строка отдаётся без разбора
+    assert iso_text(value) is value
+    assert iso_text("2026-01-13T18:00:00Z") == "2026-01-13T18:00:00+00:00"
+    assert iso_text("2026-01-13T18:00:00-00:00") == "2026-01-13T18:00:00+00:00"
+    assert parse_datetime("2026-01-13T18:00:00") == datetime(2026, 1, 13, 18, tzinfo=timezone.utc)
+    assert parse_datetime("13.01.2026 10:00:00") == datetime(2026, 1, 13, 10, tzinfo=timezone.utc)
+    assert parse_datetime(None) is None and parse_datetime("") is None
+
+
+def test_normalize_tasks_builds_cache_rows_without_copying_payload():
+    items = [
+        {"ID": "2", "TITLE": "B", "STATUS": "2", "RESPONSIBLE_ID": "7", "DEADLINE": "2026-01-13T18:00:00+03:00",
+         "CREATED_DATE": "2026-01-10T09:00:00+03:00"},
+        {"ID": "1", "TITLE": "A", "STATUS": "3", "RESPONSIBLE_ID": "8", "DEADLINE": None,
+         "CHANGED_DATE": "2026-01-12T09:00:00+03:00"},
+    ]
+    rows = normalize_tasks(items)
+
+    assert rows[0] == {
+        "bitrix_task_id": 2,
+        "bitrix_user_id": 7,
+        "title": "B",
+        "status": "2",
+        "deadline": "2026-01-13T18:00:00+03:00",
+        "updated_at": "2026-01-10T09:00:00+03:00",
+        "raw_payload": items[0],
+    }
+    assert rows[0]["raw_payload"] is items[0]
+    assert rows[1]["deadline"] is None and rows[1]["bitrix_user_id"] == 8
+    assert normalize_tasks(items, 42)[1]["bitrix_user_id"] == 42
+    task = Task.from_bitrix(items[0])
+    assert task.deadline == "2026-01-13T18:00:00+03:00" and task.responsible_id == 7
+    assert not hasattr(task, "__dict__")
+
+
+def test_normalize_events_sorts_by_start():
+    events = [
+        {"ID": "5", "NAME": "Late", "DATE_FROM": "13.01.2026 15:00:00", "DATE_TO": "13.01.2026 16:00:00"},
+        {"ID": "4", "DATE_FROM": "2026-01-13T09:00:00+00:00", "TIMESTAMP_X": "2026-01-12T09:00:00+00:00"},
+    ]
+    rows = normalize_events(events, 7)
+
+    assert [row["bitrix_event_id"] for row in rows] == [4, 5]
+    assert Event.from_bitrix(events[0]).row(7) == rows[1]
+    assert rows[0]["title"] == "Событие" and rows[0]["updated_at"] == "2026-01-12T09:00:00+00:00"
+    assert rows[1]["start_at"] == (datetime(2026, 1, 13, 15, tzinfo=timezone.utc)).isoformat()
+    assert parse_datetime(rows[1]["end_at"]) - parse_datetime(rows[1]["start_at"]) == timedelta(hours=1)
+
+
+
+def test_user_from_bitrix():
+    user = User.from_bitrix({"ID": "7", "EMAIL": "a@b.c", "NAME": "Ivan", "LAST_NAME": "Petrov", "ACTIVE": False})
+    assert (user.id, user.email, user.name, user.active) == (7, "a@b.c", "Ivan Petrov", False)
+    assert User.from_bitrix({"ID": "8", "NAME": "Anna"}).active
@@ -0,0 +1,33 @@
+import asyncio
+
+from packages.bitrix_client import BitrixClient
+
+
+class PagedBitrix(BitrixClient):
+    def __init__(self, total):
+        super().__init__("https://example.bitrix24.ru/rest/1/token", coalesce=False, page_concurrency=2)
+        self.total = total
+        self.starts = []
+
+    async def _post(self, method, params):
+        start = params["start"]
+        self.starts.append(start)
+        tasks = [{"ID": str(i)} for i in range(start, min(start + 50, self.total))]
+        data = {"result": {"tasks": tasks}, "total": self.total}
+        if start + 50 < self.total:
+            data["next"] = start + 50
+        return data
+
+
+def test_list_tasks_collects_every_page_in_order():
+    client = PagedBitrix(total=173)
+    tasks = asyncio.run(client.list_tasks(responsible_id=1))
+    assert [int(t["ID"]) for t in tasks] == list(range(173))
+    assert sorted(client.starts) == [0, 50, 100, 150]
+
+
+def test_single_page_makes_one_request():
+    client = PagedBitrix(total=12)
+    tasks = asyncio.run(client.list_tasks(responsible_id=1))
+    assert len(tasks) == 12
+    assert client.starts == [0]
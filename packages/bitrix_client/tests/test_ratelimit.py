@@ -0,0 +1,6 @@
+from packages.bitrix_client import shared_limiter
+
+
+def test_shared_limiter_is_per_portal():
+    assert shared_limiter("a.bitrix24.ru") is shared_limiter("a.bitrix24.ru")
+    assert shared_limiter("a.bitrix24.ru") is not shared_limiter("b.bitrix24.ru")
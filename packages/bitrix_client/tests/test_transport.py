@@ -0,0 +1,59 @@
+import asyncio
+
+import httpx
+
+from packages.bitrix_client import BitrixClient, TokenBucket
+
+
+def _mock_pool(monkeypatch):
+    """Routes lazily created pools to a MockTransport; returns (created pools, seen requests)."""
+    created, seen = [], []
+    real_client = httpx.AsyncClient
+
+    def handler(request):
+        seen.append(request.url.path)
+        return httpx.Response(200, json={"result": {"task": {"ID": "1"}}})
+
+    def factory(**kwargs):
+        pool = real_client(transport=httpx.MockTransport(handler), **kwargs)
+        created.append(pool)
+        return pool
+
+    monkeypatch.setattr(httpx, "AsyncClient", factory)
+    return created, seen
+
+
+def _client():
+    limiter = TokenBucket(rate=1e6, burst=10**6)
+    return BitrixClient("https://example.bitrix24.ru/rest/1/token", max_retries=0, limiter=limiter, coalesce=False)
+
+
+def test_calls_share_one_lazy_pool_and_aclose_resets_it(monkeypatch):
+    created, seen = _mock_pool(monkeypatch)
+
+    async def scenario():
+        client = _client()
+        assert client._http is None
+        await client.get_task(1)
+        await client.get_task(2)
+        pool = client._http
+        await client.aclose()
+        return client, pool
+
+    client, pool = asyncio.run(scenario())
+    assert seen == ["/rest/1/token/tasks.task.get"] * 2
+    assert created == [pool]
+    assert pool.is_closed and client._http is None
+
+
+def test_context_manager_closes_pool(monkeypatch):
+    created, _ = _mock_pool(monkeypatch)
+
+    async def scenario():
+        async with _client() as client:
+            await client.get_task(1)
+        return client
+
+    client = asyncio.run(scenario())
+    assert len(created) == 1 and created[0].is_closed
+    assert client._http is None
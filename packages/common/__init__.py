@@ -0,0 +1,4 @@
+from .ratelimit import TokenBucket
+from .ttl_cache import MISSING, TTLCache
+
+__all__ = ["TokenBucket", "TTLCache", "MISSING"]
@@ -0,0 +1,89 @@
+import asyncio
+import random
+import time
+from typing import Dict
+
+
+class TokenBucket:
+    """Async token bucket with AIMD rate adaptation.
+
+    Lock-free for asyncio: every `acquire()` reserves a token immediately and the
+    bucket may go negative; the deficit divided by the rate is how long the caller
+    sleeps. Waiters are therefore served in arrival order and the bucket is not
+    bound to a particular event loop.
+    """
+
+    def __init__(
+        self,
+        rate: float = 2.0,
+        burst: int = 5,
+        min_rate: float = 0.25,
+        recovery_step: float = 0.05,
+        jitter: float = 0.1,
+    ) -> None:
+        self.max_rate = rate
+        self.burst = burst
+        self.min_rate = min(min_rate, rate)
+        self.recovery_step = recovery_step
+        self.jitter = jitter
+        self._rate = rate
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._last_throttle = 0.0
+        self._waiting = 0
+        self.throttle_events = 0
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    @property
+    def queue_depth(self) -> int:
+        return self._waiting
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def _reserve(self) -> float:
+        self._refill(time.monotonic())
+        self._tokens -= 1
+        if self._tokens >= 0:
+            return 0.0
+        return -self._tokens / self._rate
+
+    async def acquire(self) -> None:
+        delay = self._reserve()
+        if delay <= 0:
+            return
+        # джиттер разводит ожидающих, чтобы они не просыпались одной пачкой
+        delay += random.uniform(0, self.jitter * delay)
+        self._waiting += 1
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self._waiting -= 1
+
+    def throttle(self) -> None:
+        now = time.monotonic()
+        self._refill(now)
+        # Одна волна ошибок от параллельных запросов — это один сигнал, а не десять.
+        if now - self._last_throttle < 1.0 / self._rate:
+            return
+        self._last_throttle = now
+        self.throttle_events += 1
+        self._rate = max(self.min_rate, self._rate / 2)
+        self._tokens = min(self._tokens, 0.0)
+
+    def success(self) -> None:
+        if self._rate < self.max_rate:
+            self._refill(time.monotonic())
+            self._rate = min(self.max_rate, self._rate + self.max_rate * self.recovery_step)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "rate": round(self._rate, 3),
+            "max_rate": self.max_rate,
+            "queue_depth": self._waiting,
+            "throttle_events": self.throttle_events,
+        }
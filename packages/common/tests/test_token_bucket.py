@@ -0,0 +1,29 @@
+import asyncio
+import time
+
+from packages.common import TokenBucket
+
+
+def test_acquire_paces_to_rate_after_burst():
+    bucket = TokenBucket(rate=50.0, burst=2, jitter=0.0)
+
+    async def scenario():
+        started = time.monotonic()
+        await asyncio.gather(*(bucket.acquire() for _ in range(7)))
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(scenario())
+    # 2 токена сразу, ещё 5 по 20 мс
+    assert 0.09 <= elapsed < 0.5
+    assert bucket.queue_depth == 0
+
+
+def test_throttle_shrinks_rate_and_success_recovers():
+    bucket = TokenBucket(rate=2.0, burst=5, min_rate=0.25)
+    bucket.throttle()
+    bucket.throttle()  # same wave of errors, ignored
+    assert bucket.rate == 1.0
+    assert bucket.throttle_events == 1
+    for _ in range(100):
+        bucket.success()
+    assert bucket.rate == 2.0
@@ -0,0 +1,20 @@
+import time
+
+from packages.common import MISSING, TTLCache
+
+
+def test_entries_expire_and_lru_is_bounded():
+    cache = TTLCache(max_entries=2)
+    cache.set(("a", 1), None, ttl=60)
+    cache.set(("a", 2), "two", ttl=0.01)
+    # None — закэшированное значение, а не промах
+    assert cache.get(("a", 1)) is None
+    time.sleep(0.02)
+    assert cache.get(("a", 2)) is MISSING
+
+    cache.set(("b", 1), "b", ttl=60)
+    cache.set(("b", 2), "b", ttl=60)
+    assert len(cache) == 2 and cache.get(("a", 1)) is MISSING
+
+    cache.invalidate("b")
+    assert len(cache) == 0
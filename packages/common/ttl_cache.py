@@ -0,0 +1,42 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+# get() отдаёт MISSING, а не None: None — законное закэшированное значение
+MISSING = object()
+
+
+class TTLCache:
+    """LRU-bounded dict whose entries expire after a per-entry TTL."""
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return MISSING
+        expires, value = entry
+        if expires <= time.monotonic():
+            del self._data[key]
+            return MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def invalidate(self, prefix: Optional[Hashable] = None) -> None:
+        """Drop every entry, or only tuple keys whose first element is `prefix`."""
+        if prefix is None:
+            self._data.clear()
+            return
+        for key in [k for k in self._data if isinstance(k, tuple) and k[0] == prefix]:
+            del self._data[key]
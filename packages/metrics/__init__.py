@@ -0,0 +1,3 @@
+from .registry import LATENCY_BUCKETS, REGISTRY, SIZE_BUCKETS, Counter, Histogram, Registry
+
+__all__ = ["Counter", "Histogram", "Registry", "REGISTRY", "LATENCY_BUCKETS", "SIZE_BUCKETS"]
@@ -0,0 +1,35 @@
+import pytest
+
+from packages.metrics import Registry
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    latency = registry.histogram("req_seconds", "Request latency", ["method"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value, "tasks.task.list")
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP req_seconds Request latency", "# TYPE req_seconds histogram"]
+    assert 'req_seconds_bucket{method="tasks.task.list",le="0.1"} 2' in lines
+    assert 'req_seconds_bucket{method="tasks.task.list",le="1"} 3' in lines
+    assert 'req_seconds_bucket{method="tasks.task.list",le="+Inf"} 4' in lines
+    assert 'req_seconds_sum{method="tasks.task.list"} 3.65' in lines
+    assert 'req_seconds_count{method="tasks.task.list"} 4' in lines
+
+
+def test_counter_labels_and_registration():
+    registry = Registry()
+    errors = registry.counter("errors_total", "Errors", ["table", "status"])
+    errors.inc("users", "500")
+    errors.inc("users", "500")
+    errors.inc('we"ird', "404", amount=3)
+
+    # повторная регистрация возвращает ту же метрику
+    assert registry.counter("errors_total", "Errors", ["table", "status"]) is errors
+    assert errors.value("users", "500") == 2
+    text = registry.render()
+    assert 'errors_total{table="users",status="500"} 2' in text
+    assert 'errors_total{table="we\\"ird",status="404"} 3' in text
+    with pytest.raises(ValueError):
+        registry.histogram("errors_total", "Errors")
@@ -1,3 +1,12 @@
-from .client import SupabaseClient
+from .async_client import AsyncSupabaseClient, SupabaseAPIError
 
-__all__ = ["SupabaseClient"]
+__all__ = ["AsyncSupabaseClient", "SupabaseAPIError", "SupabaseClient"]
+
+
+def __getattr__(name: str):
+    # supabase-py тянет realtime/storage/gotrue — импортируем синхронный клиент только по требованию
+    if name == "SupabaseClient":
+        from .client import SupabaseClient
+
+        return SupabaseClient
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,504 @@
+import asyncio
+import logging
+import time
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+import httpx
+
+from packages.metrics import REGISTRY, SIZE_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+Filter = Tuple[str, str]
+
+
+# PostgREST не различает чтение/вставку по пути, поэтому операция — это HTTP-метод
+OPERATIONS = {"GET": "select", "POST": "insert", "PATCH": "update", "DELETE": "delete"}
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "supabase_request_seconds", "PostgREST request latency", ["table", "operation"]
+)
+REQUEST_ERRORS = REGISTRY.counter("supabase_request_errors_total", "Failed PostgREST requests", ["table", "operation", "status"])
+RESPONSE_BYTES = REGISTRY.histogram(
+    "supabase_response_bytes", "PostgREST response body size", ["table", "operation"], buckets=SIZE_BUCKETS
+)
+
+
+class SupabaseAPIError(Exception):
+    pass
+
+
+def _user_filter(bitrix_user_id: Union[int, List[int]]) -> Filter:
+    if isinstance(bitrix_user_id, (list, tuple, set)):
+        return ("bitrix_user_id", f"in.({','.join(str(i) for i in bitrix_user_id)})")
+    return ("bitrix_user_id", f"eq.{bitrix_user_id}")
+
+
+def _sync_state_record(bitrix_user_id: int, entity_type: str, last_synced_at: datetime) -> Dict[str, Any]:
+    return {
+        "bitrix_user_id": bitrix_user_id,
+        "entity_type": entity_type,
+        "last_synced_at": last_synced_at.isoformat(),
+        "refreshed_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+class AsyncSupabaseClient:
+    """Non-blocking counterpart of SupabaseClient.
+
+    Talks to PostgREST (`/rest/v1`) over one pooled httpx.AsyncClient instead of
+    the synchronous supabase-py client, so awaiting a query never blocks the
+    event loop. The method surface mirrors SupabaseClient.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        key: str,
+        schema: str = "assistant",
+        timeout: float = 10.0,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+    ) -> None:
+        self.rest_url = f"{url.rstrip('/')}/rest/v1"
+        self.schema = schema
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self._headers = {
+            "apikey": key,
+            "Authorization": f"Bearer {key}",
+            "Accept-Profile": schema,
+            "Content-Profile": schema,
+        }
+        self._http: Optional[httpx.AsyncClient] = None
+
+    async def __aenter__(self) -> "AsyncSupabaseClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                base_url=self.rest_url,
+                headers=self._headers,
+                timeout=self.timeout,
+                limits=self.limits,
+            )
+        return self._http
+
+    async def aclose(self) -> None:
+        if self._http is not None and not self._http.is_closed:
+            await self._http.aclose()
+        self._http = None
+
+    async def _send(self, method: str, table: str, **kwargs: Any) -> httpx.Response:
+        operation = "rpc" if table.startswith("rpc/") else OPERATIONS.get(method, method.lower())
+        started = time.perf_counter()
+        try:
+            response = await self._client().request(method, f"/{table}", **kwargs)
+        except httpx.HTTPError as err:
+            REQUEST_ERRORS.inc(table, operation, type(err).__name__)
+            raise
+        finally:
+            REQUEST_SECONDS.observe(time.perf_counter() - started, table, operation)
+        RESPONSE_BYTES.observe(len(response.content), table, operation)
+        if response.status_code >= 400:
+            REQUEST_ERRORS.inc(table, operation, str(response.status_code))
+        return response
+
+    async def _request(
+        self,
+        method: str,
+        table: str,
+        params: Optional[List[Filter]] = None,
+        json: Any = None,
+        prefer: Optional[str] = None,
+    ) -> Any:
+        headers = {"Prefer": prefer} if prefer else None
+        response = await self._send(method, table, params=params, json=json, headers=headers)
+        if response.status_code >= 400:
+            raise SupabaseAPIError(f"{method} {table} failed with {response.status_code}: {response.text}")
+        if not response.content:
+            return None
+        return response.json()
+
+    async def _rpc(self, function: str, args: Dict[str, Any]) -> Any:
+        return await self._request("POST", f"rpc/{function}", json=args)
+
+    async def _count(self, table: str, filters: Iterable[Filter] = ()) -> int:
+        response = await self._send(
+            "GET",
+            table,
+            params=[("select", "*"), *filters, ("limit", "0")],
+            headers={"Prefer": "count=exact"},
+        )
+        if response.status_code >= 400:
+            raise SupabaseAPIError(f"GET {table} failed with {response.status_code}: {response.text}")
+        # Content-Range: */42
+        return int(response.headers.get("content-range", "*/0").rsplit("/", 1)[-1] or 0)
+
+    async def _select(
+        self,
+        table: str,
+        filters: Iterable[Filter] = (),
+        columns: str = "*",
+        order: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        params: List[Filter] = [("select", columns), *filters]
+        if order:
+            params.append(("order", order))
+        if limit is not None:
+            params.append(("limit", str(limit)))
+        return await self._request("GET", table, params=params) or []
+
+    async def _upsert(self, table: str, rows: Any, on_conflict: str) -> None:
+        await self._request(
+            "POST",
+            table,
+            params=[("on_conflict", on_conflict)],
+            json=rows,
+            prefer="resolution=merge-duplicates,return=minimal",
+        )
+
+    async def _delete_in(self, table: str, column: str, values: List[int]) -> None:
+        await self._request(
+            "DELETE",
+            table,
+            params=[(column, f"in.({','.join(str(v) for v in values)})")],
+            prefer="return=minimal",
+        )
+
+    async def upsert_user(self, user: Dict[str, Any]) -> None:
+        logger.info("Upsert user %s", user.get("telegram_id"))
+        await self._upsert("users", user, on_conflict="telegram_id")
+
+    async def get_user_by_telegram_id(self, telegram_id: int) -> Optional[Dict[str, Any]]:
+        rows = await self._select("users", [("telegram_id", f"eq.{telegram_id}")], limit=1)
+        return rows[0] if rows else None
+
+    async def get_all_users(self) -> List[Dict[str, Any]]:
+        return await self._select("users")
+
+    async def get_users_by_telegram_ids(self, telegram_ids: List[int]) -> List[Dict[str, Any]]:
+        if not telegram_ids:
+            return []
+        return await self._select("users", [("telegram_id", f"in.({','.join(str(i) for i in telegram_ids)})")])
+
+    async def upsert_tasks_cache(self, tasks: List[Dict[str, Any]]) -> None:
+        if not tasks:
+            return
+        logger.info("Upsert %s tasks into cache", len(tasks))
+        await self._upsert("tasks_cache", tasks, on_conflict="bitrix_task_id")
+
+    async def upsert_events_cache(self, events: List[Dict[str, Any]]) -> None:
+        if not events:
+            return
+        logger.info("Upsert %s events into cache", len(events))
+        await self._upsert("events_cache", events, on_conflict="bitrix_event_id")
+
+    async def get_tasks_cache(
+        self,
+        bitrix_user_id: Union[int, List[int]],
+        deadline_from: Optional[datetime] = None,
+        deadline_to: Optional[datetime] = None,
+    ) -> List[Dict[str, Any]]:
+        filters = [_user_filter(bitrix_user_id)]
+        if deadline_from:
+            filters.append(("deadline", f"gte.{deadline_from.isoformat()}"))
+        if deadline_to:
+            filters.append(("deadline", f"lte.{deadline_to.isoformat()}"))
+        return await self._select("tasks_cache", filters, order="deadline")
+
+    async def get_cached_task_ids(self, bitrix_user_id: int) -> List[int]:
+        rows = await self._select("tasks_cache", [("bitrix_user_id", f"eq.{bitrix_user_id}")], columns="bitrix_task_id")
+        return [row["bitrix_task_id"] for row in rows]
+
+    async def delete_tasks_cache(self, task_ids: List[int]) -> None:
+        if not task_ids:
+            return
+        logger.info("Delete %s tasks from cache", len(task_ids))
+        await self._delete_in("tasks_cache", "bitrix_task_id", task_ids)
+
+    async def get_events_cache(
+        self, bitrix_user_id: Union[int, List[int]], start_from: datetime, start_to: datetime
+    ) -> List[Dict[str, Any]]:
+        filters = [
+            _user_filter(bitrix_user_id),
+            ("start_at", f"gte.{start_from.isoformat()}"),
+            ("start_at", f"lt.{start_to.isoformat()}"),
+        ]
+        return await self._select("events_cache", filters, order="start_at")
+
+    async def delete_events_cache(self, event_ids: List[int]) -> None:
+        if not event_ids:
+            return
+        logger.info("Delete %s events from cache", len(event_ids))
+        await self._delete_in("events_cache", "bitrix_event_id", event_ids)
+
+    async def upsert_sync_state(
+        self,
+        bitrix_user_id: int,
+        entity_type: str,
+        last_synced_at: datetime,
+        last_full_sync_at: Optional[datetime] = None,
+    ) -> None:
+        record = _sync_state_record(bitrix_user_id, entity_type, last_synced_at)
+        if last_full_sync_at:
+            record["last_full_sync_at"] = last_full_sync_at.isoformat()
+        await self._upsert("sync_state", record, on_conflict="bitrix_user_id,entity_type")
+
+    async def upsert_sync_states(self, entity_type: str, marks: Dict[int, datetime]) -> None:
+        """One upsert for the high-water marks of many users."""
+        if not marks:
+            return
+        records = [_sync_state_record(user_id, entity_type, mark) for user_id, mark in marks.items()]
+        await self._upsert("sync_state", records, on_conflict="bitrix_user_id,entity_type")
+
+    async def get_sync_state(self, bitrix_user_id: int, entity_type: str) -> Optional[Dict[str, Any]]:
+        filters = [("bitrix_user_id", f"eq.{bitrix_user_id}"), ("entity_type", f"eq.{entity_type}")]
+        rows = await self._select("sync_state", filters, limit=1)
+        return rows[0] if rows else None
+
+    async def get_sync_states(
+        self, bitrix_user_ids: List[int], entity_type: Optional[str] = None
+    ) -> Dict[Tuple[int, str], Dict[str, Any]]:
+        if not bitrix_user_ids:
+            return {}
+        filters = [("bitrix_user_id", f"in.({','.join(str(i) for i in bitrix_user_ids)})")]
+        if entity_type:
+            filters.append(("entity_type", f"eq.{entity_type}"))
+        rows = await self._select("sync_state", filters)
+        return {(int(row["bitrix_user_id"]), row["entity_type"]): row for row in rows}
+
+    async def get_digest_cursor(self, digest_date: date, kind: str, shard: int, shards: int) -> Optional[Dict[str, Any]]:
+        filters = [
+            ("digest_date", f"eq.{digest_date.isoformat()}"),
+            ("kind", f"eq.{kind}"),
+            ("shard", f"eq.{shard}"),
+            ("shards", f"eq.{shards}"),
+        ]
+        rows = await self._select("digest_cursors", filters, limit=1)
+        return rows[0] if rows else None
+
+    async def upsert_digest_cursor(
+        self,
+        digest_date: date,
+        kind: str,
+        shard: int,
+        shards: int,
+        last_telegram_id: Optional[int],
+        completed: bool,
+        failures: Optional[Dict[str, int]] = None,
+    ) -> None:
+        record = {
+            "digest_date": digest_date.isoformat(),
+            "kind": kind,
+            "shard": shard,
+            "shards": shards,
+            "last_telegram_id": last_telegram_id,
+            "completed": completed,
+            "failures": failures or {},
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }
+        await self._upsert("digest_cursors", record, on_conflict="digest_date,kind,shard,shards")
+
+    async def get_outbox_keys(self, dedupe_keys: List[str]) -> Set[str]:
+        """Keys that were actually delivered; claimed but unsent rows don't count."""
+        if not dedupe_keys:
+            return set()
+        quoted = ",".join(f'"{key}"' for key in dedupe_keys)
+        rows = await self._select(
+            "notification_outbox",
+            [("dedupe_key", f"in.({quoted})"), ("sent_at", "not.is.null")],
+            columns="dedupe_key",
+        )
+        return {row["dedupe_key"] for row in rows}
+
+    async def claim_outbox(
+        self, dedupe_key: str, telegram_chat_id: int, payload: Dict[str, Any], lease_seconds: int = 60
+    ) -> str:
+        """Claim the send of `dedupe_key`: "claimed" (this caller sends), "sent" or "busy".
+
+        An unsent claim older than `lease_seconds` is taken over, so a send
+        killed between claim and `mark_outbox_sent` is retried later.
+        """
+        return await self._rpc(
+            "claim_outbox",
+            {
+                "p_dedupe_key": dedupe_key,
+                "p_telegram_chat_id": telegram_chat_id,
+                "p_payload": payload,
+                "p_lease_seconds": lease_seconds,
+            },
+        )
+
+    async def mark_outbox_sent(self, dedupe_key: str, payload: Dict[str, Any]) -> None:
+        await self._request(
+            "PATCH",
+            "notification_outbox",
+            params=[("dedupe_key", f"eq.{dedupe_key}")],
+            json={"payload": payload, "sent_at": datetime.now(timezone.utc).isoformat()},
+            prefer="return=minimal",
+        )
+
+    async def release_outbox(self, dedupe_key: str) -> None:
+        await self._request("DELETE", "notification_outbox", params=[("dedupe_key", f"eq.{dedupe_key}")])
+
+    async def get_due_digests(
+        self, until: datetime, limit: int, after: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """digest_schedule rows with after < next_fire_at <= until, earliest first (index range scan)."""
+        filters = [("next_fire_at", f"lte.{until.isoformat()}")]
+        if after:
+            filters.append(("next_fire_at", f"gt.{after.isoformat()}"))
+        return await self._select("digest_schedule", filters, order="next_fire_at", limit=limit)
+
+    async def upsert_digest_schedule(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        await self._upsert("digest_schedule", rows, on_conflict="telegram_id,kind")
+
+    async def delete_digest_schedule(self, telegram_ids: List[int]) -> None:
+        if not telegram_ids:
+            return
+        await self._delete_in("digest_schedule", "telegram_id", telegram_ids)
+
+    async def get_digest_renders(self, telegram_ids: List[int], digest_dates: List[date]) -> List[Dict[str, Any]]:
+        if not telegram_ids or not digest_dates:
+            return []
+        filters = [
+            ("telegram_id", f"in.({','.join(str(i) for i in telegram_ids)})"),
+            ("digest_date", f"in.({','.join(sorted({d.isoformat() for d in digest_dates}))})"),
+        ]
+        return await self._select("digest_renders", filters)
+
+    async def upsert_digest_renders(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        logger.info("Store %s pre-rendered digests", len(rows))
+        await self._upsert("digest_renders", rows, on_conflict="telegram_id,digest_date,kind")
+
+    async def delete_digest_renders_before(self, digest_date: date) -> None:
+        await self._request(
+            "DELETE",
+            "digest_renders",
+            params=[("digest_date", f"lt.{digest_date.isoformat()}")],
+            prefer="return=minimal",
+        )
+
+    async def get_page_snapshot(self, telegram_id: int, token: str) -> Optional[Dict[str, Any]]:
+        filters = [("telegram_id", f"eq.{telegram_id}"), ("token", f"eq.{token}")]
+        rows = await self._select("page_snapshots", filters, limit=1)
+        return rows[0] if rows else None
+
+    async def upsert_page_snapshot(self, telegram_id: int, token: str, pages: List[str], expires_at: datetime) -> None:
+        record = {"telegram_id": telegram_id, "token": token, "pages": pages, "expires_at": expires_at.isoformat()}
+        await self._upsert("page_snapshots", record, on_conflict="telegram_id")
+
+    async def delete_expired_page_snapshots(self, before: datetime) -> None:
+        await self._request(
+            "DELETE",
+            "page_snapshots",
+            params=[("expires_at", f"lt.{before.isoformat()}")],
+            prefer="return=minimal",
+        )
+
+    async def enqueue_telegram_update(self, update_id: int, chat_id: Optional[int], payload: Dict[str, Any]) -> bool:
+        """Store an incoming update; False if this update_id is already queued or processed."""
+        rows = await self._request(
+            "POST",
+            "telegram_updates",
+            params=[("on_conflict", "update_id")],
+            json={"update_id": update_id, "chat_id": chat_id, "payload": payload},
+            prefer="resolution=ignore-duplicates,return=representation",
+        )
+        return bool(rows)
+
+    async def claim_telegram_updates(self, limit: int, lease_seconds: int) -> List[Dict[str, Any]]:
+        return await self._rpc("claim_telegram_updates", {"p_limit": limit, "p_lease_seconds": lease_seconds}) or []
+
+    async def complete_telegram_update(self, update_id: int, error: Optional[str] = None) -> None:
+        await self._request(
+            "PATCH",
+            "telegram_updates",
+            params=[("update_id", f"eq.{update_id}")],
+            json={"processed_at": datetime.now(timezone.utc).isoformat(), "locked_until": None, "error": error},
+            prefer="return=minimal",
+        )
+
+    async def release_telegram_update(self, update_id: int) -> None:
+        await self._request(
+            "PATCH",
+            "telegram_updates",
+            params=[("update_id", f"eq.{update_id}")],
+            json={"locked_until": None},
+            prefer="return=minimal",
+        )
+
+    async def get_telegram_update_backlog(self) -> Tuple[int, Optional[str]]:
+        """(pending updates, received_at of the oldest one)."""
+        pending = [("processed_at", "is.null")]
+        count, oldest = await asyncio.gather(
+            self._count("telegram_updates", pending),
+            self._select("telegram_updates", pending, columns="received_at", order="received_at", limit=1),
+        )
+        return count, oldest[0]["received_at"] if oldest else None
+
+    async def delete_processed_updates_before(self, before: datetime) -> None:
+        await self._request(
+            "DELETE",
+            "telegram_updates",
+            params=[("processed_at", f"lt.{before.isoformat()}")],
+            prefer="return=minimal",
+        )
+
+    async def mark_update_seen(self, update_id: int) -> bool:
+        """Record an update_id in the dedupe window; False if it was already there."""
+        rows = await self._request(
+            "POST",
+            "telegram_update_ids",
+            params=[("on_conflict", "update_id")],
+            json={"update_id": update_id},
+            prefer="resolution=ignore-duplicates,return=representation",
+        )
+        return bool(rows)
+
+    async def delete_seen_update(self, update_id: int) -> None:
+        await self._request(
+            "DELETE", "telegram_update_ids", params=[("update_id", f"eq.{update_id}")], prefer="return=minimal"
+        )
+
+    async def delete_seen_updates_before(self, before: datetime) -> None:
+        await self._request(
+            "DELETE",
+            "telegram_update_ids",
+            params=[("seen_at", f"lt.{before.isoformat()}")],
+            prefer="return=minimal",
+        )
+
+    async def get_fsm_states(self, keys: List[str]) -> List[Dict[str, Any]]:
+        if not keys:
+            return []
+        quoted = ",".join(f'"{key}"' for key in keys)
+        return await self._select("fsm_states", [("key", f"in.({quoted})")], columns="key,state,data,expires_at")
+
+    async def upsert_fsm_states(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        now = datetime.now(timezone.utc).isoformat()
+        await self._upsert("fsm_states", [{**row, "updated_at": now} for row in rows], on_conflict="key")
+
+    async def delete_expired_fsm_states(self, before: datetime) -> None:
+        await self._request(
+            "DELETE",
+            "fsm_states",
+            params=[("expires_at", f"lt.{before.isoformat()}")],
+            prefer="return=minimal",
+        )
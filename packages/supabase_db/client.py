@@ -1,6 +1,6 @@
 import logging
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
 
 from supabase import Client, create_client
 
@@ -53,15 +53,64 @@ class SupabaseClient:
         logger.info("Upsert %s events into cache", len(events))
         self._table("events_cache").upsert(events, on_conflict="bitrix_event_id").execute()
 
-    def upsert_sync_state(self, bitrix_user_id: int, entity_type: str, last_synced_at: datetime) -> None:
-        self._table("sync_state").upsert(
-            {
-                "bitrix_user_id": bitrix_user_id,
-                "entity_type": entity_type,
-                "last_synced_at": last_synced_at.isoformat(),
-            },
-            on_conflict="bitrix_user_id,entity_type",
-        ).execute()
+    def get_tasks_cache(
+        self,
+        bitrix_user_id: int,
+        deadline_from: Optional[datetime] = None,
+        deadline_to: Optional[datetime] = None,
+    ) -> List[Dict[str, Any]]:
+        query = self._table("tasks_cache").select("*").eq("bitrix_user_id", bitrix_user_id)
+        if deadline_from:
+            query = query.gte("deadline", deadline_from.isoformat())
+        if deadline_to:
+            query = query.lte("deadline", deadline_to.isoformat())
+        resp = query.order("deadline").execute()
+        return resp.data or []
+
+    def get_cached_task_ids(self, bitrix_user_id: int) -> List[int]:
+        resp = self._table("tasks_cache").select("bitrix_task_id").eq("bitrix_user_id", bitrix_user_id).execute()
+        return [row["bitrix_task_id"] for row in resp.data or []]
+
+    def delete_tasks_cache(self, task_ids: List[int]) -> None:
+        if not task_ids:
+            return
+        logger.info("Delete %s tasks from cache", len(task_ids))
+        self._table("tasks_cache").delete().in_("bitrix_task_id", task_ids).execute()
+
+    def get_events_cache(self, bitrix_user_id: int, start_from: datetime, start_to: datetime) -> List[Dict[str, Any]]:
+        resp = (
+            self._table("events_cache")
+            .select("*")
+            .eq("bitrix_user_id", bitrix_user_id)
+            .gte("start_at", start_from.isoformat())
+            .lt("start_at", start_to.isoformat())
+            .order("start_at")
+            .execute()
+        )
+        return resp.data or []
+
+    def delete_events_cache(self, event_ids: List[int]) -> None:
+        if not event_ids:
+            return
+        logger.info("Delete %s events from cache", len(event_ids))
+        self._table("events_cache").delete().in_("bitrix_event_id", event_ids).execute()
+
+    def upsert_sync_state(
+        self,
+        bitrix_user_id: int,
+        entity_type: str,
+        last_synced_at: datetime,
+        last_full_sync_at: Optional[datetime] = None,
+    ) -> None:
+        record = {
+            "bitrix_user_id": bitrix_user_id,
+            "entity_type": entity_type,
+            "last_synced_at": last_synced_at.isoformat(),
+            "refreshed_at": datetime.now(timezone.utc).isoformat(),
+        }
+        if last_full_sync_at:
+            record["last_full_sync_at"] = last_full_sync_at.isoformat()
+        self._table("sync_state").upsert(record, on_conflict="bitrix_user_id,entity_type").execute()
 
     def get_sync_state(self, bitrix_user_id: int, entity_type: str) -> Optional[Dict[str, Any]]:
         resp = (
@@ -75,3 +124,14 @@ class SupabaseClient:
         if resp.data:
             return resp.data[0]
         return None
+
+    def get_sync_states(
+        self, bitrix_user_ids: List[int], entity_type: Optional[str] = None
+    ) -> Dict[Tuple[int, str], Dict[str, Any]]:
+        if not bitrix_user_ids:
+            return {}
+        query = self._table("sync_state").select("*").in_("bitrix_user_id", bitrix_user_ids)
+        if entity_type:
+            query = query.eq("entity_type", entity_type)
+        resp = query.execute()
+        return {(int(row["bitrix_user_id"]), row["entity_type"]): row for row in resp.data or []}
@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+import httpx
+
+from packages.supabase_db import AsyncSupabaseClient
+
+
+def _client(handler):
+    client = AsyncSupabaseClient("https://project.supabase.co", "service-key")
+    client._http = httpx.AsyncClient(
+        base_url=client.rest_url,
+        headers=client._headers,
+        transport=httpx.MockTransport(handler),
+    )
+    return client
+
+
+def test_select_builds_postgrest_query_with_schema_profile():
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        return httpx.Response(200, json=[{"telegram_id": 1}])
+
+    async def scenario():
+        async with _client(handler) as client:
+            return await client.get_user_by_telegram_id(1)
+
+    user = asyncio.run(scenario())
+    assert user == {"telegram_id": 1}
+    request = seen[0]
+    assert request.url.path == "/rest/v1/users"
+    assert request.url.params["telegram_id"] == "eq.1"
+    assert request.url.params["limit"] == "1"
+    assert request.headers["Accept-Profile"] == "assistant"
+
+
+def test_upsert_sends_merge_duplicates_and_on_conflict():
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        return httpx.Response(201)
+
+    async def scenario():
+        async with _client(handler) as client:
+            await client.upsert_tasks_cache([{"bitrix_task_id": 1}])
+            await client.delete_tasks_cache([1, 2])
+
+    asyncio.run(scenario())
+    upsert, delete = seen
+    assert upsert.url.params["on_conflict"] == "bitrix_task_id"
+    assert "resolution=merge-duplicates" in upsert.headers["Prefer"]
+    assert json.loads(upsert.content) == [{"bitrix_task_id": 1}]
+    assert delete.method == "DELETE" and delete.url.params["bitrix_task_id"] == "in.(1,2)"
+
+
+def test_outbox_counts_only_sent_rows_and_claims_via_rpc():
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        if request.url.path.endswith("rpc/claim_outbox"):
+            return httpx.Response(200, json="busy")
+        return httpx.Response(200, json=[{"dedupe_key": "a"}])
+
+    async def scenario():
+        async with _client(handler) as client:
+            return await client.get_outbox_keys(["a", "b"]), await client.claim_outbox("b", 1, {}, lease_seconds=30)
+
+    keys, claim = asyncio.run(scenario())
+    select, rpc = seen
+    assert keys == {"a"} and claim == "busy"
+    assert select.url.params["sent_at"] == "not.is.null"
+    assert json.loads(rpc.content)["p_lease_seconds"] == 30
@@ -0,0 +1,112 @@
+"""Micro-benchmark: per-call latency of BitrixClient with a pooled transport
+vs. a fresh httpx.AsyncClient per request (the old behaviour).
+
+By default a tiny keep-alive HTTP server emulating Bitrix is started locally,
+so the numbers show the connection/client setup overhead only. Pass
+``--webhook`` to measure against a real portal (TLS handshakes make the gap
+much larger there).
+
+    python scripts/bench_bitrix_transport.py --calls 200
+    python scripts/bench_bitrix_transport.py --webhook https://portal.bitrix24.ru/rest/1/xxx --calls 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from typing import List
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from packages.bitrix_client import BitrixClient, TokenBucket  # noqa: E402
+
+_BODY = json.dumps({"result": [{"ID": "1", "EMAIL": "bench@example.com"}]}).encode()
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            if length:
+                await reader.readexactly(length)
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                + f"Content-Length: {len(_BODY)}\r\n\r\n".encode()
+                + _BODY
+            )
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _bench_fresh(webhook: str, calls: int) -> List[float]:
+    timings = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            response = await client.post(f"{webhook}/user.get", json={"filter": {"EMAIL": "bench@example.com"}})
+        response.json()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+async def _bench_pooled(webhook: str, calls: int, http2: bool) -> List[float]:
+    timings = []
+    # без лимитера и склейки в batch: меряем переиспользование соединения, а не паузы лимита
+    limiter = TokenBucket(rate=1e6, burst=10**6)
+    async with BitrixClient(webhook, http2=http2, max_retries=0, limiter=limiter, coalesce=False) as client:
+        for _ in range(calls):
+            started = time.perf_counter()
+            await client.find_user_by_email("bench@example.com")
+            timings.append(time.perf_counter() - started)
+    return timings
+
+
+def _report(name: str, timings: List[float]) -> None:
+    ms = sorted(t * 1000 for t in timings)
+    p95 = ms[int(len(ms) * 0.95) - 1] if len(ms) > 1 else ms[0]
+    print(f"{name:<10} mean={statistics.mean(ms):7.3f}ms  median={statistics.median(ms):7.3f}ms  p95={p95:7.3f}ms")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--webhook", help="real Bitrix webhook URL (default: local fake server)")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--http2", action="store_true", help="enable HTTP/2 for the pooled client (needs 'h2')")
+    args = parser.parse_args()
+
+    server = None
+    webhook = args.webhook
+    if not webhook:
+        server = await asyncio.start_server(_handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        webhook = f"http://127.0.0.1:{port}/rest/1/bench"
+
+    try:
+        fresh = await _bench_fresh(webhook, args.calls)
+        pooled = await _bench_pooled(webhook, args.calls, args.http2)
+    finally:
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+
+    print(f"{args.calls} calls against {'local fake server' if server else webhook}")
+    _report("fresh", fresh)
+    _report("pooled", pooled)
+    print(f"speedup    x{statistics.mean(fresh) / statistics.mean(pooled):.1f} per call")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
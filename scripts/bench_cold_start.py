@@ -0,0 +1,140 @@
+"""Cold-start benchmark for the Vercel entrypoint (api/index.py).
+
+Reports the `-X importtime` breakdown of `import api.index`, grouped by top-level
+package, and time-to-first-response of a fresh interpreter for `/health` and a
+`/help` webhook update, together with the dependencies each request built.
+Requests go through httpx.ASGITransport; Bot API calls are answered locally, so
+no network or real credentials are needed.
+
+    python scripts/bench_cold_start.py --runs 5 --top 15
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import Dict, List
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+DUMMY_ENV = {
+    "TELEGRAM_BOT_TOKEN": "123456:bench",
+    "BITRIX24_WEBHOOK": "http://127.0.0.1:9/rest/1/bench/",
+    "SUPABASE_URL": "http://127.0.0.1:9",
+    "SUPABASE_SERVICE_ROLE_KEY": "bench",
+}
+
+HELP_UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": 1, "type": "private"},
+        "from": {"id": 1, "is_bot": False, "first_name": "bench"},
+        "text": "/help",
+        "entities": [{"type": "bot_command", "offset": 0, "length": 5}],
+    },
+}
+
+
+def _env() -> Dict[str, str]:
+    env = {**DUMMY_ENV, **os.environ, "PYTHONPATH": ROOT}
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def importtime_breakdown(top: int) -> None:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import api.index"],
+        cwd=ROOT,
+        env=_env(),
+        capture_output=True,
+        text=True,
+    )
+    by_package: Counter = Counter()
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        by_package[name.strip().split(".")[0]] += int(self_us)
+        if name.strip() == "api.index":
+            total = int(cumulative_us)
+    print(f"import api.index: {total / 1000:.1f} ms")
+    for package, self_us in by_package.most_common(top):
+        print(f"  {package:<28} {self_us / 1000:8.1f} ms")
+
+
+async def _child(scenario: str) -> Dict:
+    started = time.perf_counter()
+    import httpx
+
+    from api.index import app
+    from apps.telegram_assistant.main import runtime
+
+    imported = time.perf_counter()
+    if scenario == "help":
+
+        async def offline(make_request, bot, method):
+            return None
+
+        runtime.bot.session.middleware(offline)
+        request = {"method": "POST", "url": "/webhook/telegram", "json": HELP_UPDATE}
+    else:
+        request = {"method": "GET", "url": "/health"}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        response = await client.request(**request)
+    answered = time.perf_counter()
+    return {
+        "status": response.status_code,
+        "import_ms": (imported - started) * 1000,
+        "first_response_ms": (answered - started) * 1000,
+        "built": sorted(runtime.__dict__.keys() - {"settings"}),
+    }
+
+
+def time_to_first_response(scenario: str, runs: int) -> None:
+    samples: List[Dict] = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, __file__, "--child", scenario], cwd=ROOT, env=_env(), capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            print(result.stderr, file=sys.stderr)
+            raise SystemExit(f"{scenario}: child process failed")
+        sample = json.loads(result.stdout.strip().splitlines()[-1])
+        sample["process_ms"] = (time.perf_counter() - started) * 1000
+        samples.append(sample)
+    median = {key: statistics.median(s[key] for s in samples) for key in ("import_ms", "first_response_ms", "process_ms")}
+    print(
+        f"{scenario:<7} status={samples[0]['status']} import={median['import_ms']:.0f} ms "
+        f"first_response={median['first_response_ms']:.0f} ms process={median['process_ms']:.0f} ms "
+        f"built={','.join(samples[0]['built']) or '-'}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters per scenario (median is reported)")
+    parser.add_argument("--top", type=int, default=12, help="packages shown in the import breakdown")
+    parser.add_argument("--child", choices=["health", "help"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, ROOT)
+        print(json.dumps(asyncio.run(_child(args.child))))
+        return
+
+    importtime_breakdown(args.top)
+    print()
+    for scenario in ("health", "help"):
+        time_to_first_response(scenario, args.runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Normalize-stage benchmark: Bitrix tasks -> tasks_cache rows for one digest.
+
+Generates `--tasks` synthetic tasks.task.list items spread over `--users`
+responsibles (a digest run of 50-user chunks), then compares the previous
+per-item normalization (dateutil `isoparse` per field, rows bucketed by
+re-parsing deadlines) with `packages.bitrix_client.normalize_tasks` and the
+fast `parse_datetime`. CPU time is `time.process_time`, memory is the
+tracemalloc peak while the rows are built.
+
+    python scripts/bench_normalize.py --tasks 10000 --runs 5
+"""
+import argparse
+import gc
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from dateutil import parser  # noqa: E402
+
+from packages.bitrix_client.models import normalize_tasks, parse_datetime  # noqa: E402
+
+CHUNK_SIZE = 50
+
+
+def synthetic_tasks(count: int, users: int, seed: int = 1) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    base = datetime(2026, 1, 13, tzinfo=timezone(timedelta(hours=3)))
+    items = []
+    for i in range(count):
+        deadline = base + timedelta(hours=rng.randint(-24 * 30, 24))
+        changed = deadline - timedelta(days=rng.randint(1, 10), minutes=rng.randint(0, 600))
+        items.append(
+            {
+                "ID": str(100_000 + i),
+                "TITLE": f"Задача {i}: подготовить отчёт",
+                "STATUS": rng.choice("2345"[:3]),
+                "DEADLINE": deadline.isoformat(),
+                "RESPONSIBLE_ID": str(1 + i % users),
+                "CREATED_DATE": (changed - timedelta(days=3)).isoformat(),
+                "CHANGED_DATE": changed.isoformat(),
+            }
+        )
+    return items
+
+
+def _legacy_parse(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = parser.isoparse(value)
+    except ValueError:
+        parsed = parser.parse(value, dayfirst=True)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _legacy_row(item: Dict[str, Any], bitrix_user_id: int) -> Dict[str, Any]:
+    deadline_dt = _legacy_parse(item.get("DEADLINE"))
+    updated_dt = _legacy_parse(item.get("CHANGED_DATE") or item.get("CREATED_DATE"))
+    return {
+        "bitrix_task_id": int(item["ID"]),
+        "bitrix_user_id": bitrix_user_id,
+        "title": item["TITLE"],
+        "status": item["STATUS"],
+        "deadline": deadline_dt.isoformat() if deadline_dt else None,
+        "updated_at": updated_dt.isoformat() if updated_dt else None,
+        "raw_payload": item,
+    }
+
+
+def _digest(grouped: Dict[int, List[Dict[str, Any]]], rows_of: Callable, parse: Callable, day_start: datetime):
+    """Task rows + overdue bucketing for every chunk of the run."""
+    user_ids = sorted(grouped)
+    kept = []
+    for i in range(0, len(user_ids), CHUNK_SIZE):
+        rows: List[Dict[str, Any]] = []
+        for user_id in user_ids[i : i + CHUNK_SIZE]:
+            rows.extend(rows_of(grouped[user_id], user_id))
+        rows.sort(key=lambda row: row["deadline"] or "")
+        overdue = [row for row in rows if row["deadline"] and parse(row["deadline"]) <= day_start]
+        kept.append((rows, overdue))
+    return kept
+
+
+def legacy(grouped, day_start):
+    return _digest(grouped, lambda items, uid: [_legacy_row(item, uid) for item in items], _legacy_parse, day_start)
+
+
+def fast(grouped, day_start):
+    return _digest(grouped, normalize_tasks, parse_datetime, day_start)
+
+
+def measure(fn: Callable, grouped, day_start, runs: int) -> Dict[str, float]:
+    cpu = []
+    for _ in range(runs):
+        gc.collect()
+        started = time.process_time()
+        fn(grouped, day_start)
+        cpu.append(time.process_time() - started)
+    gc.collect()
+    tracemalloc.start()
+    result = fn(grouped, day_start)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {"cpu_ms": statistics.median(cpu) * 1000, "peak_mb": peak / 1024 / 1024}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--tasks", type=int, default=10_000)
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--runs", type=int, default=5, help="timed runs per variant (median is reported)")
+    args = ap.parse_args()
+
+    grouped: Dict[int, List[Dict[str, Any]]] = {}
+    for item in synthetic_tasks(args.tasks, args.users):
+        grouped.setdefault(int(item["RESPONSIBLE_ID"]), []).append(item)
+    day_start = datetime(2026, 1, 13, tzinfo=timezone.utc)
+
+    assert legacy(grouped, day_start) == fast(grouped, day_start), "variants disagree"
+    results = {name: measure(fn, grouped, day_start, args.runs) for name, fn in (("legacy", legacy), ("fast", fast))}
+    for name, r in results.items():
+        print(f"{name:<7} cpu={r['cpu_ms']:8.1f} ms  peak={r['peak_mb']:6.2f} MB  ({args.tasks} tasks, {args.users} users)")
+    print(
+        f"speedup x{results['legacy']['cpu_ms'] / results['fast']['cpu_ms']:.1f}, "
+        f"memory {results['fast']['peak_mb'] / results['legacy']['peak_mb'] * 100:.0f}% of legacy"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Concurrency benchmark: webhook throughput under PostgREST latency.
+
+Simulates N concurrent webhook handlers, each doing one user lookup, against a
+local fake PostgREST that answers after `--latency` ms. The blocking variant
+issues the request with a synchronous httpx.Client, which is what supabase-py's
+`.execute()` does under the hood, so the event loop is stalled for the whole
+round trip. The async variant uses AsyncSupabaseClient.
+
+    python scripts/bench_supabase_concurrency.py --requests 50 --latency 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from packages.supabase_db import AsyncSupabaseClient  # noqa: E402
+
+_BODY = json.dumps([{"telegram_id": 1, "bitrix_user_id": 7}]).encode()
+
+
+def _start_fake_postgrest(latency: float) -> tuple:
+    """Run the fake server on its own loop/thread: the blocking client must not stall it."""
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    holder = {}
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                await reader.readuntil(b"\r\n\r\n")
+                await asyncio.sleep(latency)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(_BODY)}\r\n\r\n".encode()
+                    + _BODY
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        holder["port"] = server.sockets[0].getsockname()[1]
+        ready.set()
+        async with server:
+            await server.serve_forever()
+
+    thread = threading.Thread(target=lambda: loop.run_until_complete(serve()), daemon=True)
+    thread.start()
+    ready.wait()
+    return f"http://127.0.0.1:{holder['port']}", loop
+
+
+async def _run_blocking(url: str, requests: int) -> float:
+    client = httpx.Client(base_url=f"{url}/rest/v1", timeout=30.0)
+
+    async def handler(telegram_id: int) -> None:
+        client.get("/users", params={"select": "*", "telegram_id": f"eq.{telegram_id}", "limit": "1"}).json()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(handler(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    client.close()
+    return elapsed
+
+
+async def _run_async(url: str, requests: int) -> float:
+    async with AsyncSupabaseClient(url, "bench-key", max_connections=requests) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client.get_user_by_telegram_id(i) for i in range(requests)))
+        return time.perf_counter() - started
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50, help="concurrent webhook handlers")
+    parser.add_argument("--latency", type=float, default=50.0, help="PostgREST latency, ms")
+    args = parser.parse_args()
+
+    url, _ = _start_fake_postgrest(args.latency / 1000)
+    blocking = await _run_blocking(url, args.requests)
+    non_blocking = await _run_async(url, args.requests)
+
+    print(f"{args.requests} concurrent handlers, {args.latency:.0f}ms DB latency")
+    print(f"blocking   {blocking * 1000:8.1f}ms total  {args.requests / blocking:8.1f} req/s")
+    print(f"async      {non_blocking * 1000:8.1f}ms total  {args.requests / non_blocking:8.1f} req/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())